@@ -9,6 +9,7 @@ from PySide2.QtWidgets import QApplication
 
 from widgets.mainwindow import MainWindow
 from utilities.log import logger
+from utilities.migrations import migrate
 
 
 def createWindow(dbPath):
@@ -99,6 +100,9 @@ def main():
         logger.critical("No database was found.")
         createDB(dbPath)
 
+    # Bring older databases up to date
+    migrate(dbPath)
+
     createWindow(dbPath)
 
 
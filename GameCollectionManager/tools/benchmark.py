@@ -0,0 +1,840 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the collection database, run against a generated collection.
+Run from the source dir, e.g.:
+    python tools/benchmark.py plans --rows 50000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter, sleep
+
+# Make the program's modules importable, and keep its logs where they usually are
+_gcmDir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_gcmDir))
+os.chdir(_gcmDir)
+
+from utilities.migrations import migrate  # noqa: E402
+from utilities.search import matchExpression, searchColumns, searchCondition  # noqa: E402
+
+_platforms = ["Game Boy", "Game Boy Advance", "Nintendo 64", "Nintendo DS", "Nintendo Entertainment System",
+              "PlayStation", "PlayStation 2", "Sega Mega Drive", "Sega Saturn", "Super Nintendo"]
+_regions = ["NTSC (JP)", "NTSC (NA)", "PAL"]
+_genres = ["Action", "Adventure", "Platform", "Puzzle", "Racing / Driving", "Role-playing (RPG)",
+           "Shooter", "Simulation", "Sports", "Strategy / tactics"]
+_words = ["Adventure", "Battle", "Castle", "Dragon", "Fighter", "Galaxy", "Hero", "Island", "Legend",
+          "Mario", "Pokémon", "Quest", "Racer", "Saga", "Soccer", "Star", "Tennis", "World", "Zelda"]
+
+
+def createTables(cur):
+    cur.execute("CREATE TABLE IF NOT EXISTS games "
+                "(ID INTEGER PRIMARY KEY, Platform, Name, Region, Code, Game, Box, Manual, Year, Genre, Comment, "
+                "Publisher, Developer, Platforms, Price);")
+    cur.execute("CREATE TABLE IF NOT EXISTS consoles "
+                "(ID INTEGER PRIMARY KEY, Platform, Name, Region, Country, 'Serial number', Console, Box, Manual, "
+                "Year, Comment, Price);")
+    cur.execute("CREATE TABLE IF NOT EXISTS accessories "
+                "(ID INTEGER PRIMARY KEY, Platform, Name, Region, Country, Accessory, Box, Manual, Year,"
+                "Comment, Price);")
+
+
+def gameRows(count: int, ownedRatio: float = 0.1, seed: int = 1) -> list:
+    """
+    Generates games in the same form as the platform templates
+    :param count: Number of games
+    :param ownedRatio: Fraction of the games that are owned
+    :param seed: Seed for the random generator, so runs are comparable
+    :return: (list) List of tuples in 'games' column order, without the ID
+    """
+    rnd = random.Random(seed)
+    priceRnd = random.Random(seed + 1)  # Separate, so the other columns are the same as without prices
+    rows = []
+    for i in range(count):
+        loose = priceRnd.randint(100, 5000)
+        prices = ["$0"] + ([f"${loose / 100:.2f}", f"${loose * 1.5 / 100:.2f}", f"${loose * 3 / 100:.2f}"]
+                           if priceRnd.random() < 0.9 else ["N/A"] * 3)
+        owned = "Yes" if rnd.random() < ownedRatio else "No"
+        name = " ".join(rnd.sample(_words, rnd.randint(1, 3))) + f" {i}"
+        rows.append((rnd.choice(_platforms), name, rnd.choice(_regions), f"CODE-{i:06}",
+                     owned, owned if rnd.random() < 0.5 else "No", "No", str(rnd.randint(1980, 2015)),
+                     ", ".join(rnd.sample(_genres, rnd.randint(1, 2))), "", "", "", "", ",".join(prices)))
+
+    return rows
+
+
+def createCollection(dbPath: str, count: int, ownedRatio: float = 0.1):
+    con = sqlite3.connect(dbPath)
+    createTables(con.cursor())
+    con.executemany("INSERT INTO games (Platform, Name, Region, Code, Game, Box, Manual, Year, Genre, Comment, "
+                    "Publisher, Developer, Platforms, Price) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    gameRows(count, ownedRatio))
+    con.commit()
+    con.close()
+
+
+def timeQuery(con: sqlite3.Connection, sql: str, params=(), repeat: int = 5) -> float:
+    # Best of 'repeat' runs, in milliseconds
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        con.execute(sql, params).fetchall()
+        best = min(best, perf_counter() - start)
+
+    return best * 1000
+
+
+def queryPlan(con: sqlite3.Connection, sql: str, params=()) -> str:
+    return "; ".join(row[3] for row in con.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def plans(args):
+    # The queries the table views, overview and status bar run the most.
+    # The sorted views only time the first chunk, which is what a view loads up front.
+    # Name: SQL before migrating, SQL after migrating (None if it's the same), values
+    queries = {
+        "Owned games, display order": ("SELECT * FROM games WHERE Game='Yes' OR Box='Yes' OR Manual='Yes' "
+                                       "ORDER BY Platform ASC, Name ASC LIMIT 256",
+                                       "SELECT * FROM games WHERE owned_mask <> 0 "
+                                       "ORDER BY Platform ASC, Name ASC LIMIT 256", ()),
+        "Owned games, last page": ("SELECT * FROM games WHERE Game='Yes' OR Box='Yes' OR Manual='Yes' "
+                                   "ORDER BY Platform DESC, Name DESC LIMIT 256",
+                                   "SELECT * FROM games WHERE owned_mask <> 0 "
+                                   "ORDER BY Platform DESC, Name DESC LIMIT 256", ()),
+        "Owned games count": ("SELECT COUNT(*) FROM games WHERE Game='Yes' OR Box='Yes' OR Manual='Yes'",
+                              "SELECT COUNT(*) FROM games WHERE owned_mask <> 0", ()),
+        "All games, display order": ("SELECT * FROM games ORDER BY Platform ASC, Name ASC LIMIT 256", None, ()),
+        "Owned games in platform": ("SELECT COUNT(*) FROM games WHERE Platform=? "
+                                    "AND (Game='Yes' OR Box='Yes' OR Manual='Yes')",
+                                    "SELECT COUNT(*) FROM games WHERE Platform=? AND owned_mask <> 0",
+                                    ("Nintendo DS",)),
+        "Games in region": ("SELECT ID FROM games WHERE Region=?", None, ("PAL",)),
+        "Games from year": ("SELECT ID FROM games WHERE Year=?", None, ("1995",)),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows)
+
+        results = {}
+        con = sqlite3.connect(dbPath)
+        for name, (sql, _, params) in queries.items():
+            results[name] = [queryPlan(con, sql, params), timeQuery(con, sql, params)]
+        con.close()
+
+        migrate(dbPath)
+
+        con = sqlite3.connect(dbPath)
+        for name, (sql, sqlAfter, params) in queries.items():
+            sql = sqlAfter if sqlAfter is not None else sql
+            results[name] += [queryPlan(con, sql, params), timeQuery(con, sql, params)]
+        con.close()
+
+    print(f"Query plans for {args.rows} games, before and after migrating:\n")
+    for name, (planBefore, msBefore, planAfter, msAfter) in results.items():
+        print(name)
+        print(f"  before: {msBefore:8.2f} ms  {planBefore}")
+        print(f"  after:  {msAfter:8.2f} ms  {planAfter}")
+
+
+def search(args):
+    # The simple search as it was, a LIKE on every column, against the full-text index
+    likeSql = "SELECT ID FROM games WHERE " + " OR ".join(f'"{column}" LIKE ?' for column in searchColumns["games"])
+    ftsSql = "SELECT rowid FROM games_fts WHERE games_fts MATCH ?"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows)
+        migrate(dbPath)
+
+        con = sqlite3.connect(dbPath)
+        print(f"Simple search in {args.rows} games, LIKE vs full-text index vs both, as the search runs:\n")
+        print(f"{'term':<12}{'LIKE ms':>10}{'FTS ms':>10}{'both ms':>10}"
+              f"{'LIKE hits':>11}{'FTS hits':>10}{'both hits':>11}")
+        for term in args.terms:
+            likeParams = [f"%{term}%"] * len(searchColumns["games"])
+            ftsParams = (matchExpression(term),)
+            condition, searchParams = searchCondition("games", term)
+            searchSql = f"SELECT ID FROM games WHERE {condition}"
+            likeIds = {row[0] for row in con.execute(likeSql, likeParams)}
+            ftsIds = {row[0] for row in con.execute(ftsSql, ftsParams)}
+            searchIds = {row[0] for row in con.execute(searchSql, searchParams)}
+            print(f"{term:<12}{timeQuery(con, likeSql, likeParams):>10.2f}{timeQuery(con, ftsSql, ftsParams):>10.2f}"
+                  f"{timeQuery(con, searchSql, searchParams):>10.2f}"
+                  f"{len(likeIds):>11}{len(ftsIds):>10}{len(searchIds):>11}")
+        con.close()
+
+    print("\nLIKE matches anywhere in a word, the index only at the start of one "
+          "but ignores accents ('pokemon' finds 'Pokémon'). The search uses both.")
+
+
+def _openQtDatabase(dbPath: str):
+    # The table model works on QtSql connections, which need a Qt application
+    from PySide2.QtCore import QCoreApplication
+    from PySide2.QtSql import QSqlDatabase
+
+    if QCoreApplication.instance() is None:
+        _openQtDatabase.app = QCoreApplication(sys.argv)
+
+    db = QSqlDatabase.addDatabase("QSQLITE", dbPath)
+    db.setDatabaseName(dbPath)
+    db.open()
+
+    return db
+
+
+def insert(args):
+    # Adding a platform template's worth of games: one insertRecord on a QSqlTableModel
+    # and one log line per game like Table.addData used to do, against the batched inserts
+    from PySide2.QtSql import QSqlTableModel
+    from utilities.log import logger
+    from widgets.table import TableModel, _tableColumns
+
+    columns = _tableColumns["games"][1:]
+    items = [dict(zip([column.lower() for column in columns], row)) for row in gameRows(args.rows, 0)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPaths = [str(Path(tmp, "rowbyrow.db")), str(Path(tmp, "batched.db"))]
+        for dbPath in dbPaths:
+            createCollection(dbPath, 0)
+            migrate(dbPath)
+
+        model = QSqlTableModel(None, _openQtDatabase(dbPaths[0]))
+        model.setTable("games")
+        model.setEditStrategy(QSqlTableModel.OnFieldChange)
+        model.select()
+        start = perf_counter()
+        for item in items:
+            record = model.record()
+            record.remove(record.indexOf("ID"))
+            for column in columns:
+                record.setValue(column, item[column.lower()])
+            if model.insertRecord(-1, record):
+                logger.info(f"Added to table 'games': {item}")
+        rowByRow = perf_counter() - start
+
+        model = TableModel("games", _tableColumns["games"], _openQtDatabase(dbPaths[1]))
+        start = perf_counter()
+        model.insertItems(items)
+        batched = perf_counter() - start
+
+    batches = -(-args.rows // TableModel.insertBatchSize)
+    print(f"Adding {args.rows} games:")
+    print(f"  row by row: {rowByRow:8.2f} s  ({args.rows} commits)")
+    print(f"  batched:    {batched:8.2f} s  ({batches} commits, {rowByRow / batched:.1f}x faster)")
+    print("\nMost of what row by row costs more is syncing each commit to disk, so how much faster "
+          "batching is depends on the disk.")
+
+
+def delete(args):
+    # Clearing the not owned games from an imported template: one autocommitted
+    # DELETE per ID like Table.deleteNotOwned used to do, against one set-based DELETE
+    from PySide2.QtSql import QSqlQuery
+    from utilities.bulkdelete import deleteItems
+
+    notOwned = "SELECT ID FROM games WHERE owned_mask = 0"
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("rowbyrow", "setbased"):
+            dbPath = str(Path(tmp, f"{name}.db"))
+            createCollection(dbPath, args.rows, args.owned)
+            migrate(dbPath)
+            db = _openQtDatabase(dbPath)
+
+            start = perf_counter()
+            ids = []
+            query = QSqlQuery(db)
+            query.exec_(notOwned)
+            while query.next():
+                ids.append(query.value(0))
+            if name == "rowbyrow":
+                for itemId in ids:
+                    query.exec_(f"DELETE FROM games WHERE ID={itemId}")
+            else:
+                deleteItems(db, "games", ids)
+            timings.append(perf_counter() - start)
+
+    print(f"Deleting {len(ids)} not owned games out of {args.rows}:")
+    print(f"  row by row: {timings[0]:8.2f} s")
+    print(f"  set-based:  {timings[1]:8.2f} s  ({timings[0] / timings[1]:.0f}x faster)")
+
+
+def paging(args):
+    # Time the table model's page loads at different table sizes. The view only
+    # asks for the rows it shows, so these are what scrolling and jumping cost.
+    from PySide2.QtSql import QSqlDatabase
+    from widgets.table import TableModel, _tableColumns
+    from utilities.queries import clearQueryCache
+
+    def timeRow(model, row: int) -> float:
+        start = perf_counter()
+        model.index(row, 2).data()
+        return (perf_counter() - start) * 1000
+
+    print(f"{'games':>8}{'first':>10}{'next':>10}{'end':>10}{'end-1':>10}{'middle':>10}   (ms per page load)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.rows:
+            dbPath = str(Path(tmp, f"collection{count}.db"))
+            createCollection(dbPath, count)
+            migrate(dbPath)
+
+            db = _openQtDatabase(dbPath)
+            model = TableModel("games", _tableColumns["games"], db)
+            model.setFilter("1=1")
+
+            rows = model.rowCount()
+            page = TableModel.pageSize
+            times = [timeRow(model, 0), timeRow(model, page), timeRow(model, rows - 1),
+                     timeRow(model, rows - 1 - page), timeRow(model, rows // 2)]
+            print(f"{count:>8}" + "".join(f"{ms:>10.2f}" for ms in times))
+
+            del model
+            clearQueryCache(db)
+            db.close()
+            del db
+            QSqlDatabase.removeDatabase(dbPath)
+
+
+def paint(args):
+    # Scroll a table view through a whole table offscreen, one screen per frame, and repaint
+    # a single screen over and over. Compares the model's data()/flags() with the ones that
+    # looked up the column's header name and built new fonts and colors for every call.
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide2.QtCore import Qt
+    from PySide2.QtGui import QColor, QFont
+    from PySide2.QtSql import QSqlDatabase
+    from PySide2.QtWidgets import QApplication, QTableView
+    from utilities.queries import clearQueryCache
+    from widgets.table import TableModel, _tableColumns
+
+    class HeaderLookupModel(TableModel):
+        def flags(self, index):
+            flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+            if self.headerData(index.column(), Qt.Horizontal) in ("Game", "Console", "Accessory", "Box", "Manual"):
+                return flags | Qt.ItemIsUserCheckable
+            return flags
+
+        def data(self, index, role=Qt.DisplayRole):
+            header = self.headerData(index.column(), Qt.Horizontal)
+            if role in (Qt.CheckStateRole, Qt.DisplayRole) and header in ("Game", "Console", "Accessory",
+                                                                          "Box", "Manual"):
+                if role == Qt.CheckStateRole:
+                    if index.data(Qt.EditRole) == "Yes":
+                        return Qt.Checked
+                    elif index.data(Qt.EditRole) == "No":
+                        return Qt.Unchecked
+                elif role == Qt.DisplayRole:
+                    return self._value(index)
+            elif role == Qt.FontRole and header in ("Region", "Country", "Game", "Console", "Accessory",
+                                                    "Box", "Manual"):
+                font = QFont()
+                font.setBold(True)
+                return font
+            elif role == Qt.ForegroundRole:
+                if self.headerData(index.column(), Qt.Horizontal) == "Region":
+                    if index.data() in ("PAL", "PAL A", "PAL B", "Europe"):
+                        return QColor(255, 255, 0)
+                    elif index.data() in ("NTSC (JP)", "Japan"):
+                        return QColor(255, 0, 0)
+                    elif index.data() in ("NTSC (NA)", "North America"):
+                        return QColor(0, 0, 255)
+                elif self.headerData(index.column(), Qt.Horizontal) in ("Game", "Console", "Accessory",
+                                                                        "Box", "Manual"):
+                    if index.data(Qt.EditRole) == "Yes":
+                        return QColor(0, 255, 0)
+                    elif index.data(Qt.EditRole) == "No":
+                        return QColor(255, 0, 0)
+            elif role == Qt.TextAlignmentRole and self.headerData(index.column(), Qt.Horizontal) in ("Region",
+                                                                                                   "Country"):
+                return Qt.AlignCenter
+            elif role in (Qt.DisplayRole, Qt.EditRole):
+                return self._value(index)
+            return None
+
+    def frameTimes(view: QTableView, positions: list) -> list:
+        times = []
+        scrollBar = view.verticalScrollBar()
+        for position in positions:
+            start = perf_counter()
+            scrollBar.setValue(position)
+            view.viewport().repaint()
+            times.append((perf_counter() - start) * 1000)
+        return sorted(times)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    print(f"{args.rows} games, {args.width}x{args.height} view (ms per frame)")
+    print(f"{'':>16}{'scroll mean':>14}{'scroll p95':>12}{'repaint mean':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows, 0.5)
+        migrate(dbPath)
+        db = _openQtDatabase(dbPath)
+
+        for name, modelClass in (("header lookup", HeaderLookupModel), ("precomputed", TableModel)):
+            model = modelClass("games", _tableColumns["games"], db)
+            model.setFilter("1=1")
+            view = QTableView()
+            view.setModel(model)
+            view.resize(args.width, args.height)
+            view.show()
+            app.processEvents()
+
+            screen = max(1, view.verticalHeader().visualIndexAt(view.viewport().height() - 1))
+            scroll = frameTimes(view, list(range(0, model.rowCount(), screen)))
+            repaint = frameTimes(view, [0] * args.repaints)
+            print(f"{name:>16}{sum(scroll) / len(scroll):>14.2f}{scroll[int(len(scroll) * 0.95)]:>12.2f}"
+                  f"{sum(repaint) / len(repaint):>14.2f}")
+
+            view.close()
+            del view, model
+
+        clearQueryCache(db)
+        db.close()
+        del db
+        QSqlDatabase.removeDatabase(dbPath)
+
+
+def value(args):
+    # The collection's value: every owned item's price text split and summed in Python like
+    # MainWindow.totalValue used to do, against one SUM over the typed price columns
+    from utilities.prices import collectionValue
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows, args.owned)
+        migrate(dbPath)
+
+        con = sqlite3.connect(dbPath)
+        start = perf_counter()
+        total = 0.0
+        for game, box, manual, price in con.execute("SELECT Game, Box, Manual, Price FROM games "
+                                                    "WHERE Game='Yes' OR Box='Yes' OR Manual='Yes'"):
+            price = price.split(",")[2 if game == box == manual == "Yes" else 1]
+            if price != "N/A":
+                total += float(price.lstrip("$"))
+        parsing = perf_counter() - start
+        con.close()
+
+        db = _openQtDatabase(dbPath)
+        start = perf_counter()
+        values = collectionValue(["games"], db)
+        summing = perf_counter() - start
+
+    print(f"Value of {int(args.rows * args.owned)} owned games out of {args.rows}:")
+    print(f"  parsing prices: {parsing * 1000:8.2f} ms  ${total:.2f}")
+    print(f"  SQL SUM:        {summing * 1000:8.2f} ms  ${values[0][1] / 100:.2f}  ({parsing / summing:.0f}x faster)")
+
+
+def genres(args):
+    # The genre list and the randomizer's game selection: every owned game's genre string split
+    # in Python like MainWindow and Randomizer used to do, against queries on the genre links
+    from utilities.facets import FacetCatalog
+    from utilities.genres import matchingGames
+
+    selections = [(["PlayStation"], ["Action"], False), ([], ["Puzzle", "Sports"], False),
+                  ([], ["Action", "Shooter"], True), (_platforms[:3], ["Racing / Driving"], True)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows, args.owned)
+        migrate(dbPath)
+
+        con = sqlite3.connect(dbPath)
+        start = perf_counter()
+        owned = [dict(id=row[0], platform=row[1], name=row[2], genre=row[3])
+                 for row in con.execute("SELECT ID, Platform, Name, Genre FROM games WHERE owned_mask <> 0")]
+        names = sorted({genre for row in owned for genre in row["genre"].split(", ")}, key=str.lower)
+        listing = perf_counter() - start
+
+        start = perf_counter()
+        oldCounts = []
+        for platforms, selected, exclusive in selections:
+            count = 0
+            for row in owned:
+                if len(platforms) > 0 and row["platform"] not in platforms:
+                    continue
+                rowGenres = row["genre"].split(", ")
+                if exclusive:
+                    count += all(genre in selected for genre in rowGenres) and len(rowGenres) == len(selected)
+                else:
+                    count += any(genre in selected for genre in rowGenres)
+            oldCounts.append(count)
+        splitting = perf_counter() - start
+        con.close()
+
+        db = _openQtDatabase(dbPath)
+        start = perf_counter()
+        newNames = FacetCatalog(db).values("genre")
+        querying = perf_counter() - start
+
+        start = perf_counter()
+        newCounts = [len(matchingGames(*selection, db=db)) for selection in selections]
+        matching = perf_counter() - start
+
+    print(f"Genres of {int(args.rows * args.owned)} owned games out of {args.rows}:")
+    print(f"  genre list, split:     {listing * 1000:8.2f} ms  {len(names)} genres")
+    print(f"  genre list, catalog:   {querying * 1000:8.2f} ms  {len(newNames)} genres  "
+          f"({listing / querying:.0f}x faster)")
+    print(f"  {len(selections)} selections, split: {splitting * 1000:8.2f} ms  {oldCounts}")
+    print(f"  {len(selections)} selections, links: {matching * 1000:8.2f} ms  {newCounts}  "
+          f"({splitting / matching:.1f}x faster)")
+
+
+def history(args):
+    # Refreshing every game's prices once a day for a while, with a few of them changing each day.
+    # Only changes are stored, and the collection's value over time and the biggest movers are
+    # worked out from the history with one query each.
+    from datetime import date, timedelta
+
+    from utilities.prices import biggestMovers, valueOverTime
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows, args.owned)
+        migrate(dbPath)
+
+        con = sqlite3.connect(dbPath)
+        rnd = random.Random(1)
+        prices = dict(con.execute("SELECT ID, loose_cents FROM games WHERE loose_cents IS NOT NULL"))
+        start = perf_counter()
+        for _ in range(args.days):
+            # Move the history back a day, so today's refresh is on a new day
+            con.execute("UPDATE price_history SET Day = Day - 1")
+            for itemId in rnd.sample(list(prices.keys()), int(len(prices) * args.changed)):
+                prices[itemId] += rnd.randint(-100, 100)
+            con.executemany("UPDATE games SET loose_cents = ?, cib_cents = ? * 3 / 2 WHERE ID = ?",
+                            [(loose, loose, itemId) for itemId, loose in prices.items()])
+            con.commit()
+        refreshing = perf_counter() - start
+        historyRows = con.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+        pages = con.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'price_history'").fetchone()[0] \
+            if con.execute("SELECT 1 FROM pragma_module_list WHERE name = 'dbstat'").fetchone() else None
+        con.close()
+
+        db = _openQtDatabase(dbPath)
+        start = perf_counter()
+        values = valueOverTime(["games"], db=db)
+        overTime = perf_counter() - start
+
+        start = perf_counter()
+        movers = biggestMovers(["games"], date.today() - timedelta(days=args.days // 2), 10, db)
+        moving = perf_counter() - start
+
+    print(f"{args.days} daily refreshes of {len(prices)} prices, {args.changed:.0%} changing each day "
+          f"({refreshing:.1f} s):")
+    print(f"  history rows:    {historyRows} (a row per refresh would be {len(prices) * (args.days + 1)})"
+          + (f", {pages} pages" if pages is not None else ""))
+    print(f"  value over time: {overTime * 1000:8.2f} ms  {len(values)} days")
+    print(f"  biggest movers:  {moving * 1000:8.2f} ms  {len(movers)} items")
+
+
+def templates(args):
+    # Importing platform templates: parsing the text files into item dictionaries and
+    # adding them in batches like the import window used to, against one INSERT ... SELECT
+    # from the compiled index. Compiling the index from scratch is timed too, it's done once.
+    from utilities.templates import compileTemplates, importTemplates, templatesDir
+    from utilities.text2dict import createGameData
+    from widgets.table import TableModel, _tableColumns
+
+    names = args.templates if args.templates is not None else \
+        sorted(file.stem for file in Path(templatesDir).glob("*.dat"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPaths = [str(Path(tmp, "parsed.db")), str(Path(tmp, "indexed.db"))]
+        for dbPath in dbPaths:
+            createCollection(dbPath, 0)
+            migrate(dbPath)
+        index = str(Path(tmp, "templates.db"))
+
+        start = perf_counter()
+        counts = compileTemplates(index=index)
+        compiling = perf_counter() - start
+
+        start = perf_counter()
+        compileTemplates(index=index)
+        checking = perf_counter() - start
+
+        model = TableModel("games", _tableColumns["games"], _openQtDatabase(dbPaths[0]))
+        start = perf_counter()
+        items = []
+        for name in names:
+            items += createGameData(Path(templatesDir, f"{name}.dat"))
+        parsing = perf_counter() - start
+        model.insertItems(items)
+        parsed = perf_counter() - start
+
+        start = perf_counter()
+        imported = importTemplates(_openQtDatabase(dbPaths[1]), names, index)
+        indexed = perf_counter() - start
+
+    print(f"Importing {len(names)} templates, {sum(counts[name] for name in names)} games:")
+    print(f"  compiling the index: {compiling * 1000:8.1f} ms  (once)")
+    print(f"  checking the index:  {checking * 1000:8.1f} ms  (every time the import window opens)")
+    print(f"  parse and insert:    {parsed * 1000:8.1f} ms  ({parsing * 1000:.1f} ms parsing)  {len(items)} games")
+    print(f"  insert from index:   {indexed * 1000:8.1f} ms  {imported} games  ({parsed / indexed:.1f}x faster)")
+
+
+# Started in a new interpreter by 'startup', so the program's modules are imported cold.
+# Prints how long importing the main window, building it, and getting its first paint took.
+_startupScript = """
+import sys
+from time import perf_counter
+start = perf_counter()
+sys.path.insert(0, {gcmDir!r})
+
+from PySide2.QtCore import QEvent, QObject
+from PySide2.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from widgets.mainwindow import MainWindow
+imported = perf_counter()
+
+window = MainWindow({dbPath!r})
+built = perf_counter()
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and obj.isWidgetType() and obj.window() is window:
+            app.removeEventFilter(self)
+            print(imported - start, built - imported, perf_counter() - built)
+            app.exit()
+        return False
+
+
+firstPaint = FirstPaint()
+app.installEventFilter(firstPaint)
+window.show()
+app.exec_()
+"""
+
+
+def _importCosts(stderr: str) -> dict:
+    # Sums up -X importtime's self times per top level package, in milliseconds
+    costs = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        selfTime, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        costs[package] = costs.get(package, 0) + int(selfTime) / 1000
+
+    return costs
+
+
+def startup(args):
+    # Cold starts of the program against a generated collection, each in a new interpreter:
+    # the time until the main window is first painted, and which packages the imports spend it on.
+    # Exits with an error if the median time to first paint is over the budget.
+    import subprocess
+    from statistics import median
+
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dbPath = str(Path(tmp, "collection.db"))
+        createCollection(dbPath, args.rows, args.owned)
+        migrate(dbPath)
+        script = _startupScript.format(gcmDir=str(_gcmDir), dbPath=dbPath)
+
+        runs = []
+        costs = {}
+        for _ in range(args.runs):
+            start = perf_counter()
+            process = subprocess.run([sys.executable, "-X", "importtime", "-c", script], env=env,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            total = perf_counter() - start
+            if process.returncode != 0 or len(process.stdout.split()) != 3:
+                sys.exit(f"The program didn't start:\n{process.stderr[-2000:]}")
+            runs.append([total] + [float(value) for value in process.stdout.split()])
+            for package, cost in _importCosts(process.stderr).items():
+                costs.setdefault(package, []).append(cost)
+
+    # -X importtime slows importing down a bit, so the phases are a bit longer than without it
+    total, importing, building, painting = (median(values) * 1000 for values in zip(*runs))
+    print(f"Cold start with {args.rows} games, median of {args.runs} runs:")
+    print(f"  time to first paint: {total:8.1f} ms  (budget {args.budget} ms)")
+    print(f"  importing:           {importing:8.1f} ms")
+    print(f"  building the window: {building:8.1f} ms")
+    print(f"  first paint:         {painting:8.1f} ms")
+    print("\nImport time per package:")
+    costs = sorted(((median(values), package) for package, values in costs.items()), reverse=True)
+    for cost, package in costs[:args.packages]:
+        print(f"  {package:24} {cost:8.1f} ms")
+    print(f"  {'(others)':24} {sum(cost for cost, _ in costs[args.packages:]):8.1f} ms")
+
+    if total > args.budget:
+        sys.exit(f"Time to first paint {total:.0f} ms is over the {args.budget} ms budget.")
+
+
+def http(args):
+    # Fetching pages with a new connection per request, like the scrapers used to, vs through the
+    # shared session, and then through the HTTP cache: empty, fresh, and expired so every page is
+    # revalidated. The server is local, so it waits a while on every new connection to stand in
+    # for the TCP and TLS handshakes with a real server.
+    import gzip
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+    from utilities import httpcache, httpclient, ratelimit
+
+    page = ("<html><body>" + "<p>Release info</p>" * 2500 + "</body></html>").encode()
+    compressed = gzip.compress(page)
+    etag = '"release-info-1"'
+    stats = {"connections": 0, "bytes": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            stats["connections"] += 1
+            sleep(args.handshake / 1000)
+            super(Handler, self).setup()
+
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            body = compressed if "gzip" in self.headers.get("Accept-Encoding", "") else page
+            stats["bytes"] += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            if body is compressed:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/game/nes/game-{i}/release-info" for i in range(args.requests)]
+    ratelimit.hostRates["127.0.0.1"] = (1e6, 10 ** 6)  # Measure the requests, not the rate limit
+
+    def expire():
+        httpcache.hostTTLs["127.0.0.1"] = 0
+        for url in urls:
+            httpclient.cache().refresh(url)
+        httpcache.hostTTLs["127.0.0.1"] = httpcache.defaultTTL
+
+    with tempfile.TemporaryDirectory() as tmp:
+        httpclient.setCache(httpcache.HttpCache(str(Path(tmp, "httpcache.db"))))
+        runs = [("new connection each", lambda url: requests.get(url, headers={"Accept-Encoding": "identity"}), None),
+                ("shared session", lambda url: httpclient.get(url, cached=False), None),
+                ("empty cache", httpclient.get, None),
+                ("fresh cache", httpclient.get, None),
+                ("expired cache", httpclient.get, expire)]
+
+        print(f"{args.requests} pages, {args.handshake} ms per new connection:")
+        for name, get, before in runs:
+            if before is not None:
+                before()
+            stats.update(connections=0, bytes=0)
+            start = perf_counter()
+            for url in urls:
+                assert get(url).text == page.decode()
+            elapsed = perf_counter() - start
+            print(f"  {name:<20} {elapsed * 1000:8.1f} ms  {stats['connections']:4} connections  "
+                  f"{stats['bytes'] / 1024:8.1f} KiB received")
+        print(f"Cache size: {httpclient.cache().size() / 1024:.1f} KiB for {args.requests} pages of "
+              f"{len(page) / 1024:.1f} KiB")
+        httpclient.setCache(None)
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for Game Collection Manager")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    plansParser = commands.add_parser("plans", help="Query plans and timings before/after the schema migrations")
+    plansParser.add_argument("--rows", type=int, default=50000, help="Number of games to generate")
+    plansParser.set_defaults(func=plans)
+
+    searchParser = commands.add_parser("search", help="Simple search with LIKE vs the full-text index")
+    searchParser.add_argument("--rows", type=int, default=100000, help="Number of games to generate")
+    searchParser.add_argument("--terms", nargs="+", default=["mario", "pokemon", "zelda link", "199", "pal"],
+                              help="Search terms to time")
+    searchParser.set_defaults(func=search)
+
+    insertParser = commands.add_parser("insert", help="Adding games row by row vs in batches")
+    insertParser.add_argument("--rows", type=int, default=10000, help="Number of games to add")
+    insertParser.set_defaults(func=insert)
+
+    deleteParser = commands.add_parser("delete", help="Deleting not owned games row by row vs set-based")
+    deleteParser.add_argument("--rows", type=int, default=50000, help="Number of games to generate")
+    deleteParser.add_argument("--owned", type=float, default=0.2, help="Fraction of the games that are owned")
+    deleteParser.set_defaults(func=delete)
+
+    pagingParser = commands.add_parser("paging", help="Table model page loads at different table sizes")
+    pagingParser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 500000],
+                              help="Numbers of games to generate")
+    pagingParser.set_defaults(func=paging)
+
+    paintParser = commands.add_parser("paint", help="Table view frame times scrolling through a table offscreen")
+    paintParser.add_argument("--rows", type=int, default=50000, help="Number of games to generate")
+    paintParser.add_argument("--width", type=int, default=1600, help="View width in pixels")
+    paintParser.add_argument("--height", type=int, default=900, help="View height in pixels")
+    paintParser.add_argument("--repaints", type=int, default=200, help="Repaints of the same screen to time")
+    paintParser.set_defaults(func=paint)
+
+    valueParser = commands.add_parser("value", help="Collection value from the price text vs SQL")
+    valueParser.add_argument("--rows", type=int, default=100000, help="Number of games to generate")
+    valueParser.add_argument("--owned", type=float, default=0.5, help="Fraction of the games that are owned")
+    valueParser.set_defaults(func=value)
+
+    genresParser = commands.add_parser("genres", help="Genre list and randomizer selections from the genre "
+                                                      "strings vs the genre links")
+    genresParser.add_argument("--rows", type=int, default=100000, help="Number of games to generate")
+    genresParser.add_argument("--owned", type=float, default=0.5, help="Fraction of the games that are owned")
+    genresParser.set_defaults(func=genres)
+
+    historyParser = commands.add_parser("history", help="Price history size and trend queries after daily refreshes")
+    historyParser.add_argument("--rows", type=int, default=20000, help="Number of games to generate")
+    historyParser.add_argument("--owned", type=float, default=0.5, help="Fraction of the games that are owned")
+    historyParser.add_argument("--days", type=int, default=30, help="Number of daily price refreshes")
+    historyParser.add_argument("--changed", type=float, default=0.05,
+                               help="Fraction of the prices changing each day")
+    historyParser.set_defaults(func=history)
+
+    templatesParser = commands.add_parser("templates", help="Importing platform templates by parsing the text "
+                                                            "files vs from the compiled index")
+    templatesParser.add_argument("--templates", nargs="+", help="Names of the templates to import, all if not given")
+    templatesParser.set_defaults(func=templates)
+
+    startupParser = commands.add_parser("startup", help="Cold start time to the main window's first paint, "
+                                                        "and import time per package")
+    startupParser.add_argument("--rows", type=int, default=20000, help="Number of games to generate")
+    startupParser.add_argument("--owned", type=float, default=0.2, help="Fraction of the games that are owned")
+    startupParser.add_argument("--runs", type=int, default=5, help="Number of starts to take the median of")
+    startupParser.add_argument("--budget", type=int, default=1500, help="Longest acceptable time to first "
+                                                                        "paint, in milliseconds")
+    startupParser.add_argument("--packages", type=int, default=12, help="Number of packages to list")
+    startupParser.set_defaults(func=startup)
+
+    httpParser = commands.add_parser("http", help="Fetching pages with a new connection each vs the shared session")
+    httpParser.add_argument("--requests", type=int, default=12, help="Number of pages to fetch, "
+                                                                     "a release lookup takes 3-12")
+    httpParser.add_argument("--handshake", type=int, default=60, help="Time a new connection takes, "
+                                                                      "in milliseconds")
+    httpParser.set_defaults(func=http)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,13 @@ if ($DestinationFile | Test-Path) {
 ""
 iex $PyInstaller
 
+""
+"#########################"
+"# Compiling templates   #"
+"#########################"
+""
+python $PSScriptRoot\compiletemplates.py
+
 ""
 "#####################"
 "# Copying data files #"
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+"""
+Compiles the platform templates in data/vgdb into the index the import window imports from.
+The program keeps the index up to date by itself, this is for building it ahead of time.
+Run from the source dir:
+    python tools/compiletemplates.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+_gcmDir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_gcmDir))
+os.chdir(_gcmDir)
+
+from utilities.templates import compileTemplates, indexPath  # noqa: E402
+
+counts = compileTemplates()
+if len(counts) == 0:
+    sys.exit("Couldn't compile the templates, see data/log/error.log")
+print(f"{len(counts)} templates, {sum(counts.values())} games in '{indexPath}'")
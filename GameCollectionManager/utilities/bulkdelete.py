@@ -0,0 +1,129 @@
+"""
+Deleting many items at once. The rows are deleted with a single set-based DELETE,
+and the cover images no game uses anymore are removed on a background thread.
+"""
+from PySide2.QtCore import QRunnable, QThreadPool
+from PySide2.QtSql import QSqlDatabase, QSqlQuery
+
+from utilities.coverstore import removeImages, removeLegacyCovers, unusedImages
+from utilities.database import beginWrite, closeConnection
+from utilities.log import logger
+from utilities.migrations import bulkDeleteTriggers
+
+
+class _CoverRemover(QRunnable):
+    def __init__(self, gameIds: list, hashes: list):
+        super(_CoverRemover, self).__init__()
+        self._gameIds = gameIds
+        self._hashes = hashes
+
+    def run(self):
+        removed = removeLegacyCovers(self._gameIds) + removeImages(self._hashes)
+        closeConnection()
+        if removed > 0:
+            logger.info(f"Removed {removed} covers.")
+
+
+def suspendTriggers(db: QSqlDatabase, triggers: list) -> list:
+    """
+    Drops triggers for the rest of the current transaction. Recreate them with
+    the returned statements before committing.
+    :param db: Database connection, in a transaction
+    :param triggers: Names of the triggers
+    :return: (list) SQL statements recreating the dropped triggers, or None if something failed
+    """
+    statements = []
+    query = QSqlQuery(db)
+    for trigger in triggers:
+        query.prepare("SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?")
+        query.addBindValue(trigger)
+        query.exec_()
+        if query.first():
+            statements.append(query.value(0))
+            if not query.exec_(f"DROP TRIGGER {trigger}"):
+                logger.error(f"Couldn't drop trigger '{trigger}': {query.lastError().text()}")
+                return None
+
+    return statements
+
+
+def _delete(db: QSqlDatabase, table: str, ids: list) -> tuple:
+    # Deletes the items in the current transaction. Returns the number of deleted items,
+    # the hashes of the cover images no longer used, and an error message if something failed.
+    query = QSqlQuery(db)
+
+    # The IDs go in a temporary table, so there's no limit on how many can be in the IN (...)
+    query.exec_("CREATE TEMP TABLE IF NOT EXISTS bulk_delete (ID INTEGER PRIMARY KEY)")
+    query.exec_("DELETE FROM temp.bulk_delete")
+    query.prepare("INSERT INTO temp.bulk_delete (ID) VALUES (?)")
+    for itemId in ids:
+        query.addBindValue(itemId)
+        if not query.exec_():
+            return 0, [], query.lastError().text()
+
+    query.exec_(f"SELECT COUNT(*) FROM {table}")
+    query.first()
+    rowCount = query.value(0)
+
+    # Only games have covers
+    hashes = []
+    if table == "games":
+        query.exec_("SELECT DISTINCT Hash FROM covers WHERE GameID IN (SELECT ID FROM temp.bulk_delete)")
+        while query.next():
+            hashes.append(query.value(0))
+
+    # Deleting a row means updating every index on the table. When most of the table goes,
+    # it's faster to copy out the rows that stay, empty the table and put them back.
+    most = len(ids) > rowCount // 2
+    if most:
+        deleteStatements = ["DROP TABLE IF EXISTS temp.bulk_keep",
+                            f"CREATE TEMP TABLE bulk_keep AS SELECT * FROM {table} "
+                            f"WHERE ID NOT IN (SELECT ID FROM temp.bulk_delete)",
+                            f"DELETE FROM {table}",
+                            f"INSERT INTO {table} SELECT * FROM temp.bulk_keep",
+                            "DROP TABLE temp.bulk_keep"]
+    else:
+        deleteStatements = [f"DELETE FROM {table} WHERE ID IN (SELECT ID FROM temp.bulk_delete)"]
+
+    # Update the search index and counts for all rows at once instead of in the row triggers
+    triggers, before, after = bulkDeleteTriggers(table, "SELECT ID FROM temp.bulk_delete", most)
+    triggerSql = suspendTriggers(db, triggers)
+    if triggerSql is None:
+        return 0, [], "Couldn't drop the triggers"
+
+    for statement in before + deleteStatements + after + triggerSql + ["DELETE FROM temp.bulk_delete"]:
+        if not query.exec_(statement):
+            return 0, [], query.lastError().text()
+
+    query.exec_(f"SELECT COUNT(*) FROM {table}")
+    query.first()
+
+    return rowCount - query.value(0), unusedImages(hashes, db), None
+
+
+def deleteItems(db: QSqlDatabase, table: str, ids) -> int:
+    """
+    Deletes items from a table in one transaction, and the covers of deleted games in the background
+    :param db: Database connection
+    :param table: Item table to delete from
+    :param ids: IDs of the items, duplicates are fine
+    :return: (int) Number of items deleted
+    """
+    ids = sorted(set(ids))
+    if len(ids) == 0:
+        return 0
+
+    if not beginWrite(db):
+        return 0
+    deleted, hashes, error = _delete(db, table, ids)
+    if error is not None or not db.commit():
+        logger.error(f"Couldn't delete {len(ids)} items from table '{table}': "
+                     f"{error if error is not None else db.lastError().text()}")
+        db.rollback()
+        return 0
+
+    logger.info(f"Deleted {deleted} items from table '{table}'.")
+    if table == "games":
+        QThreadPool.globalInstance().start(_CoverRemover(ids, hashes))
+
+    return deleted
@@ -0,0 +1,279 @@
+"""
+Fetches info, prices and covers for all owned games in the background. The work is kept in the
+database as tasks (see fetchqueue), so a fetch that's interrupted carries on where it left off.
+A small pool of worker threads claims tasks, with workers of their own for each kind of task.
+The sites' rate limits are kept per host by the HTTP client, so while the info workers wait for
+their turn at MobyGames the price worker can be fetching from PriceCharting, and the whole fetch
+takes about as long as the strictest site's limit allows. The results are sent to the GUI thread,
+which saves them in batches, each in one transaction with marking its tasks done.
+"""
+import threading
+from time import monotonic
+
+from PySide2.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+from utilities import fetchqueue, httpclient
+from utilities.coverstore import hasCover, removeImages, saveCover
+from utilities.database import closeConnection, connection
+from utilities.log import logger
+from utilities.queries import fetchValue
+from utilities.ratelimit import Cancelled, setCancelEvent
+
+# Workers per kind of task. Info takes the most requests, and the most parsing.
+workerCounts = {"info": 2, "price": 1, "cover": 1}
+batchSize = 20  # Results saved in one transaction
+batchDelay = 2000  # Milliseconds a result waits for the rest of its batch at most
+_idleWait = 1.0  # Seconds a worker without tasks waits before looking again
+
+
+def durationText(seconds: float) -> str:
+    """
+    Formats a duration for the status bar
+    :param seconds: The duration
+    :return: (str) E.g. '2 h 5 min', '3 min' or 'less than a minute'
+    """
+    minutes = int(seconds // 60)
+    if minutes == 0:
+        return "less than a minute"
+    if minutes < 60:
+        return f"{minutes} min"
+    return f"{minutes // 60} h {minutes % 60} min"
+
+
+def _fetch(task: fetchqueue.Task):
+    # Does a task's requests. Returns the info or prices as a dictionary, or the cover's bytes.
+    # The scrapers' imports are slow, so only when used
+    if task.kind == "info":
+        from utilities.fetchinfo import getMobyRelease
+        return getMobyRelease(task.name, task.platform, task.region)
+    if task.kind == "price":
+        from utilities.fetchprice import getPriceData
+        return getPriceData(task.name, task.platform, task.region)
+
+    response = httpclient.get(task.data)
+    response.raise_for_status()
+    return response.content
+
+
+class _Worker(QRunnable):
+    def __init__(self, fetcher, generation: int, kind: str):
+        super(_Worker, self).__init__()
+        self._fetcher = fetcher
+        self._generation = generation
+        self._kind = kind
+
+    def run(self):
+        stop = self._fetcher.stopEvent(self._generation)
+        if stop is None:
+            return  # Stopped before it got to run
+
+        # Qt's connections, not sqlite3's: two SQLite libraries writing to the same file
+        # from one process don't see each other's locks
+        db = connection()
+        setCancelEvent(stop)
+        try:
+            while not stop.is_set():
+                task = fetchqueue.claim(db, self._kind)
+                if task is None:  # Tasks can still be added, or be due to be tried again
+                    stop.wait(_idleWait)
+                    continue
+
+                try:
+                    result, error = _fetch(task), ""
+                except Cancelled:
+                    break
+                except Exception as e:  # A page the scrapers can't make sense of shouldn't stop the others
+                    result, error = None, str(e) or type(e).__name__
+                self._fetcher.taskDone.emit(self._generation, task, result, error)
+        finally:
+            setCancelEvent(None)
+            del db
+            closeConnection()
+
+
+class BulkFetcher(QObject):
+    """
+    Fetches info, prices and covers for the owned games on worker threads
+    table: The games table, the results are saved through it
+    """
+
+    progress = Signal(int, int, float)  # Tasks done, total, estimated seconds left
+    finished = Signal(int, int, bool)  # Tasks done, total, cancelled
+    coverSaved = Signal(int)  # ID of a game whose cover was saved
+    taskDone = Signal(int, object, object, str)  # From the workers: the fetch they're part of, task, result, error
+
+    def __init__(self, table, parent=None):
+        super(BulkFetcher, self).__init__(parent)
+
+        self._table = table
+        self._db = table.model.database()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(sum(workerCounts.values()))
+        self._generation = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._total = 0
+        self._started = 0.0
+        self._results = []  # (task, result, error) waiting to be saved
+        self._batchTimer = QTimer(self)
+        self._batchTimer.setSingleShot(True)
+        self._batchTimer.setInterval(batchDelay)
+        self._batchTimer.timeout.connect(self._saveResults)
+        self.taskDone.connect(self._taskDone)
+
+    def isRunning(self) -> bool:
+        return self._running
+
+    def stopEvent(self, generation: int) -> threading.Event:
+        # The event that stops a fetch's workers, None if the fetch has been stopped already
+        with self._lock:
+            if generation != self._generation or self._stop.is_set():
+                return None
+            return self._stop
+
+    def start(self, maxAge: float = fetchqueue.freshness):
+        """
+        Starts fetching for every owned game that hasn't been fetched recently,
+        along with what's left of an earlier fetch
+        :param maxAge: Seconds since a game was fetched before it's fetched again
+        """
+        if self._running:
+            return
+        if not fetchqueue.enqueue(self._db, maxAge):
+            logger.error("Couldn't add the fetch tasks.")
+            return
+        self._run()
+
+    def resume(self) -> bool:
+        """
+        Carries on with a fetch that was interrupted when the program was closed
+        :return: (bool) True if there was one to carry on with
+        """
+        if self._running or fetchqueue.resume(self._db) == 0:
+            return False
+        logger.info("Resuming fetching info.")
+        self._run()
+
+        return True
+
+    def cancel(self):
+        """Stops fetching and forgets the tasks left. What has been fetched is kept."""
+        if not self._running:
+            return
+        self._saveResults()
+        self._stopWorkers()
+        dropped = fetchqueue.drop(self._db)
+        logger.info(f"Cancelled fetching info, {dropped} tasks dropped.")
+        done, total = self._progress()
+        self.finished.emit(done, total, True)
+
+    def stop(self):
+        # Saves what's been fetched and waits for the workers, leaving the tasks left for next time
+        if self._running:
+            self._saveResults()
+            self._stopWorkers()
+        self._pool.waitForDone()
+
+    def _run(self):
+        with self._lock:
+            self._stop = threading.Event()
+            generation = self._generation
+        self._total = fetchqueue.remaining(self._db)
+        if self._total == 0:
+            self.finished.emit(0, 0, False)
+            return
+        self._running = True
+        self._started = monotonic()
+        logger.info(f"Fetching info, {self._total} tasks to do.")
+
+        for kind, count in workerCounts.items():
+            for _ in range(count):
+                self._pool.start(_Worker(self, generation, kind))
+        self.progress.emit(0, self._total, 0.0)
+
+    def _stopWorkers(self):
+        with self._lock:
+            self._generation += 1
+            self._stop.set()
+        self._batchTimer.stop()
+        self._pool.clear()
+        self._running = False
+
+    def _progress(self) -> tuple:
+        # Tasks done and the total so far. Cover tasks are added along the way.
+        return self._total - fetchqueue.remaining(self._db), self._total
+
+    def _taskDone(self, generation: int, task: fetchqueue.Task, result, error: str):
+        if generation != self._generation:
+            return  # Finished after its fetch was stopped
+
+        self._results.append((task, result, error))
+        if len(self._results) >= batchSize:
+            self._saveResults()
+        elif not self._batchTimer.isActive():
+            self._batchTimer.start()
+
+    def _saveResults(self):
+        self._batchTimer.stop()
+        results, self._results = self._results, []
+        if len(results) == 0:
+            return
+
+        # The info and price of a game are saved as one change to it
+        changes = {}
+        for task, result, error in results:
+            if error != "" or task.kind == "cover":
+                continue
+            data = changes.setdefault(task.gameId, {"id": task.gameId})
+            if task.kind == "info":
+                data.update(result)
+            else:  # Keep the price paid
+                paid = fetchValue("SELECT Price FROM games WHERE ID=?", (task.gameId,), self._db)
+                data["price"] = ",".join(((paid or "").split(",")[0], result["loose"], result["cib"], result["new"]))
+
+        covers, replaced, newTasks = [], [], 0
+
+        def saveTasks(db) -> bool:
+            nonlocal newTasks
+            for task, result, error in results:
+                if error == "" and task.kind == "cover" and not saveCover(task.gameId, result, db, replaced):
+                    error = "Not an image"
+                if error != "":
+                    logger.warning(f"Couldn't fetch {task.kind} for '{task.name}' on {task.platform}: {error}")
+                    fetchqueue.fail(db, task, error)
+                    continue
+                if not fetchqueue.finish(db, task):
+                    return False
+                if task.kind == "cover":
+                    covers.append(task.gameId)
+                elif task.kind == "info" and result.get("image", "") != "" and not hasCover(task.gameId, db):
+                    if not fetchqueue.addCover(db, task.gameId, result["image"]):
+                        return False
+                    newTasks += 1
+            return True
+
+        if not self._table.updateDataBatch(list(changes.values()), saveTasks):
+            # The tasks are tried again later like ones whose fetch failed, and given up on if saving keeps failing.
+            # The rest of the fetch can carry on.
+            logger.error(f"Couldn't save the info fetched for {len(results)} tasks.")
+            for task, _, _ in results:
+                fetchqueue.fail(self._db, task, "Couldn't save the result")
+            self._finishIfDone()
+            return
+
+        removeImages(replaced, self._db)
+        for gameId in covers:
+            self.coverSaved.emit(gameId)
+        self._total += newTasks
+        self._finishIfDone()
+
+    def _finishIfDone(self):
+        # Shows the progress, and stops the workers once every task is done or given up on
+        done, total = self._progress()
+        elapsed = monotonic() - self._started
+        self.progress.emit(done, total, elapsed / done * (total - done) if done > 0 else 0.0)
+        if done == total and self._running:
+            logger.info(f"Fetched info in {durationText(elapsed)}.")
+            self._stopWorkers()
+            self.finished.emit(done, total, False)
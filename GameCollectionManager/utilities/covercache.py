@@ -0,0 +1,149 @@
+"""
+Decoded covers, ready to be shown. Covers are read on worker threads, already scaled
+to the size they're shown at, and the pixmaps are kept in a memory bounded LRU cache
+so showing a recently shown cover again doesn't touch the disk. The covers are looked
+up in the database on the GUI thread, so the workers only read files.
+"""
+from collections import OrderedDict
+
+from PySide2.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, Signal
+from PySide2.QtGui import QImage, QImageReader, QPixmap
+
+from utilities.coverstore import coverHash, hasLegacyCover, moveLegacyCover, noCover, storeLegacyCover, \
+    thumbnailFile
+from utilities.log import logger
+
+
+class _Decode(QRunnable):
+    def __init__(self, cache, gameId: int, size: QSize, digest: str, generation: tuple):
+        super(_Decode, self).__init__()
+        self._cache = cache
+        self._gameId = gameId
+        self._size = size
+        self._digest = digest  # None for a cover saved the old way, which is stored first
+        self._generation = generation
+
+    def run(self):
+        digest = self._digest if self._digest is not None else storeLegacyCover(self._gameId)
+        cover = thumbnailFile(digest, max(self._size.width(), self._size.height())) if digest is not None else None
+
+        image = QImage()
+        if cover is not None:
+            # Only the thumbnail's pixels needed at this size are decoded
+            reader = QImageReader(cover)
+            scaled = reader.size()
+            scaled.scale(self._size, Qt.KeepAspectRatio)
+            reader.setScaledSize(scaled)
+            image = reader.read()
+            if image.isNull():
+                logger.error(f"Couldn't read cover '{cover}': {reader.errorString()}")
+
+        self._cache.decoded.emit(self._gameId, self._size, image, self._generation,
+                                 digest if self._digest is None else None)
+
+
+class CoverCache(QObject):
+    """
+    Game covers scaled to the size they're shown at, decoded on worker threads
+    and cached by (game ID, size)
+    """
+
+    loaded = Signal(int, QSize, QPixmap)  # Game ID, size, the cover or a null pixmap if the game has none
+    # From the worker threads, with the generation they started in and the hash of a cover saved the old way they stored
+    decoded = Signal(int, QSize, QImage, object, object)
+
+    def __init__(self, maxBytes: int = 64 * 1024 * 1024, parent=None):
+        super(CoverCache, self).__init__(parent)
+
+        self._maxBytes = maxBytes
+        self._bytes = 0
+        self._pixmaps = OrderedDict()  # (game ID, width, height): pixmap, least recently used first
+        self._pending = set()  # Keys being decoded
+        self._placeholders = {}  # (width, height): the 'no cover' image at that size
+        # Covers decoded before forget() was called for them are dropped
+        self._generation = 0
+        self._gameGenerations = {}  # Game ID: generation
+
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self.decoded.connect(self._store)
+
+    def cover(self, gameId: int, size: QSize) -> QPixmap:
+        """
+        Gets a game's cover scaled to fit a size. If it isn't cached, it's decoded on a
+        worker thread and sent with the 'loaded' signal when it's ready.
+        :param gameId: ID of the game
+        :param size: The size the cover is shown at
+        :return: (QPixmap) The cover, a null pixmap if the game has none, or None if it's being decoded
+        """
+        key = (gameId, size.width(), size.height())
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            return pixmap
+
+        if key not in self._pending:
+            digest = coverHash(gameId)
+            if digest is None and not hasLegacyCover(gameId):
+                return QPixmap()
+            self._pending.add(key)
+            self._pool.start(_Decode(self, gameId, QSize(size), digest, self._generationOf(gameId)))
+
+        return None
+
+    def forget(self, gameId: int = None):
+        """
+        Drops a game's cached covers, e.g. after its cover has been changed
+        :param gameId: ID of the game, all games if not given
+        """
+        if gameId is None:
+            self._generation += 1
+            self._pending.clear()
+        else:
+            self._gameGenerations[gameId] = self._gameGenerations.get(gameId, 0) + 1
+            self._pending = {key for key in self._pending if key[0] != gameId}
+        for key in [key for key in self._pixmaps.keys() if gameId is None or key[0] == gameId]:
+            self._bytes -= self._cost(self._pixmaps.pop(key))
+
+    def placeholder(self, size: QSize) -> QPixmap:
+        """
+        Gets the image shown while a cover is being decoded, or when there's no cover
+        :param size: The size the image is shown at
+        :return: (QPixmap) The image
+        """
+        key = (size.width(), size.height())
+        if key not in self._placeholders:
+            self._placeholders[key] = QPixmap(noCover).scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        return self._placeholders[key]
+
+    def stop(self):
+        # Drops the queued decodes and waits for the ones running
+        self._pool.clear()
+        self._pool.waitForDone()
+
+    @staticmethod
+    def _cost(pixmap: QPixmap) -> int:
+        return max(pixmap.width() * pixmap.height() * pixmap.depth() // 8, 1)
+
+    def _generationOf(self, gameId: int) -> tuple:
+        return self._generation, self._gameGenerations.get(gameId, 0)
+
+    def _store(self, gameId: int, size: QSize, image: QImage, generation: tuple, legacyDigest: str):
+        # Record a cover saved the old way now that it's in the store, unless the game got a new one meanwhile
+        if legacyDigest is not None and coverHash(gameId) is None:
+            moveLegacyCover(gameId, digest=legacyDigest)
+        if generation != self._generationOf(gameId):
+            return  # The cover was changed after this was decoded
+
+        key = (gameId, size.width(), size.height())
+        self._pending.discard(key)
+        pixmap = QPixmap.fromImage(image)  # Pixmaps can only be made on the GUI thread
+        if key in self._pixmaps:
+            self._bytes -= self._cost(self._pixmaps.pop(key))
+        self._pixmaps[key] = pixmap
+        self._bytes += self._cost(pixmap)
+        while self._bytes > self._maxBytes and len(self._pixmaps) > 1:
+            self._bytes -= self._cost(self._pixmaps.popitem(last=False)[1])
+
+        self.loaded.emit(gameId, size, pixmap)
@@ -0,0 +1,285 @@
+"""
+Game covers. Images are stored once per content, named by the SHA-256 hash of their
+bytes, so the same cover used by several games is only kept once. The 'covers' table
+maps game IDs to hashes. When a cover is saved, scaled down thumbnails are made of it,
+so showing a cover only means loading a small JPEG instead of decoding the original.
+"""
+import hashlib
+from os import listdir, makedirs, path, remove
+
+from PySide2.QtCore import QByteArray, Qt
+from PySide2.QtGui import QImage
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.database import beginWrite, connection
+from utilities.log import logger
+from utilities.queries import execQuery, fetchAll, fetchValue
+
+coversDir = path.join("data", "images", "covers")
+noCover = path.join(coversDir, "none.png")
+
+# Longest edge of the thumbnails in pixels: one fitting the side panel, one for bigger views
+thumbnailSizes = [360, 720]
+
+
+def imageHash(data: bytes) -> str:
+    """
+    Works out the name an image is stored under
+    :param data: The image file's bytes
+    :return: (str) SHA-256 hash of the bytes, in hex
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def _imagePath(digest: str) -> str:
+    # Originals are spread over subdirectories by the start of their hash, so no directory gets huge
+    return path.join(coversDir, digest[:2], digest)
+
+
+def _thumbnailPath(digest: str, size: int) -> str:
+    return path.join(coversDir, digest[:2], f"{digest}.{size}.jpg")
+
+
+def _legacyPath(gameId: int) -> str:
+    # Where covers were saved before the store, as they were downloaded
+    return path.join(coversDir, f"{gameId}.jpg")
+
+
+def _makeThumbnails(digest: str, image: QImage = None) -> bool:
+    # Scales the original down to every thumbnail size. Images smaller than a size are saved as they are.
+    if image is None:
+        image = QImage(_imagePath(digest))
+    if image.isNull():
+        logger.error(f"Couldn't read cover image '{_imagePath(digest)}'.")
+        return False
+
+    for size in thumbnailSizes:
+        thumbnail = image if max(image.width(), image.height()) <= size else \
+            image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if not thumbnail.save(_thumbnailPath(digest, size), "JPG", 90):
+            logger.error(f"Couldn't save thumbnail '{_thumbnailPath(digest, size)}'.")
+            return False
+
+    return True
+
+
+def _storeImage(data: bytes) -> str:
+    # Writes the image and its thumbnails, unless an identical image is already stored.
+    # Returns its hash, or None if it isn't an image.
+    digest = imageHash(data)
+    if path.exists(_imagePath(digest)):
+        return digest
+
+    image = QImage.fromData(QByteArray(data))
+    if image.isNull():
+        logger.error("Cover image data isn't an image.")
+        return None
+
+    makedirs(path.dirname(_imagePath(digest)), exist_ok=True)
+    with open(_imagePath(digest), "wb") as f:
+        f.write(data)
+    if not _makeThumbnails(digest, image):
+        return None
+
+    return digest
+
+
+def saveCover(gameId: int, data: bytes, db: QSqlDatabase = None, replaced: list = None) -> bool:
+    """
+    Stores a game's cover image and makes its thumbnails, replacing the cover it had
+    :param gameId: ID of the game
+    :param data: The image file's bytes
+    :param db: Database connection, the current thread's connection if not given
+    :param replaced: When saving in a transaction started with beginWrite(), the hash of the cover replaced
+                     is added to this list instead of its image being removed. Remove the images with
+                     removeImages() once the transaction is committed. Without it, the cover is saved in
+                     a transaction of its own.
+    :return: (bool) True if the cover was saved
+    """
+    db = db if db is not None else connection()
+    own = replaced is None
+    if own and not beginWrite(db):
+        return False
+
+    # The image is stored while holding the write lock, so removeImages() can't remove it
+    # before the game is recorded as using it
+    digest = _storeImage(data)
+    old = fetchValue("SELECT Hash FROM covers WHERE GameID=?", (gameId,), db)
+    if digest is None or \
+            execQuery("INSERT OR REPLACE INTO covers (GameID, Hash) VALUES (?, ?)", (gameId, digest), db) is None:
+        if own:
+            db.rollback()
+        return False
+    if own and not db.commit():
+        db.rollback()
+        return False
+
+    if old is not None and old != digest:
+        if own:
+            removeImages([old], db)
+        else:
+            replaced.append(old)
+
+    return True
+
+
+def coverHash(gameId: int, db: QSqlDatabase = None) -> str:
+    """
+    Gets the hash of a game's cover in the store
+    :param gameId: ID of the game
+    :param db: Database connection, the current thread's connection if not given
+    :return: (str) The hash, or None if the game doesn't have a cover in the store
+    """
+    return fetchValue("SELECT Hash FROM covers WHERE GameID=?", (gameId,), db)
+
+
+def hasLegacyCover(gameId: int) -> bool:
+    """
+    Checks if a game has a cover saved the old way, that hasn't been moved into the store yet
+    :param gameId: ID of the game
+    :return: (bool) True if it has one
+    """
+    return path.exists(_legacyPath(gameId))
+
+
+def storeLegacyCover(gameId: int) -> str:
+    """
+    Stores a cover saved the old way in the store, without using the database, so it can run on any
+    thread. Record it for the game with moveLegacyCover() after.
+    :param gameId: ID of the game
+    :return: (str) Hash of the cover, or None if it couldn't be stored
+    """
+    try:
+        with open(_legacyPath(gameId), "rb") as f:
+            data = f.read()
+    except OSError as e:
+        logger.error(f"Couldn't read cover '{_legacyPath(gameId)}': {e}")
+        return None
+
+    return _storeImage(data)
+
+
+def moveLegacyCover(gameId: int, db: QSqlDatabase = None, digest: str = None) -> str:
+    """
+    Moves a cover saved the old way into the store. The old file is only removed once the
+    game's cover is committed, so the connection can't be in a transaction already.
+    :param gameId: ID of the game
+    :param db: Database connection, the current thread's connection if not given
+    :param digest: Hash of the cover, if storeLegacyCover() has stored it already
+    :return: (str) Hash of the cover, or None if it couldn't be moved
+    """
+    db = db if db is not None else connection()
+    if not beginWrite(db):
+        return None
+
+    # Stored before the write lock was taken, the image can have been removed as unused since
+    if digest is None or not path.exists(_imagePath(digest)):
+        digest = storeLegacyCover(gameId)
+    if digest is None:
+        db.rollback()
+        return None
+
+    old = fetchValue("SELECT Hash FROM covers WHERE GameID=?", (gameId,), db)
+    if execQuery("INSERT OR REPLACE INTO covers (GameID, Hash) VALUES (?, ?)", (gameId, digest), db) is None or \
+            not db.commit():
+        db.rollback()
+        return None
+    removeLegacyCovers([gameId])
+    if old is not None and old != digest:
+        removeImages([old], db)
+
+    return digest
+
+
+def hasCover(gameId: int, db: QSqlDatabase = None) -> bool:
+    """
+    Checks if a game has a cover, in the store or saved the old way
+    :param gameId: ID of the game
+    :param db: Database connection, the current thread's connection if not given
+    :return: (bool) True if it has one
+    """
+    return coverHash(gameId, db) is not None or hasLegacyCover(gameId)
+
+
+def thumbnailFile(digest: str, size: int) -> str:
+    """
+    Finds the smallest thumbnail of a stored cover that's at least a given size, making it if it's missing.
+    Doesn't use the database, so it can run on any thread.
+    :param digest: Hash of the cover
+    :param size: Longest edge the cover is shown at, in pixels
+    :return: (str) Path to the thumbnail, or None if it couldn't be made
+    """
+    fitting = [thumbnailSize for thumbnailSize in thumbnailSizes if thumbnailSize >= size]
+    thumbnail = _thumbnailPath(digest, fitting[0] if len(fitting) > 0 else thumbnailSizes[-1])
+    if not path.exists(thumbnail) and not _makeThumbnails(digest):  # Deleted, or the sizes have changed
+        return None
+
+    return thumbnail
+
+
+def unusedImages(hashes: list, db: QSqlDatabase = None) -> list:
+    """
+    Finds the stored images that no game uses anymore
+    :param hashes: Hashes of the images that might be unused
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Hashes of the unused images
+    """
+    hashes = list(set(hashes))
+    used = set()
+    for start in range(0, len(hashes), 500):  # SQLite only takes so many values
+        chunk = hashes[start:start + 500]
+        used.update(row[0] for row in fetchAll(f"SELECT DISTINCT Hash FROM covers "
+                                               f"WHERE Hash IN ({', '.join(['?'] * len(chunk))})", chunk, db))
+
+    return [digest for digest in hashes if digest not in used]
+
+
+def removeImages(hashes: list, db: QSqlDatabase = None) -> int:
+    """
+    Removes stored images and their thumbnails, if no game uses them. That's checked while holding the
+    database's write lock, which covers are saved under, so an image another connection has just started
+    using again isn't removed. The connection can't be in a transaction already.
+    :param hashes: Hashes of the images
+    :param db: Database connection, the current thread's connection if not given
+    :return: (int) Number of images removed
+    """
+    if len(hashes) == 0:
+        return 0
+    db = db if db is not None else connection()
+    if not beginWrite(db):
+        return 0
+
+    removed = 0
+    for digest in unusedImages(hashes, db):
+        directory = path.dirname(_imagePath(digest))
+        files = [name for name in listdir(directory) if name.startswith(digest)] if path.isdir(directory) else []
+        try:
+            for name in files:
+                remove(path.join(directory, name))
+        except OSError as e:
+            logger.error(f"Couldn't remove cover image '{digest}': {e}")
+            continue
+        removed += len(files) > 0
+    db.rollback()  # Nothing was written
+
+    return removed
+
+
+def removeLegacyCovers(gameIds: list) -> int:
+    """
+    Removes covers saved the old way that haven't been moved into the store.
+    Doesn't use the database, so it can run on any thread.
+    :param gameIds: IDs of the games
+    :return: (int) Number of covers removed
+    """
+    removed = 0
+    for gameId in gameIds:
+        image = _legacyPath(gameId)
+        if path.exists(image):
+            try:
+                remove(image)
+                removed += 1
+            except OSError as e:
+                logger.error(f"Couldn't remove cover '{image}': {e}")
+
+    return removed
@@ -0,0 +1,119 @@
+"""
+Connections to the collection database. Every thread gets a connection of its own to
+the same file, since a connection can only be used by the thread that opened it. The
+GUI thread uses Qt's default connection. The database is in WAL mode, so background
+jobs can read and write while the GUI thread keeps querying.
+"""
+import sqlite3
+import threading
+
+from PySide2.QtSql import QSqlDatabase, QSqlQuery
+
+from utilities.log import logger
+
+# How long to wait for another connection's write to finish before giving up, in milliseconds
+busyTimeout = 5000
+
+# Applied to every connection. WAL lets readers and a writer work at the same time, and with it
+# only a checkpoint, not every commit, has to wait for the disk.
+_pragmas = ["PRAGMA journal_mode = WAL",
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA busy_timeout = {busyTimeout}",
+            "PRAGMA mmap_size = 268435456",  # 256 MiB
+            "PRAGMA cache_size = -16384",  # 16 MiB
+            "PRAGMA temp_store = MEMORY"]
+
+_dbPath = None
+_lock = threading.Lock()
+
+
+def setDatabasePath(dbPath: str):
+    """
+    Sets the database file the connections are opened to
+    :param dbPath: Path to the database
+    """
+    global _dbPath
+    _dbPath = dbPath
+
+
+def _connectionName() -> str:
+    if threading.current_thread() is threading.main_thread():
+        return QSqlDatabase.defaultConnection
+    return f"collection-{threading.get_ident()}"
+
+
+def connection() -> QSqlDatabase:
+    """
+    Gets the current thread's connection to the database, opening it if needed.
+    Threads other than the GUI thread have to close theirs with closeConnection() when done.
+    :return: (QSqlDatabase) The connection
+    """
+    name = _connectionName()
+    with _lock:  # The list of connections is shared by all threads
+        if QSqlDatabase.contains(name):
+            return QSqlDatabase.database(name, open=False)
+
+        db = QSqlDatabase.addDatabase("QSQLITE", name)
+    db.setDatabaseName(_dbPath)
+    db.setConnectOptions(f"QSQLITE_BUSY_TIMEOUT={busyTimeout}")
+    if not db.open():
+        logger.critical(f"Couldn't open database '{_dbPath}': {db.lastError().text()}")
+        return db
+
+    query = QSqlQuery(db)
+    for pragma in _pragmas:
+        if not query.exec_(pragma):
+            logger.error(f"'{pragma}' failed: {query.lastError().text()}")
+    query.finish()
+
+    return db
+
+
+def beginWrite(db: QSqlDatabase) -> bool:
+    """
+    Starts a transaction that writes. It takes the write lock right away, so while another
+    connection is writing it waits for it (up to busyTimeout), instead of failing later on
+    because the other connection changed the database after this one had read from it.
+    End it with db.commit() or db.rollback().
+    :param db: Database connection
+    :return: (bool) True if the transaction was started
+    """
+    query = QSqlQuery(db)
+    if not query.exec_("BEGIN IMMEDIATE"):
+        logger.error(f"Couldn't start a transaction: {query.lastError().text()}")
+        return False
+
+    return True
+
+
+def closeConnection():
+    """
+    Closes the current thread's connection to the database, if it has one.
+    Nothing in the thread should hold on to the connection after this.
+    """
+    from utilities.queries import clearQueryCache  # It imports this module
+
+    name = _connectionName()
+    if not QSqlDatabase.contains(name):
+        return
+
+    db = QSqlDatabase.database(name, open=False)
+    clearQueryCache(db)
+    db.close()
+    del db  # Qt only removes a connection once nothing uses it anymore
+    with _lock:
+        QSqlDatabase.removeDatabase(name)
+
+
+def sqliteConnection(dbPath: str = None, **kwargs) -> sqlite3.Connection:
+    """
+    Opens a connection to the database with Python's sqlite3 module, set up like the Qt ones
+    :param dbPath: Path to the database, the one set with setDatabasePath() if not given
+    :param kwargs: Passed on to sqlite3.connect()
+    :return: (sqlite3.Connection) The connection
+    """
+    con = sqlite3.connect(dbPath if dbPath is not None else _dbPath, timeout=busyTimeout / 1000, **kwargs)
+    for pragma in _pragmas:
+        con.execute(pragma)
+
+    return con
@@ -0,0 +1,162 @@
+"""
+Facets, the values items can be filtered by: platforms, regions, genres and years. The catalog
+keeps how many items, and how many owned items, have each value. It's counted once with GROUP BY
+queries read from the indexes, and after that only the items that are written are counted again,
+so keeping the filter lists up to date doesn't depend on the size of the collection.
+"""
+from collections import Counter
+
+from PySide2.QtCore import QObject, Signal
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.queries import fetchAll
+
+facetNames = ("platform", "region", "genre", "year")
+
+# The column each facet is read from, genres come from the genre links
+_facetColumns = {"platform": "Platform", "region": "Region", "year": "Year"}
+_tables = ("games", "consoles", "accessories")
+
+
+def _catalogQuery(table: str) -> str:
+    # Number of items, and of owned items, with each facet value. Counted separately, since then
+    # each branch only needs an index: (Platform, Name) and the owned items index for platforms,
+    # (Region, owned_mask) and (Year, owned_mask), and the genre links' primary key for genres.
+    branches = []
+    for facet, column in _facetColumns.items():
+        branches.append(f"SELECT '{facet}', 0, {column}, COUNT(*) FROM {table} GROUP BY {column}")
+        branches.append(f"SELECT '{facet}', 1, {column}, COUNT(*) FROM {table} "
+                        f"WHERE owned_mask <> 0 GROUP BY {column}")
+    if table == "games":
+        branches.append("SELECT 'genre', 0, genres.Name, COUNT(*) FROM game_genres "
+                        "JOIN genres ON genres.ID = game_genres.GenreID GROUP BY genres.Name")
+        # CROSS JOIN keeps the owned games as the outer loop
+        branches.append("SELECT 'genre', 1, genres.Name, COUNT(*) FROM games "
+                        "CROSS JOIN game_genres ON game_genres.GameID = games.ID "
+                        "JOIN genres ON genres.ID = game_genres.GenreID "
+                        "WHERE games.owned_mask <> 0 GROUP BY genres.Name")
+
+    return " UNION ALL ".join(branches)
+
+
+def _countQuery(table: str, where: str) -> str:
+    # Number of items and owned items with each facet value, among the few items matching a condition
+    branches = [f"SELECT '{facet}', {table}.{column}, COUNT(*), SUM({table}.owned_mask <> 0) FROM {table} "
+                f"WHERE {where} GROUP BY {table}.{column}" for facet, column in _facetColumns.items()]
+    if table == "games":
+        branches.append(f"SELECT 'genre', genres.Name, COUNT(*), SUM(games.owned_mask <> 0) FROM games "
+                        f"JOIN game_genres ON game_genres.GameID = games.ID "
+                        f"JOIN genres ON genres.ID = game_genres.GenreID WHERE {where} GROUP BY genres.Name")
+
+    return " UNION ALL ".join(branches)
+
+
+class FacetCatalog(QObject):
+    """
+    The facet values in the collection, with their item counts. Writes are passed on as the
+    counts of the written items before and after the write, see itemCounts() and update().
+    db: Database connection
+    """
+
+    changed = Signal(str)  # Name of a facet whose list of values has changed
+
+    def __init__(self, db: QSqlDatabase, parent=None):
+        super(FacetCatalog, self).__init__(parent)
+
+        self._db = db
+        self._total = Counter()  # (facet, value): number of items
+        self._owned = Counter()  # (facet, value): number of owned items
+        self._sorted = {}  # (facet, owned only): the values, sorted
+        self.reload()
+
+    def reload(self):
+        """Counts all the items again"""
+        self._total, self._owned = Counter(), Counter()
+        for table in _tables:
+            for facet, ownedOnly, value, items in fetchAll(_catalogQuery(table), db=self._db):
+                if value is not None:
+                    (self._owned if ownedOnly else self._total)[(facet, str(value))] += items
+        self._sorted.clear()
+
+    def values(self, facet: str, ownedOnly: bool = True) -> list:
+        """
+        Gets the values of a facet
+        :param facet: One of facetNames
+        :param ownedOnly: Only values of owned items
+        :return: (list) The values, sorted case insensitively
+        """
+        key = (facet, ownedOnly)
+        if key not in self._sorted:
+            counts = self._owned if ownedOnly else self._total
+            self._sorted[key] = sorted((value for (name, value), count in counts.items() if name == facet),
+                                       key=str.lower)
+
+        return self._sorted[key]
+
+    def count(self, facet: str, value: str, ownedOnly: bool = True) -> int:
+        """
+        Gets how many items have a facet value
+        :param facet: One of facetNames
+        :param value: The value
+        :param ownedOnly: Only count owned items
+        :return: (int) Number of items
+        """
+        return (self._owned if ownedOnly else self._total)[(facet, value)]
+
+    def itemCounts(self, table: str, ids: list = None, afterId: int = None) -> tuple:
+        """
+        Counts the facet values of some items, to pass on to update()
+        :param table: Item table
+        :param ids: IDs of the items
+        :param afterId: Instead of IDs, all items with a higher ID, e.g. the ones just added
+        :return: (tuple) Counter of (facet, value): items, Counter of (facet, value): owned items
+        """
+        if afterId is not None:
+            return self._count(table, f"{table}.ID > ?", [afterId])
+
+        total, owned = Counter(), Counter()
+        ids = list(ids)
+        for start in range(0, len(ids), 500):  # SQLite only takes so many values
+            chunk = ids[start:start + 500]
+            chunkTotal, chunkOwned = self._count(table, f"{table}.ID IN ({', '.join(['?'] * len(chunk))})", chunk)
+            total.update(chunkTotal)
+            owned.update(chunkOwned)
+
+        return total, owned
+
+    def update(self, before: tuple = None, after: tuple = None):
+        """
+        Applies a write to the counts. Emits 'changed' for the facets that gained or lost values.
+        :param before: itemCounts() of the written items before the write, None if they were added
+        :param after: itemCounts() of the written items after the write, None if they were deleted
+        """
+        empty = (Counter(), Counter())
+        before, after = before if before is not None else empty, after if after is not None else empty
+
+        changedFacets = set()
+        for counts, old, new in ((self._total, before[0], after[0]), (self._owned, before[1], after[1])):
+            for key in old.keys() | new.keys():
+                had = counts[key] > 0
+                counts[key] += new[key] - old[key]
+                if counts[key] <= 0:
+                    del counts[key]
+                if had != (key in counts):
+                    changedFacets.add(key[0])
+
+        for facet in facetNames:
+            if facet in changedFacets:
+                self._sorted.pop((facet, True), None)
+                self._sorted.pop((facet, False), None)
+                self.changed.emit(facet)
+
+    def _count(self, table: str, where: str, params: list) -> tuple:
+        total, owned = Counter(), Counter()
+        branches = len(_facetColumns) + (table == "games")
+        for facet, value, items, ownedItems in fetchAll(_countQuery(table, where), params * branches, self._db):
+            if value is None:
+                continue
+            total[(facet, str(value))] += items
+            if ownedItems > 0:
+                owned[(facet, str(value))] += ownedItems
+
+        return total, owned
@@ -1,10 +1,10 @@
 import re
 import bs4
-import socket
 import requests
 import unicodedata as ucd  # For converting '\xa0' to spaces etc
 from time import sleep
 
+from utilities import httpclient, notfound
 from utilities.log import logger
 
 _baseURL = "https://www.mobygames.com/game/"
@@ -369,7 +369,7 @@ def _trySuggestions(title: str, platform: str):
     # Checks if the suggested URLs match
 
     pTitle = _parseTitle(title)
-    res = requests.get(_baseURL + "/".join((_platforms[platform], pTitle, "release-info")))
+    res = httpclient.get(_baseURL + "/".join((_platforms[platform], pTitle, "release-info")))
     suggestionsCSS = ".col-md-12 > div:nth-child(3) > ul:nth-child(2)"  # List of URLs
     alternativeTitlesCSS = [".col-md-8 > ul:nth-child(17)",
                             ".col-md-8 > ul:nth-child(18)",
@@ -418,7 +418,7 @@ def _trySuggestions(title: str, platform: str):
         logger.info(f"Trying with url: {newurl}")
 
         # Get the platform and title strings
-        res = requests.get(newurl)
+        res = httpclient.get(newurl)
         soup = bs4.BeautifulSoup(res.text, "html.parser")
         te = soup.select(_titleCSS)
         pf = soup.select(_platformCSS)
@@ -459,7 +459,7 @@ def _trySuggestions(title: str, platform: str):
                 logger.info(f"Platform matches, but not title ({newtitle}). Trying to find it in 'Alternate Titles'.")
                 alturl = newurl.split("/")
                 alturl = "/".join(alturl[:-1])  # Remove the 'release-info' part. Alt titles are on the main page.
-                altres = requests.get(alturl)
+                altres = httpclient.get(alturl)
                 soup = bs4.BeautifulSoup(altres.text, "html.parser")
 
                 temp = []
@@ -516,7 +516,7 @@ def _tryAlternatives(title: str, platform: str):
     for c in ["-", "_", "__", "___"]:
         testurl[1] = pTitle + c  # Add either '-', '_', or '__' to string
         logger.info(f"Trying with url: {_baseURL + '/'.join(testurl)}")
-        res = requests.get(_baseURL + "/".join(testurl))  # Try alternative URL
+        res = httpclient.get(_baseURL + "/".join(testurl))  # Try alternative URL
 
         try:
             res.raise_for_status()
@@ -584,6 +584,13 @@ def getMobyInfo(title: str, platform: str) -> dict:
                    "#coreGameGenre > div:nth-child(2) > div:nth-child(11)",
                    "#coreGameGenre > div:nth-child(2) > div:nth-child(12)"]
 
+    # The region doesn't change where we look, so a title missing in one is missing in all of them
+    name = title
+    reason = notfound.lookup("mobygames", name, platform)
+    if reason != "":
+        logger.info(f"'{name}' is known not to be on MobyGames ({notfound.reasons[reason][0].lower()}).")
+        return {x: "" for x in mobyCSSData.keys()}
+
     if platform.lower() == "game & watch":
         title = "Game & Watch Wide Screen: " + title  # TODO: Need to figure out something better for each variety
 
@@ -595,14 +602,15 @@ def getMobyInfo(title: str, platform: str) -> dict:
     # Get data
     if pPlatform not in _platforms.keys():  # Platform not supported
         logger.error(f"Platform '{platform}' not supported.")
+        notfound.record("mobygames", name, platform, "", "platform")
         return {x: "" for x in mobyCSSData.keys()}
 
     fullURL = _baseURL + "/".join((_platforms[pPlatform], pTitle, "release-info"))
     logger.info(f"Full url to mobygames: {fullURL}")
 
     try:
-        res = requests.get(fullURL)
-    except socket.gaierror:
+        res = httpclient.get(fullURL)
+    except requests.exceptions.RequestException:
         # Most likely no internet connection
         logger.error("Can't establish connection.")
         return {x: "" for x in mobyCSSData.keys()}
@@ -613,10 +621,13 @@ def getMobyInfo(title: str, platform: str) -> dict:
     except requests.exceptions.HTTPError:
         # Try the suggested results on the 404 page
         logger.info("Title not immediately found. Trying the suggestions.")
+        status = res.status_code
         res, title, fullURL = _trySuggestions(title, pPlatform)
         if res is None:
             # Couldn't find anything. Return empty values
             logger.error("Title not found.")
+            if status in (404, 410):  # Not a server error, which might be gone next time
+                notfound.record("mobygames", name, platform, "", "notfound")
             return {x: "" for x in mobyCSSData.keys()}
 
         soup = bs4.BeautifulSoup(res.text, 'html.parser')
@@ -631,6 +642,7 @@ def getMobyInfo(title: str, platform: str) -> dict:
             res, fullURL = _tryAlternatives(title, pPlatform)
             if res is None:  # Nothing was found.
                 logger.error("Title not found.")
+                notfound.record("mobygames", name, platform, "", "nomatch")
                 return {x: "" for x in mobyCSSData.keys()}
 
             soup = bs4.BeautifulSoup(res.text, 'html.parser')
@@ -705,7 +717,7 @@ def getMobyInfo(title: str, platform: str) -> dict:
     # Get cover image
     imgurlReg = re.compile(r'href=\".*?\"')
     coverURL = fullURL.replace("release-info", "cover-art")
-    coverRes = requests.get(coverURL)
+    coverRes = httpclient.get(coverURL)
     coverSoup = bs4.BeautifulSoup(coverRes.text, "html.parser")
     coverReleases = coverSoup.find_all("table", {"summary": "Description of Covers"})
     coverMedia = coverSoup.find_all("div", {"class": "thumbnail"})
@@ -858,11 +870,11 @@ def getMobyRelease(name: str, platform: str, region: str, country: str = ""):
             for country in countries:
                 if region == "PAL" and country.strip() == "United Kingdom":
                     # Default to UK for PAL region
-                    res = requests.get(covers[cover])
+                    res = httpclient.get(covers[cover])
                     break
 
                 elif country.strip() in regionValue:
-                    res = requests.get(covers[cover])
+                    res = httpclient.get(covers[cover])
                     break
 
             if res is not None:
@@ -870,7 +882,7 @@ def getMobyRelease(name: str, platform: str, region: str, country: str = ""):
 
         if res is None:  # Correct region not found, select the first one.
             logger.warning("Couldn't find correct cover for the region. Defaulting to the first image.")
-            res = requests.get(list(covers.values())[0])
+            res = httpclient.get(list(covers.values())[0])
 
         imgCSS = ".img-responsive"
         imgURLReg = re.compile(r'src=\".*?\"')
@@ -1,13 +1,14 @@
 import re
-import socket
 from time import sleep
 
 import bs4
 import requests
 import unicodedata as ucd
-from decimal import *
+from decimal import Decimal, ROUND_HALF_UP
 
+from utilities import httpclient, notfound
 from utilities.log import logger
+from utilities.prices import currencySigns
 
 
 _baseURL = "https://www.pricecharting.com/game/"
@@ -174,7 +175,7 @@ def _trySuggestions(platform: str, region: int, soup: bs4.BeautifulSoup) -> bs4.
 
     if len(url) > 0:
         logger.info(f"New url found: {url}")
-        res = requests.get(url)
+        res = httpclient.get(url)
         soup = bs4.BeautifulSoup(res.text, "html.parser")
         return soup
 
@@ -199,7 +200,6 @@ def getPriceData(title: str, platform: str, region: str, currency="USD") -> dict
 
     regions = {"NTSC (JP)": 0, "NTSC (NA)": 1, "PAL": 2}
     rates = {"USD": 1.0, "AUD": 0.0, "BRL": 0.0, "CAD": 0.0, "EUR": 0.0, "GBP": 0.0, "MXN": 0.0}
-    sign = {"USD": "$", "AUD": "AUD ", "BRL": "R$", "CAD": "CAD ", "EUR": "€", "GBP": "£", "MXN": "Mex$"}
     ratesRegex = re.compile(r'("\w{3}":\d\.\d.*.)')
 
     pTitle = _parseTitle(title)
@@ -214,8 +214,13 @@ def getPriceData(title: str, platform: str, region: str, currency="USD") -> dict
     elif region not in ("NTSC (JP)", "NTSC (NA)", "PAL"):
         logger.info(f"Changing {region} to 'NTSC (NA)'")
         region = "NTSC (NA)"
+    reason = notfound.lookup("pricecharting", title, platform, region)
+    if reason != "":
+        logger.info(f"'{title}' is known not to be on Pricecharting ({notfound.reasons[reason][0].lower()}).")
+        return {x: "N/A" for x in priceInfo.keys()}
     if pPlatform not in _platforms.keys():  # Platform not supported
         logger.error("Platform is not supported currently.")
+        notfound.record("pricecharting", title, platform, region, "platform")
         return {x: "N/A" for x in priceInfo.keys()}
 
     fullURL = _baseURL + "/".join((_platforms[pPlatform][regions[region]], pTitle))
@@ -223,8 +228,8 @@ def getPriceData(title: str, platform: str, region: str, currency="USD") -> dict
 
     # Error handling
     try:
-        res = requests.get(fullURL)
-    except socket.gaierror:  # Most likely no internet connection
+        res = httpclient.get(fullURL)
+    except requests.exceptions.RequestException:  # Most likely no internet connection
         logger.error("Couldn't establish connection.")
         return {x: "N/A" for x in priceInfo.keys()}
     try:
@@ -232,11 +237,14 @@ def getPriceData(title: str, platform: str, region: str, currency="USD") -> dict
         soup = bs4.BeautifulSoup(res.text, "html.parser")
     except requests.exceptions.HTTPError:  # Not found
         logger.error("Title not found.")
+        if res.status_code in (404, 410):  # Not a server error, which might be gone next time
+            notfound.record("pricecharting", title, platform, region, "notfound")
         return {x: "N/A" for x in priceInfo.keys()}
     if len(soup.select("#product_name > a:nth-child(1)")) == 0:  # Didn't find the right page, try suggestions
         soup = _trySuggestions(pPlatform, regions[region], soup)
         if soup is None:  # Still couldn't find anything
             logger.error("Title not found.")
+            notfound.record("pricecharting", title, platform, region, "nomatch")
             return {x: "N/A" for x in priceInfo.keys()}
 
     # Get currency rates
@@ -254,8 +262,9 @@ def getPriceData(title: str, platform: str, region: str, currency="USD") -> dict
         if price == "N/A":  # No price found
             priceInfo[key] = "N/A"
             continue
-        getcontext().prec = len(price) - 1  # Dynamically set precision to 2 decimal points
-        priceInfo[key] = sign[currency] + str(Decimal(price) * Decimal(rates[currency]))
+        # Rounded to cents without touching the global decimal context
+        converted = (Decimal(price) * Decimal(str(rates[currency]))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        priceInfo[key] = currencySigns[currency] + str(converted)
 
     logger.info("Price data found.")
     return priceInfo
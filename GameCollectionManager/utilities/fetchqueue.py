@@ -0,0 +1,157 @@
+"""
+The tasks of fetching info for all games, kept in the 'fetch_tasks' table so a fetch carries on
+where it left off after the program is closed or crashes. Each game has a task per kind of info:
+'info' from MobyGames, 'price' from PriceCharting, and 'cover', which is added once the game's
+info has the cover's address. Workers claim pending tasks in a transaction of their own, and
+their results are saved together with marking the tasks done. A task that fails is tried again
+later, a few times, before it's given up on. Finished tasks are kept with the time they finished,
+so games fetched recently are skipped when fetching again.
+"""
+import time
+
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.database import beginWrite
+from utilities.queries import execQuery, fetchAll, fetchValue
+
+taskKinds = ("info", "price", "cover")
+
+freshness = 30 * 24 * 60 * 60  # Seconds since a game was fetched before it's fetched again
+maxAttempts = 4
+retryDelay = 60  # Seconds before trying a failed task again, doubled after every attempt
+
+
+class Task:
+    """
+    A claimed task
+    gameId: ID of the game
+    kind: One of taskKinds
+    attempts: How many times the task has been claimed, including this time
+    name, platform, region: The game's
+    data: The cover's address for cover tasks
+    """
+
+    def __init__(self, gameId: int, kind: str, attempts: int, name: str, platform: str, region: str, data: str):
+        self.gameId = gameId
+        self.kind = kind
+        self.attempts = attempts
+        self.name = name
+        self.platform = platform
+        self.region = region
+        self.data = data
+
+
+def enqueue(db: QSqlDatabase, maxAge: float = freshness) -> bool:
+    """
+    Adds info and price tasks for every owned game. Games whose tasks finished less than
+    maxAge ago are skipped, and tasks that are still pending are left as they are.
+    :param db: Database connection
+    :param maxAge: Seconds since a game was fetched before it's fetched again
+    :return: (bool) True if the tasks were added
+    """
+    now = time.time()
+    for kind in ("info", "price"):
+        if execQuery("INSERT INTO fetch_tasks (GameID, Kind) SELECT ID, ? FROM games WHERE owned_mask <> 0 "
+                     "ON CONFLICT (GameID, Kind) DO UPDATE SET State = 'pending', Attempts = 0, LastError = NULL, "
+                     "NextTry = 0 WHERE State IN ('done', 'failed') AND IFNULL(Finished, 0) < ?",
+                     (kind, now - maxAge), db) is None:
+            return False
+
+    return True
+
+
+def resume(db: QSqlDatabase) -> int:
+    """
+    Puts tasks that were being worked on when the program closed back in the queue
+    :param db: Database connection
+    :return: (int) Number of tasks left to do
+    """
+    execQuery("UPDATE fetch_tasks SET State = 'pending' WHERE State = 'running'", db=db)
+
+    return remaining(db)
+
+
+def remaining(db: QSqlDatabase) -> int:
+    """
+    Counts the tasks that aren't done or given up on
+    :param db: Database connection
+    :return: (int) Number of tasks
+    """
+    return fetchValue("SELECT COUNT(*) FROM fetch_tasks WHERE State IN ('pending', 'running')", db=db, default=0)
+
+
+def drop(db: QSqlDatabase) -> int:
+    """
+    Drops the tasks that aren't done, e.g. after the fetch was cancelled
+    :param db: Database connection
+    :return: (int) Number of tasks dropped
+    """
+    query = execQuery("DELETE FROM fetch_tasks WHERE State IN ('pending', 'running')", db=db)
+
+    return query.numRowsAffected() if query is not None else 0
+
+
+def claim(db: QSqlDatabase, kind: str) -> Task:
+    """
+    Takes the next task of a kind that can be worked on now, so no other worker takes it
+    :param db: A worker's connection, not in a transaction
+    :param kind: One of taskKinds
+    :return: (Task) The task, None if there are none to do right now, or if it couldn't be taken
+    """
+    if not beginWrite(db):
+        return None
+    rows = fetchAll("SELECT fetch_tasks.GameID, fetch_tasks.Attempts, games.Name, games.Platform, games.Region, "
+                    "fetch_tasks.Data FROM fetch_tasks JOIN games ON games.ID = fetch_tasks.GameID "
+                    "WHERE fetch_tasks.Kind = ? AND fetch_tasks.State = 'pending' AND fetch_tasks.NextTry <= ? "
+                    "ORDER BY fetch_tasks.NextTry, fetch_tasks.GameID LIMIT 1", (kind, time.time()), db)
+    if len(rows) == 0 or execQuery("UPDATE fetch_tasks SET State = 'running', Attempts = Attempts + 1 "
+                                   "WHERE GameID = ? AND Kind = ?", (rows[0][0], kind), db) is None:
+        db.rollback()
+        return None
+    if not db.commit():
+        db.rollback()
+        return None
+
+    gameId, attempts, name, platform, region, data = rows[0]
+    return Task(gameId, kind, attempts + 1, name, platform, region, data)
+
+
+def finish(db: QSqlDatabase, task: Task) -> bool:
+    """
+    Marks a task done, in the transaction its result is saved in
+    :param db: Database connection
+    :param task: The task
+    :return: (bool) True if it was marked
+    """
+    return execQuery("UPDATE fetch_tasks SET State = 'done', LastError = NULL, Finished = ? "
+                     "WHERE GameID = ? AND Kind = ?", (time.time(), task.gameId, task.kind), db) is not None
+
+
+def addCover(db: QSqlDatabase, gameId: int, url: str) -> bool:
+    """
+    Adds a task to download a game's cover
+    :param db: Database connection
+    :param gameId: ID of the game
+    :param url: The cover's address
+    :return: (bool) True if it was added
+    """
+    return execQuery("INSERT OR REPLACE INTO fetch_tasks (GameID, Kind, Data) VALUES (?, 'cover', ?)",
+                     (gameId, url), db) is not None
+
+
+def fail(db: QSqlDatabase, task: Task, error: str) -> bool:
+    """
+    Records that a task failed. It's tried again later, unless it has been tried enough times.
+    :param db: Database connection
+    :param task: The task
+    :param error: What went wrong
+    :return: (bool) True if the task was given up on
+    """
+    now = time.time()
+    givenUp = task.attempts >= maxAttempts
+    execQuery("UPDATE fetch_tasks SET State = ?, LastError = ?, NextTry = ?, Finished = ? "
+              "WHERE GameID = ? AND Kind = ?",
+              ("failed" if givenUp else "pending", error, now + retryDelay * 2 ** (task.attempts - 1),
+               now if givenUp else None, task.gameId, task.kind), db)
+
+    return givenUp
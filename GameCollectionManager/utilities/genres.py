@@ -0,0 +1,118 @@
+"""
+Game genres. A game's genres are shown and edited as one comma separated string
+(the 'Genre' column), and also kept as rows in the 'game_genres' table, linking
+games to the 'genres' table, so games can be looked up by genre with an index.
+"""
+import json
+
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.queries import execQuery, fetchAll, fetchValue
+
+
+def splitGenres(genres: str) -> list:
+    """
+    Splits a game's genre string into its genres
+    :param genres: Genres separated by commas, e.g. 'Action, Puzzle'
+    :return: (list) The genres, without duplicates or empty ones
+    """
+    names = []
+    for genre in (genres if genres is not None else "").split(","):
+        genre = genre.strip()
+        if genre != "" and genre not in names:
+            names.append(genre)
+
+    return names
+
+
+def genreId(name: str, db: QSqlDatabase = None) -> int:
+    """
+    Gets the ID of a genre, adding it if it's new
+    :param name: Name of the genre
+    :param db: Database connection, the current thread's connection if not given
+    :return: (int) The genre's ID
+    """
+    execQuery("INSERT OR IGNORE INTO genres (Name) VALUES (?)", (name,), db)
+    return fetchValue("SELECT ID FROM genres WHERE Name=?", (name,), db)
+
+
+def linkGenres(gameId: int, genres: str, db: QSqlDatabase = None, genreIds: dict = None) -> bool:
+    """
+    Replaces a game's genre links with the genres in its genre string
+    :param gameId: ID of the game
+    :param genres: The game's genre string
+    :param db: Database connection, the current thread's connection if not given
+    :param genreIds: Genre name: ID, to look up genres in when linking many games. New genres are added to it.
+    :return: (bool) True if the links were written
+    """
+    if execQuery("DELETE FROM game_genres WHERE GameID=?", (gameId,), db) is None:
+        return False
+
+    for name in splitGenres(genres):
+        if genreIds is None:
+            genre = genreId(name, db)
+        else:
+            if name not in genreIds:
+                genreIds[name] = genreId(name, db)
+            genre = genreIds[name]
+        if genre is None or execQuery("INSERT OR IGNORE INTO game_genres (GenreID, GameID) VALUES (?, ?)",
+                                      (genre, gameId), db) is None:
+            return False
+
+    return True
+
+
+def linkNewGames(firstId: int, genres: list, db: QSqlDatabase = None) -> bool:
+    """
+    Links games that were just added in one go to their genres, with a statement for all of them
+    :param firstId: The lowest ID the games can have, every game from it on is one of them
+    :param genres: The games' genre strings, in the order they were added
+    :param db: Database connection, the current thread's connection if not given
+    :return: (bool) True if the links were written
+    """
+    links = [[line, name] for line, gameGenres in enumerate(genres) for name in splitGenres(gameGenres)]
+    if len(links) == 0:
+        return True
+
+    # The games got their IDs in the order they were added, so a game's line is its place among the new IDs
+    names = list(dict.fromkeys(name for line, name in links))
+    return execQuery("INSERT OR IGNORE INTO genres (Name) SELECT value FROM json_each(?) ORDER BY key",
+                     (json.dumps(names),), db) is not None and \
+        execQuery("WITH added AS (SELECT ID, ROW_NUMBER() OVER (ORDER BY ID) - 1 AS Line FROM games WHERE ID >= ?) "
+                  "INSERT OR IGNORE INTO game_genres (GenreID, GameID) "
+                  "SELECT genres.ID, added.ID FROM json_each(?) AS link "
+                  "JOIN added ON added.Line = json_extract(link.value, '$[0]') "
+                  "JOIN genres ON genres.Name = json_extract(link.value, '$[1]')",
+                  (firstId, json.dumps(links)), db) is not None
+
+
+def matchingGames(platforms: list, genres: list, exclusive: bool = False, db: QSqlDatabase = None) -> list:
+    """
+    Finds the owned games on some platforms and/or in some genres
+    :param platforms: Platforms the games can be on, any platform if empty
+    :param genres: Genres the games have to be in, any genre if empty
+    :param exclusive: The games have to be in exactly the given genres, instead of in any of them
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Games as dictionaries with 'id', 'name' and 'platform'
+    """
+    conditions = ["owned_mask <> 0"]
+    params = []
+    if len(platforms) > 0:
+        conditions.append(f"Platform IN ({', '.join(['?'] * len(platforms))})")
+        params += platforms
+    if len(genres) > 0:
+        selected = f"SELECT ID FROM genres WHERE Name IN ({', '.join(['?'] * len(genres))})"
+        if exclusive:
+            # In every selected genre, and in no other genre
+            conditions.append(f"ID IN (SELECT GameID FROM game_genres WHERE GenreID IN ({selected}) "
+                              f"GROUP BY GameID HAVING COUNT(*) = ?) "
+                              f"AND NOT EXISTS (SELECT 1 FROM game_genres "
+                              f"WHERE GameID = games.ID AND GenreID NOT IN ({selected}))")
+            params += genres + [len(genres)] + genres
+        else:
+            conditions.append(f"ID IN (SELECT GameID FROM game_genres WHERE GenreID IN ({selected}))")
+            params += genres
+
+    rows = fetchAll(f"SELECT ID, Name, Platform FROM games WHERE {' AND '.join(conditions)}", params, db)
+
+    return [dict(id=row[0], name=row[1], platform=row[2]) for row in rows]
@@ -0,0 +1,187 @@
+"""
+A cache of HTTP responses on disk, so fetching info for games a second time doesn't download
+the same pages again. Responses are kept by URL in an SQLite file of their own, with text bodies
+compressed. Each host has a time to live: game info barely changes, prices do. A response that
+has expired is revalidated with If-None-Match or If-Modified-Since if the server gave an ETag or
+Last-Modified, so an unchanged page costs a 304 instead of the whole page. When the bodies take
+more than the size limit, the least recently used responses are evicted.
+"""
+import json
+import threading
+import time
+import zlib
+from os import path
+from urllib.parse import urlsplit
+
+from utilities.database import sqliteConnection
+from utilities.log import logger
+
+cachePath = path.join("data", "db", "httpcache.db")
+
+_day = 24 * 60 * 60
+# Seconds a response is used without asking the server, per host
+hostTTLs = {"www.mobygames.com": 30 * _day,
+            "www.pricecharting.com": _day // 2}
+defaultTTL = 7 * _day
+
+maxSize = 256 * 1024 * 1024  # Bytes of stored bodies
+_evictTo = 0.9  # Evicting stops at this fraction of maxSize, so it isn't done on every store
+
+# Responses worth keeping. 404 pages are kept too, the scrapers read the suggestions on them.
+cacheableStatuses = (200, 203, 404, 410)
+# Header values kept with a response, the rest aren't used by the scrapers
+_keptHeaders = ("Content-Type", "ETag", "Last-Modified")
+
+
+def _compressible(contentType: str) -> bool:
+    # Images are compressed already
+    return contentType.startswith("text/") or any(kind in contentType for kind in ("json", "xml", "javascript"))
+
+
+class CachedResponse:
+    """
+    A response read from the cache
+    url: The URL
+    status: HTTP status code
+    headers: The kept header values
+    body: The body, uncompressed
+    encoding: Text encoding of the body, None if not known
+    expired: The response's time to live has passed
+    """
+
+    def __init__(self, url: str, status: int, headers: dict, body: bytes, encoding: str, expired: bool):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoding = encoding
+        self.expired = expired
+
+    def validators(self) -> dict:
+        """
+        Gets the headers to revalidate the response with
+        :return: (dict) If-None-Match and/or If-Modified-Since, empty if the server gave neither
+        """
+        validators = {}
+        if "ETag" in self.headers:
+            validators["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+
+        return validators
+
+
+class HttpCache:
+    """
+    Responses on disk, by URL. Safe to use from several threads.
+    dbPath: Path to the cache file, created if it doesn't exist
+    """
+
+    def __init__(self, dbPath: str = cachePath):
+        self._lock = threading.Lock()
+        self._con = sqliteConnection(dbPath, check_same_thread=False, isolation_level=None)
+        self._con.execute("CREATE TABLE IF NOT EXISTS responses (URL TEXT PRIMARY KEY, Status INTEGER NOT NULL, "
+                          "Headers TEXT NOT NULL, Encoding TEXT, Body BLOB NOT NULL, Compressed INTEGER NOT NULL, "
+                          "Size INTEGER NOT NULL, Expires REAL NOT NULL, Used REAL NOT NULL)")
+        self._con.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (Used)")
+        self._size = self._con.execute("SELECT IFNULL(SUM(Size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def ttl(url: str) -> int:
+        """
+        Gets how long responses from a URL's host are used without asking the server
+        :param url: The URL
+        :return: (int) Time to live in seconds
+        """
+        return hostTTLs.get(urlsplit(url).hostname, defaultTTL)
+
+    def lookup(self, url: str) -> CachedResponse:
+        """
+        Reads a response from the cache
+        :param url: The URL
+        :return: (CachedResponse) The response, expired or not, None if it isn't in the cache
+        """
+        now = time.time()
+        with self._lock:
+            row = self._con.execute("SELECT Status, Headers, Encoding, Body, Compressed, Expires FROM responses "
+                                    "WHERE URL = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self._con.execute("UPDATE responses SET Used = ? WHERE URL = ?", (now, url))
+
+        status, headers, encoding, body, compressed, expires = row
+        try:
+            body = zlib.decompress(body) if compressed else body
+        except zlib.error as e:
+            logger.error(f"Cached response for '{url}' is corrupt: {e}")
+            self.remove(url)
+            return None
+
+        return CachedResponse(url, status, json.loads(headers), body, encoding, expires <= now)
+
+    def store(self, url: str, status: int, headers: dict, body: bytes, encoding: str = None):
+        """
+        Saves a response, replacing an older one for the URL
+        :param url: The URL
+        :param status: HTTP status code
+        :param headers: The response's headers
+        :param body: The body, uncompressed
+        :param encoding: Text encoding of the body, if known
+        """
+        headers = {name: headers[name] for name in _keptHeaders if name in headers}
+        compressed = _compressible(headers.get("Content-Type", ""))
+        data = zlib.compress(body, 6) if compressed else body
+        now = time.time()
+
+        with self._lock:
+            old = self._con.execute("SELECT Size FROM responses WHERE URL = ?", (url,)).fetchone()
+            self._con.execute("INSERT OR REPLACE INTO responses "
+                              "(URL, Status, Headers, Encoding, Body, Compressed, Size, Expires, Used) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (url, status, json.dumps(headers), encoding, data, int(compressed), len(data),
+                               now + self.ttl(url), now))
+            self._size += len(data) - (old[0] if old is not None else 0)
+            if self._size > maxSize:
+                self._evict()
+
+    def refresh(self, url: str):
+        """
+        Starts a response's time to live over, after the server said it hasn't changed
+        :param url: The URL
+        """
+        now = time.time()
+        with self._lock:
+            self._con.execute("UPDATE responses SET Expires = ?, Used = ? WHERE URL = ?",
+                              (now + self.ttl(url), now, url))
+
+    def remove(self, url: str):
+        """
+        Drops a response from the cache
+        :param url: The URL
+        """
+        with self._lock:
+            row = self._con.execute("SELECT Size FROM responses WHERE URL = ?", (url,)).fetchone()
+            if row is not None:
+                self._con.execute("DELETE FROM responses WHERE URL = ?", (url,))
+                self._size -= row[0]
+
+    def size(self) -> int:
+        """
+        Gets how much space the stored bodies take
+        :return: (int) Size in bytes
+        """
+        return self._size
+
+    def _evict(self):
+        # Deletes the least recently used responses until they fit again. Called with the lock held.
+        target = int(maxSize * _evictTo)
+        self._con.execute("BEGIN")
+        evicted = 0
+        for url, size in self._con.execute("SELECT URL, Size FROM responses ORDER BY Used").fetchall():
+            if self._size <= target:
+                break
+            self._con.execute("DELETE FROM responses WHERE URL = ?", (url,))
+            self._size -= size
+            evicted += 1
+        self._con.execute("COMMIT")
+        logger.info(f"Evicted {evicted} responses from the HTTP cache.")
@@ -0,0 +1,173 @@
+"""
+The HTTP client the scrapers share. Requests go through one session, so connections to a
+host are kept alive and reused instead of doing a TCP and TLS handshake for every page and
+cover. Every request has connect and read timeouts, so a stalled server can't hang the
+program. Responses are kept in the HTTP cache, and are read from there while they're fresh.
+Requests that do go out wait for their host's rate limit, and so does every retry: requests
+are retried on dropped connections, server errors and 429s, after the backoff or the server's
+Retry-After, during which none of the host's other requests are sent either.
+"""
+import sqlite3
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.client import responses as _reasons
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from utilities.httpcache import CachedResponse, HttpCache, cacheableStatuses, cachePath
+from utilities.log import logger
+from utilities.ratelimit import holdOff, waitTurn
+
+connectTimeout = 5  # Seconds
+readTimeout = 20  # Seconds, between bytes received, not for the whole response
+
+poolSize = 8  # Kept-alive connections per host
+retries = 3
+backoff = 0.5  # Seconds before the first retry, doubled for each one after that
+retryStatuses = (429, 500, 502, 503, 504)
+maxRetryAfter = 60  # Seconds. If the server asks us to wait longer, its response is returned instead.
+
+_headers = {"User-Agent": "GameCollectionManager",
+            "Accept-Encoding": "gzip, deflate"}
+
+_session = None
+_sessionLock = Lock()
+_cache = None
+_cacheLock = Lock()
+
+
+class _Adapter(HTTPAdapter):
+    # Uses the default timeouts for requests that don't give their own
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (connectTimeout, readTimeout)
+        return super(_Adapter, self).send(request, **kwargs)
+
+
+def session() -> requests.Session:
+    """
+    Gets the shared session, creating it the first time
+    :return: (requests.Session) The session
+    """
+    global _session
+
+    with _sessionLock:
+        if _session is None:
+            # No retries here, get() retries so every attempt waits for the rate limit
+            adapter = _Adapter(pool_connections=poolSize, pool_maxsize=poolSize)
+            _session = requests.Session()
+            _session.headers.update(_headers)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            logger.debug("Created the HTTP session.")
+
+    return _session
+
+
+def cache() -> HttpCache:
+    """
+    Gets the HTTP cache, opening it the first time
+    :return: (HttpCache) The cache, None if it couldn't be opened
+    """
+    global _cache
+
+    with _cacheLock:
+        if _cache is None:
+            try:
+                _cache = HttpCache(cachePath)
+            except sqlite3.Error as e:
+                logger.error(f"Couldn't open the HTTP cache, fetching without it: {e}")
+                _cache = False
+
+    return _cache if _cache is not False else None
+
+
+def setCache(httpCache: HttpCache):
+    """
+    Replaces the HTTP cache, e.g. with one in another file
+    :param httpCache: The cache, None to fetch without one
+    """
+    global _cache
+
+    with _cacheLock:
+        _cache = httpCache if httpCache is not None else False
+
+
+def _cachedResponse(cached: CachedResponse) -> requests.Response:
+    # A Response like the one the cached response was read from
+    response = requests.Response()
+    response.url = cached.url
+    response.status_code = cached.status
+    response.reason = _reasons.get(cached.status, "")
+    response.headers = CaseInsensitiveDict(cached.headers)
+    response.encoding = cached.encoding
+    response._content = cached.body
+
+    return response
+
+
+def _retryDelay(response: requests.Response, attempt: int) -> float:
+    # Seconds to wait before trying again: what the server asked for, or the backoff.
+    # None if the server asked us to wait too long.
+    delay = backoff * 2 ** attempt
+    retryAfter = response.headers.get("Retry-After", "") if response is not None else ""
+    if retryAfter != "":
+        try:
+            delay = float(retryAfter)
+        except ValueError:  # An HTTP date instead of seconds
+            try:
+                delay = (parsedate_to_datetime(retryAfter) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+
+    return max(delay, 0.0) if delay <= maxRetryAfter else None
+
+
+def get(url: str, cached: bool = True, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared session. A fresh response in the cache is used
+    instead, and an expired one is revalidated if the server gave an ETag or Last-Modified.
+    :param url: The URL
+    :param cached: Use the HTTP cache
+    :param kwargs: Passed on to requests, e.g. 'timeout' to override the default timeouts
+    :return: (requests.Response) The response, the last one if it kept failing with a server error.
+             Raises requests.exceptions.RequestException if the server couldn't be reached, even
+             after retrying, and ratelimit.Cancelled if the thread's job was cancelled while the
+             request waited for its turn.
+    """
+    httpCache = cache() if cached else None
+    stored = httpCache.lookup(url) if httpCache is not None else None
+    if stored is not None and not stored.expired:
+        return _cachedResponse(stored)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if stored is not None:
+        headers.update(stored.validators())
+    for attempt in range(retries + 1):
+        waitTurn(url)
+        try:
+            response = session().get(url, headers=headers, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            holdOff(url, _retryDelay(None, attempt))
+            continue
+
+        delay = _retryDelay(response, attempt) if response.status_code in retryStatuses else None
+        if delay is None or attempt == retries:
+            break
+        logger.info(f"Got {response.status_code} from '{url}', trying again in {delay:.1f} s.")
+        holdOff(url, delay)
+
+    if stored is not None and response.status_code == 304:  # Not modified
+        httpCache.refresh(url)
+        return _cachedResponse(stored)
+    if httpCache is not None and response.status_code in cacheableStatuses and \
+            "no-store" not in response.headers.get("Cache-Control", ""):
+        httpCache.store(url, response.status_code, response.headers, response.content, response.encoding)
+
+    return response
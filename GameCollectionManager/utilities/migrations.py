@@ -0,0 +1,364 @@
+"""
+Versioned schema migrations for the collection database.
+
+Each migration is a function taking an sqlite3 cursor. They are run in order at
+startup, each one in its own transaction, and the number of applied migrations
+is stored in the 'schema_version' table so existing databases get upgraded in place.
+"""
+import sqlite3
+
+from utilities.database import sqliteConnection
+from utilities.genres import splitGenres
+from utilities.log import logger
+from utilities.prices import historyKinds, priceColumns, priceValues, sqlToday
+from utilities.search import searchColumns
+
+# The column telling if the item itself is owned, per table
+_itemColumns = {"games": "Game", "consoles": "Console", "accessories": "Accessory"}
+
+
+def _addIndexes(cur: sqlite3.Cursor):
+    # (Platform, Name) is the order every table view is sorted in. The ownership indexes lead with
+    # the Yes/No column so the OR in the 'owned' predicate can be answered with a multi-index OR,
+    # and end with (Platform, Name) so each branch comes out in display order.
+    for table, item in _itemColumns.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_platform_name ON {table} (Platform, Name)")
+        for column in (item, "Box", "Manual"):
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column.lower()} "
+                        f"ON {table} ({column}, Platform, Name)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_region ON {table} (Region)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_year ON {table} (Year)")
+
+
+def _ownedExpression(row: str, item: str) -> str:
+    # 1 if the row (e.g. 'new' or 'old' in a trigger) is owned, else 0. 'IS' so NULLs count as not owned.
+    return f"({row}.{item} IS 'Yes' OR {row}.Box IS 'Yes' OR {row}.Manual IS 'Yes')"
+
+
+def _countStats(table: str) -> list:
+    # Statements (re)filling a table's rows in 'collection_stats' from scratch
+    owned = _ownedExpression(table, _itemColumns[table])
+    return [f"DELETE FROM collection_stats WHERE TableName = '{table}'",
+            f"INSERT INTO collection_stats (TableName, Platform, Owned, Total) "
+            f"SELECT '{table}', NULL, IFNULL(SUM({owned}), 0), COUNT(*) FROM {table}",
+            f"INSERT INTO collection_stats (TableName, Platform, Owned, Total) "
+            f"SELECT '{table}', IFNULL(Platform, ''), SUM({owned}), COUNT(*) FROM {table} "
+            f"GROUP BY IFNULL(Platform, '')"]
+
+
+def _addCollectionStats(cur: sqlite3.Cursor):
+    # Owned and total item counts per table (Platform NULL) and per platform, kept up to date by triggers
+    cur.execute("CREATE TABLE IF NOT EXISTS collection_stats "
+                "(TableName TEXT NOT NULL, Platform TEXT, "
+                "Owned INTEGER NOT NULL DEFAULT 0, Total INTEGER NOT NULL DEFAULT 0)")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS collection_stats_key ON collection_stats (TableName, Platform)")
+
+    for table, item in _itemColumns.items():
+        for statement in _countStats(table):
+            cur.execute(statement)
+
+        # Add/subtract a row to/from both the table's count and its platform's count
+        def add(row: str) -> str:
+            return (f"INSERT OR IGNORE INTO collection_stats (TableName, Platform) "
+                    f"VALUES ('{table}', IFNULL({row}.Platform, '')); "
+                    f"UPDATE collection_stats SET Total = Total + 1, Owned = Owned + {_ownedExpression(row, item)} "
+                    f"WHERE TableName = '{table}' AND (Platform IS NULL OR Platform = IFNULL({row}.Platform, '')); ")
+
+        def subtract(row: str) -> str:
+            return (f"UPDATE collection_stats SET Total = Total - 1, Owned = Owned - {_ownedExpression(row, item)} "
+                    f"WHERE TableName = '{table}' AND (Platform IS NULL OR Platform = IFNULL({row}.Platform, '')); "
+                    f"DELETE FROM collection_stats "
+                    f"WHERE TableName = '{table}' AND Platform = IFNULL({row}.Platform, '') AND Total <= 0; ")
+
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table} "
+                    f"BEGIN {add('new')} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table} "
+                    f"BEGIN {subtract('old')} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_stats_update "
+                    f"AFTER UPDATE OF Platform, {item}, Box, Manual ON {table} "
+                    f"BEGIN {subtract('old')} {add('new')} END")
+
+
+def _addSearchIndex(cur: sqlite3.Cursor):
+    # External content FTS5 tables over the searchable columns, kept in sync by triggers.
+    # Diacritics are removed so 'Pokemon' finds 'Pokémon', and 2/3 character prefixes are indexed.
+    for table, columns in searchColumns.items():
+        columnList = ", ".join(f'"{column}"' for column in columns)
+        newValues = ", ".join(f'new."{column}"' for column in columns)
+        oldValues = ", ".join(f'old."{column}"' for column in columns)
+        cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({columnList}, "
+                    f"content='{table}', content_rowid='ID', "
+                    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        cur.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+        insert = f"INSERT INTO {table}_fts (rowid, {columnList}) VALUES (new.ID, {newValues});"
+        delete = f"INSERT INTO {table}_fts ({table}_fts, rowid, {columnList}) VALUES ('delete', old.ID, {oldValues});"
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} "
+                    f"BEGIN {insert} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} "
+                    f"BEGIN {delete} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {columnList} ON {table} "
+                    f"BEGIN {delete} {insert} END")
+
+
+def _maskExpression(row: str, item: str) -> str:
+    # The ownership bitmask of a row: 1 if the item itself is owned, 2 the box, 4 the manual
+    return f"(({row}.{item} IS 'Yes') | (({row}.Box IS 'Yes') << 1) | (({row}.Manual IS 'Yes') << 2))"
+
+
+def _addOwnedMask(cur: sqlite3.Cursor):
+    # An OR of comparisons on three TEXT columns can't be answered from one index. The bitmask is
+    # non-zero for owned items, so a partial index in display order over just those rows makes
+    # the owned items view a range scan. It's kept in sync with the Yes/No columns by triggers.
+    for table, item in _itemColumns.items():
+        mask = _maskExpression(table, item)
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN owned_mask INTEGER NOT NULL DEFAULT 0")
+        cur.execute(f"UPDATE {table} SET owned_mask = {mask}")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_owned ON {table} (Platform, Name) WHERE owned_mask <> 0")
+
+        # Only there for the ORed Yes/No predicate
+        for column in (item, "Box", "Manual"):
+            cur.execute(f"DROP INDEX IF EXISTS {table}_{column.lower()}")
+
+        update = f"UPDATE {table} SET owned_mask = {mask} WHERE ID = new.ID;"
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_owned_insert AFTER INSERT ON {table} "
+                    f"BEGIN {update} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_owned_update AFTER UPDATE OF {item}, Box, Manual "
+                    f"ON {table} BEGIN {update} END")
+
+
+def _addPriceColumns(cur: sqlite3.Cursor):
+    # The prices as whole cents and a currency code next to the price text, so values can be summed in SQL.
+    # They're written along with the text by the table model.
+    for table in _itemColumns.keys():
+        for column in priceColumns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN currency TEXT NOT NULL DEFAULT 'USD'")
+
+        assignments = ", ".join(f"{column} = :{column}" for column in priceColumns + ["currency"])
+        rows = cur.execute(f"SELECT ID, Price FROM {table}").fetchall()
+        cur.executemany(f"UPDATE {table} SET {assignments} WHERE ID = :id",
+                        [dict(priceValues(price), id=itemId) for itemId, price in rows])
+
+        # Covers the valuation queries, which group the owned items by currency and platform
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_value ON {table} "
+                    f"(currency, Platform, owned_mask, {', '.join(priceColumns)}) WHERE owned_mask <> 0")
+
+
+def _addGenres(cur: sqlite3.Cursor):
+    # Every genre once, and a link per game and genre, so games can be found by genre with an index
+    # instead of splitting every game's genre string. The links are written along with the 'Genre'
+    # column by the table model, and removed with the game by a trigger.
+    cur.execute("CREATE TABLE IF NOT EXISTS genres (ID INTEGER PRIMARY KEY, Name TEXT NOT NULL UNIQUE)")
+    cur.execute("CREATE TABLE IF NOT EXISTS game_genres (GameID INTEGER NOT NULL, GenreID INTEGER NOT NULL, "
+                "PRIMARY KEY (GenreID, GameID)) WITHOUT ROWID")
+    cur.execute("CREATE INDEX IF NOT EXISTS game_genres_game ON game_genres (GameID)")
+
+    genreIds = {}
+    links = []
+    for gameId, genres in cur.execute("SELECT ID, Genre FROM games").fetchall():
+        for name in splitGenres(genres):
+            if name not in genreIds:
+                cur.execute("INSERT INTO genres (Name) VALUES (?)", (name,))
+                genreIds[name] = cur.lastrowid
+            links.append((genreIds[name], gameId))
+    cur.executemany("INSERT OR IGNORE INTO game_genres (GenreID, GameID) VALUES (?, ?)", links)
+
+    cur.execute("CREATE TRIGGER IF NOT EXISTS games_genres_delete AFTER DELETE ON games "
+                "BEGIN DELETE FROM game_genres WHERE GameID = old.ID; END")
+
+
+def _recordPrices(table: str, row: str) -> str:
+    # Statement adding a row's market prices to its price history as today's, unless they're the same as the
+    # last ones recorded, so refreshing an unchanged price doesn't grow the history. A change later on the
+    # same day replaces that day's prices.
+    kind = historyKinds[table]
+    return (f"INSERT OR REPLACE INTO price_history (Kind, ItemID, Day, Loose, CIB, New) "
+            f"SELECT {kind}, {row}.ID, {sqlToday}, {row}.loose_cents, {row}.cib_cents, {row}.new_cents "
+            f"WHERE COALESCE({row}.loose_cents, {row}.cib_cents, {row}.new_cents) IS NOT NULL "
+            f"AND NOT EXISTS (SELECT 1 FROM (SELECT Loose, CIB, New FROM price_history "
+            f"WHERE Kind = {kind} AND ItemID = {row}.ID ORDER BY Day DESC LIMIT 1) "
+            f"WHERE Loose IS {row}.loose_cents AND CIB IS {row}.cib_cents AND New IS {row}.new_cents);")
+
+
+def _addPriceHistory(cur: sqlite3.Cursor):
+    # The market prices of every item each day they changed, as integers only: the item's table (as a number),
+    # ID, the day number and the prices in cents. Clustered on (item, day), so an item's history is one range.
+    # It's written by triggers whenever the typed price columns are.
+    cur.execute("CREATE TABLE IF NOT EXISTS price_history (Kind INTEGER NOT NULL, ItemID INTEGER NOT NULL, "
+                "Day INTEGER NOT NULL, Loose INTEGER, CIB INTEGER, New INTEGER, "
+                "PRIMARY KEY (Kind, ItemID, Day)) WITHOUT ROWID")
+
+    for table in _itemColumns.keys():
+        cur.execute(f"INSERT OR IGNORE INTO price_history (Kind, ItemID, Day, Loose, CIB, New) "
+                    f"SELECT {historyKinds[table]}, ID, {sqlToday}, loose_cents, cib_cents, new_cents FROM {table} "
+                    f"WHERE COALESCE(loose_cents, cib_cents, new_cents) IS NOT NULL")
+
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_history_insert AFTER INSERT ON {table} "
+                    f"BEGIN {_recordPrices(table, 'new')} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_history_update "
+                    f"AFTER UPDATE OF loose_cents, cib_cents, new_cents ON {table} "
+                    f"BEGIN {_recordPrices(table, 'new')} END")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_history_delete AFTER DELETE ON {table} "
+                    f"BEGIN DELETE FROM price_history WHERE Kind = {historyKinds[table]} AND ItemID = old.ID; END")
+
+
+def _addCovers(cur: sqlite3.Cursor):
+    # The hash of each game's cover in the cover store. Covers saved before it are moved into the store
+    # when they're first shown. The index is for finding out if an image is still used by any game.
+    cur.execute("CREATE TABLE IF NOT EXISTS covers (GameID INTEGER PRIMARY KEY, Hash TEXT NOT NULL)")
+    cur.execute("CREATE INDEX IF NOT EXISTS covers_hash ON covers (Hash)")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS games_covers_delete AFTER DELETE ON games "
+                "BEGIN DELETE FROM covers WHERE GameID = old.ID; END")
+
+
+def _addFacetIndexes(cur: sqlite3.Cursor):
+    # The facet catalog counts items and owned items per region and year. With the mask in the
+    # indexes both counts are read from the index alone. Platforms are covered by (Platform, Name)
+    # and the owned items index already.
+    for table in _itemColumns.keys():
+        for column in ("Region", "Year"):
+            cur.execute(f"DROP INDEX IF EXISTS {table}_{column.lower()}")
+            cur.execute(f"CREATE INDEX {table}_{column.lower()} ON {table} ({column}, owned_mask)")
+
+
+def _addFetchTasks(cur: sqlite3.Cursor):
+    # What fetching info for all games still has to do, one task per game and kind of info
+    # ('info', 'price' or 'cover'), so a fetch can carry on after the program is closed.
+    # Finished tasks are kept, so games fetched recently can be skipped the next time.
+    cur.execute("CREATE TABLE IF NOT EXISTS fetch_tasks (GameID INTEGER NOT NULL, Kind TEXT NOT NULL, "
+                "State TEXT NOT NULL DEFAULT 'pending', Attempts INTEGER NOT NULL DEFAULT 0, LastError TEXT, "
+                "NextTry REAL NOT NULL DEFAULT 0, Finished REAL, Data TEXT, "
+                "PRIMARY KEY (GameID, Kind)) WITHOUT ROWID")
+    cur.execute("CREATE INDEX IF NOT EXISTS fetch_tasks_queue ON fetch_tasks (Kind, State, NextTry)")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS games_fetch_delete AFTER DELETE ON games "
+                "BEGIN DELETE FROM fetch_tasks WHERE GameID = old.ID; END")
+
+
+def _addNotFound(cur: sqlite3.Cursor):
+    # Titles a site didn't have, so they aren't looked for again until the entry expires. The key is
+    # normalized, the names are kept as they were looked up for listing them.
+    cur.execute("CREATE TABLE IF NOT EXISTS not_found (Source TEXT NOT NULL, Title TEXT NOT NULL, "
+                "Platform TEXT NOT NULL, Region TEXT NOT NULL, Reason TEXT NOT NULL, Name TEXT NOT NULL, "
+                "PlatformName TEXT NOT NULL, RegionName TEXT NOT NULL, Found REAL NOT NULL, Expires REAL NOT NULL, "
+                "PRIMARY KEY (Source, Title, Platform, Region)) WITHOUT ROWID")
+
+
+# Only ever append to this list. A database's schema version is the number of entries applied.
+_migrations = [_addIndexes, _addCollectionStats, _addSearchIndex, _addOwnedMask, _addPriceColumns, _addGenres,
+               _addPriceHistory, _addCovers, _addFacetIndexes, _addFetchTasks,
+               _addNotFound]
+
+
+def bulkInsertTriggers(table: str) -> tuple:
+    """
+    Lists the per-row insert triggers on an item table that can be dropped while inserting
+    many rows in one transaction, and the set-based statements that do the same work
+    afterwards. Every '?' in the statements is the ID of the first inserted row.
+    :param table: Item table
+    :return: (tuple) List of trigger names, list of SQL statements
+    """
+    item = _itemColumns[table]
+    owned = _ownedExpression(table, item)
+    columnList = ", ".join(f'"{column}"' for column in searchColumns[table])
+    # The new rows are counted per platform once, the table's total is the sum of the platforms
+    newCounts = "FROM temp.bulk_stats " \
+                "WHERE bulk_stats.Platform = IFNULL(collection_stats.Platform, bulk_stats.Platform)"
+
+    triggers = [f"{table}_stats_insert", f"{table}_fts_insert", f"{table}_owned_insert", f"{table}_history_insert"]
+    statements = [f"UPDATE {table} SET owned_mask = {_maskExpression(table, item)} WHERE ID >= ?",
+                  "DROP TABLE IF EXISTS temp.bulk_stats",
+                  f"CREATE TEMP TABLE bulk_stats AS SELECT IFNULL(Platform, '') AS Platform, "
+                  f"COUNT(*) AS Total, IFNULL(SUM({owned}), 0) AS Owned FROM {table} WHERE ID >= ? "
+                  f"GROUP BY IFNULL(Platform, '')",
+                  f"INSERT OR IGNORE INTO collection_stats (TableName, Platform) "
+                  f"SELECT '{table}', Platform FROM temp.bulk_stats",
+                  f"UPDATE collection_stats "
+                  f"SET Total = Total + (SELECT SUM(Total) {newCounts}), "
+                  f"Owned = Owned + (SELECT SUM(Owned) {newCounts}) "
+                  f"WHERE TableName = '{table}' "
+                  f"AND (Platform IS NULL OR Platform IN (SELECT Platform FROM temp.bulk_stats))",
+                  "DROP TABLE temp.bulk_stats",
+                  f"INSERT INTO {table}_fts (rowid, {columnList}) SELECT ID, {columnList} FROM {table} WHERE ID >= ?",
+                  f"INSERT OR REPLACE INTO price_history (Kind, ItemID, Day, Loose, CIB, New) "
+                  f"SELECT {historyKinds[table]}, ID, {sqlToday}, loose_cents, cib_cents, new_cents FROM {table} "
+                  f"WHERE ID >= ? AND COALESCE(loose_cents, cib_cents, new_cents) IS NOT NULL"]
+
+    return triggers, statements
+
+
+def bulkDeleteTriggers(table: str, ids: str, most: bool = False) -> tuple:
+    """
+    Lists the per-row triggers on an item table that can be dropped while deleting many
+    rows in one transaction, and the set-based statements that do the same work.
+    :param table: Item table
+    :param ids: SQL query selecting the IDs of the rows that are deleted
+    :param most: Most of the table is deleted by emptying it and inserting the rows that are
+                 kept back, so the insert triggers are dropped as well
+    :return: (tuple) List of trigger names, list of SQL statements to run before deleting,
+             list of SQL statements to run after deleting
+    """
+    columnList = ", ".join(f'"{column}"' for column in searchColumns[table])
+
+    triggers = [f"{table}_stats_delete", f"{table}_fts_delete", f"{table}_history_delete"]
+    if most:
+        triggers += bulkInsertTriggers(table)[0]
+        before = []
+        after = [f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')"]
+    else:
+        before = [f"INSERT INTO {table}_fts ({table}_fts, rowid, {columnList}) "
+                  f"SELECT 'delete', ID, {columnList} FROM {table} WHERE ID IN ({ids})"]
+        after = []
+    before.append(f"DELETE FROM price_history WHERE Kind = {historyKinds[table]} AND ItemID IN ({ids})")
+    if table == "games":
+        triggers += ["games_genres_delete", "games_covers_delete", "games_fetch_delete"]
+        before += [f"DELETE FROM game_genres WHERE GameID IN ({ids})", f"DELETE FROM covers WHERE GameID IN ({ids})",
+                   f"DELETE FROM fetch_tasks WHERE GameID IN ({ids})"]
+    after += _countStats(table)
+
+    return triggers, before, after
+
+
+def schemaVersion(con: sqlite3.Connection) -> int:
+    """
+    Reads the schema version of a database
+    :param con: Connection to the database
+    :return: (int) Number of migrations applied to the database
+    """
+    con.execute("CREATE TABLE IF NOT EXISTS schema_version (Version INTEGER NOT NULL)")
+    row = con.execute("SELECT MAX(Version) FROM schema_version").fetchone()
+
+    return row[0] if row[0] is not None else 0
+
+
+def migrate(dbPath: str) -> int:
+    """
+    Upgrades the database to the latest schema version
+    :param dbPath: Path to the database
+    :return: (int) The database's schema version after migrating
+    """
+    con = sqliteConnection(dbPath, isolation_level=None)  # We handle the transactions ourselves
+    try:
+        version = schemaVersion(con)
+        if version > len(_migrations):
+            logger.warning(f"Database schema version {version} is newer than this version of the program.")
+            return version
+
+        for newVersion, migration in enumerate(_migrations[version:], start=version + 1):
+            logger.info(f"Migrating database to schema version {newVersion} ({migration.__name__})...")
+            cur = con.cursor()
+            cur.execute("BEGIN")
+            try:
+                migration(cur)
+                cur.execute("DELETE FROM schema_version")
+                cur.execute("INSERT INTO schema_version (Version) VALUES (?)", (newVersion,))
+                cur.execute("COMMIT")
+            except sqlite3.Error as e:
+                cur.execute("ROLLBACK")
+                logger.critical(f"Migration to schema version {newVersion} failed: {e}")
+                raise
+            version = newVersion
+    finally:
+        con.close()
+
+    return version
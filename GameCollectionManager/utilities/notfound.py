@@ -0,0 +1,114 @@
+"""
+Titles the scrapers couldn't find, so they aren't looked for again on every fetch. Finding out
+that a site doesn't have a game takes the most requests of all: MobyGames' scraper goes through
+the suggestions on its 404 page and their alternate titles, and then variations of the URL, and
+PriceCharting's through its search results. A miss is kept in the 'not_found' table for a while,
+with the reason, keyed on the site and the normalized title, platform and region, so checking
+for one is a single lookup. The misses are listed in the 'Titles not found' window, where the
+games can be found to fix their names, or a miss forgotten so the title is looked for again.
+"""
+import re
+import time
+import unicodedata as ucd
+
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.queries import execQuery, fetchAll, fetchValue
+
+sources = {"mobygames": "MobyGames", "pricecharting": "PriceCharting"}  # Source: name shown
+
+# Reason: (text shown, days until it's looked for again)
+reasons = {"platform": ("Platform not supported", 90),
+           "notfound": ("Not found", 30),
+           "nomatch": ("No matching title", 30)}
+
+
+class Miss:
+    """
+    A title a site didn't have
+    source: One of sources
+    name, platform, region: As they were looked up
+    reason: One of reasons
+    found, expires: When it was found missing, and when it's looked for again, in seconds since the epoch
+    """
+
+    def __init__(self, source: str, name: str, platform: str, region: str, reason: str, found: float, expires: float):
+        self.source = source
+        self.name = name
+        self.platform = platform
+        self.region = region
+        self.reason = reason
+        self.found = found
+        self.expires = expires
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a title, platform or region for the key, so e.g. different spacing finds the same miss
+    :param text: The text
+    :return: (str) The normalized text
+    """
+    return re.sub(r"\s+", " ", ucd.normalize("NFKC", text or "")).strip()
+
+
+def _key(source: str, name: str, platform: str, region: str) -> tuple:
+    # The scrapers look titles up in lower case, but the platforms and regions as they are
+    return source, normalize(name).casefold(), normalize(platform), normalize(region)
+
+
+def lookup(source: str, name: str, platform: str, region: str = "", db: QSqlDatabase = None) -> str:
+    """
+    Checks if a site is known not to have a title
+    :param source: One of sources
+    :param name: The title
+    :param platform: The platform
+    :param region: The region, empty for sites where it doesn't matter
+    :param db: Database connection, the current thread's connection if not given
+    :return: (str) The reason it's missing, empty if it isn't known to be
+    """
+    return fetchValue("SELECT Reason FROM not_found WHERE Source = ? AND Title = ? AND Platform = ? AND Region = ? "
+                      "AND Expires > ?", _key(source, name, platform, region) + (time.time(),), db, default="")
+
+
+def record(source: str, name: str, platform: str, region: str, reason: str, db: QSqlDatabase = None) -> bool:
+    """
+    Remembers that a site doesn't have a title, until the reason's time is up
+    :param source: One of sources
+    :param name: The title
+    :param platform: The platform
+    :param region: The region, empty for sites where it doesn't matter
+    :param reason: One of reasons
+    :param db: Database connection, the current thread's connection if not given
+    :return: (bool) True if it was recorded
+    """
+    now = time.time()
+    return execQuery("INSERT OR REPLACE INTO not_found (Source, Title, Platform, Region, Reason, Name, PlatformName, "
+                     "RegionName, Found, Expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     _key(source, name, platform, region) + (reason, name, platform, region,
+                                                             now, now + reasons[reason][1] * 24 * 60 * 60),
+                     db) is not None
+
+
+def forget(miss: Miss, db: QSqlDatabase = None) -> bool:
+    """
+    Forgets a miss, so the title is looked for again
+    :param miss: The miss
+    :param db: Database connection, the current thread's connection if not given
+    :return: (bool) True if it was forgotten
+    """
+    return execQuery("DELETE FROM not_found WHERE Source = ? AND Title = ? AND Platform = ? AND Region = ?",
+                     _key(miss.source, miss.name, miss.platform, miss.region), db) is not None
+
+
+def misses(db: QSqlDatabase = None) -> list:
+    """
+    Lists the titles known to be missing, dropping the ones whose time is up
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Miss objects, by platform and title
+    """
+    now = time.time()
+    execQuery("DELETE FROM not_found WHERE Expires <= ?", (now,), db)
+    rows = fetchAll("SELECT Source, Name, PlatformName, RegionName, Reason, Found, Expires FROM not_found "
+                    "ORDER BY Platform, Title, Source", db=db)
+
+    return [Miss(*row) for row in rows]
@@ -0,0 +1,199 @@
+"""
+Item prices. They're shown and edited as text in the form '$paid,$loose,$cib,$new'
+(stored in the 'Price' column), and also kept as whole cents in typed columns, so
+the collection's value can be summed in SQL instead of parsing every price.
+"""
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from PySide2.QtSql import QSqlDatabase
+
+from utilities.queries import fetchAll
+
+# Currency code: what its prices start with
+currencySigns = {"USD": "$", "AUD": "AUD ", "BRL": "R$", "CAD": "CAD ", "EUR": "€", "GBP": "£", "MXN": "Mex$"}
+
+# The typed price columns of the item tables, in the order of the prices in the text
+priceColumns = ["paid_cents", "loose_cents", "cib_cents", "new_cents"]
+
+# What the item tables are called in the 'price_history' table, which only stores integers
+historyKinds = {"games": 1, "consoles": 2, "accessories": 3}
+
+# Today as a day number in SQL, the number of days since 1970-01-01 (UTC)
+sqlToday = "(CAST(strftime('%s', 'now') AS INTEGER) / 86400)"
+
+_epoch = date(1970, 1, 1)
+
+# Longest first, so 'Mex$' and 'R$' aren't taken for '$'
+_signs = sorted(((sign, code) for code, sign in currencySigns.items()), key=lambda s: len(s[0]), reverse=True)
+
+
+def parsePrice(price: str) -> tuple:
+    """
+    Reads a price like '$12.50', '€3' or 'N/A'
+    :param price: The price
+    :return: (tuple) Currency code or None if there's no sign, price in cents or None if there's no price
+    """
+    price = price.strip() if price is not None else ""
+    currency = None
+    for sign, code in _signs:
+        if price.startswith(sign):
+            currency = code
+            price = price[len(sign):].strip()
+            break
+
+    try:
+        amount = Decimal(price)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        return currency, None
+
+    cents = int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    return currency, cents
+
+
+def priceValues(price: str) -> dict:
+    """
+    Turns an item's price text into the values of the typed price columns
+    :param price: Price text in the form '$paid,$loose,$cib,$new'
+    :return: (dict) Column: value, for the cent columns and 'currency'
+    """
+    prices = (price if price is not None else "").split(",")
+    prices += [""] * (len(priceColumns) - len(prices))
+
+    values = {}
+    currencies = []
+    for column, text in zip(priceColumns, prices):
+        currency, values[column] = parsePrice(text)
+        currencies.append(currency)
+
+    # The market prices are all in the same currency, the paid price is whatever was typed in
+    known = [currency for currency in currencies[1:] + currencies[:1] if currency is not None]
+    values["currency"] = known[0] if len(known) > 0 else "USD"
+
+    return values
+
+
+def formatCents(cents: int, currency: str = "USD") -> str:
+    """
+    Formats a price in cents for showing it
+    :param cents: The price in cents
+    :param currency: Currency code
+    :return: (str) The price, e.g. '$12.50'
+    """
+    return f"{currencySigns.get(currency, currency + ' ')}{Decimal(cents or 0) / 100:.2f}"
+
+
+def _ownedValues(tables: list, groupBy: str) -> str:
+    # What the owned items in each table are worth, summed per group. An item is worth its complete
+    # in box (CIB) price if it has the item, box and manual, else its loose price.
+    return " UNION ALL ".join(f"SELECT {groupBy}, SUM(CASE WHEN owned_mask = 7 THEN cib_cents END) AS cib, "
+                              f"SUM(CASE WHEN owned_mask <> 7 THEN loose_cents END) AS loose, "
+                              f"SUM(paid_cents) AS paid "
+                              f"FROM {table} WHERE owned_mask <> 0 GROUP BY {groupBy}" for table in tables)
+
+
+def collectionValue(tables: list, db: QSqlDatabase = None) -> list:
+    """
+    Sums up what the owned items in the tables are worth, per currency
+    :param tables: Item tables to include
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Tuples of currency, total value, value of the CIB items,
+             value of the loose items, and paid, all in cents
+    """
+    return fetchAll(f"SELECT currency, IFNULL(SUM(cib), 0) + IFNULL(SUM(loose), 0), IFNULL(SUM(cib), 0), "
+                    f"IFNULL(SUM(loose), 0), IFNULL(SUM(paid), 0) "
+                    f"FROM ({_ownedValues(tables, 'currency')}) GROUP BY currency ORDER BY currency", db=db)
+
+
+def platformValues(tables: list, db: QSqlDatabase = None) -> list:
+    """
+    Sums up what the owned items in the tables are worth, per platform and currency
+    :param tables: Item tables to include
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Tuples of platform, currency and value in cents, most valuable first
+    """
+    return fetchAll(f"SELECT Platform, currency, IFNULL(SUM(cib), 0) + IFNULL(SUM(loose), 0) AS value "
+                    f"FROM ({_ownedValues(tables, 'Platform, currency')}) "
+                    f"GROUP BY Platform, currency ORDER BY value DESC", db=db)
+
+
+def dayNumber(day: date) -> int:
+    """
+    Turns a date into a day number, as stored in the price history
+    :param day: The date
+    :return: (int) Number of days since 1970-01-01
+    """
+    return (day - _epoch).days
+
+
+def dayDate(dayNumber: int) -> date:
+    """
+    Turns a day number from the price history into a date
+    :param dayNumber: Number of days since 1970-01-01
+    :return: (date) The date
+    """
+    return _epoch + timedelta(days=dayNumber)
+
+
+def _ownedHistory(table: str) -> str:
+    # The price history of the owned items in a table, with the price an item is worth (CIB if it has
+    # the item, box and manual, else loose) and its currency. The history is in its primary key order,
+    # which is what the window functions partition and order it by.
+    return (f"SELECT h.Kind, h.ItemID, h.Day, i.currency AS currency, "
+            f"CASE WHEN i.owned_mask = 7 THEN h.CIB ELSE h.Loose END AS price "
+            f"FROM price_history h JOIN {table} i ON i.ID = h.ItemID "
+            f"WHERE h.Kind = {historyKinds[table]} AND i.owned_mask <> 0")
+
+
+def valueOverTime(tables: list, since: date = None, db: QSqlDatabase = None) -> list:
+    """
+    Works out what the owned items in the tables were worth on each day their prices changed,
+    from the price history. An item is worth its last recorded price until it changes again.
+    :param tables: Item tables to include
+    :param since: First day to include, all of the history if not given
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Tuples of date, currency and value in cents, oldest first
+    """
+    history = " UNION ALL ".join(_ownedHistory(table) for table in tables)
+
+    # Each change adds the difference to the previous price of the item, and the running
+    # sum of those differences is the collection's value
+    rows = fetchAll(f"SELECT Day, currency, value FROM "
+                    f"(SELECT Day, currency, SUM(SUM(change)) OVER (PARTITION BY currency ORDER BY Day) AS value "
+                    f"FROM (SELECT Day, currency, IFNULL(price, 0) - IFNULL(LAG(price) OVER "
+                    f"(PARTITION BY Kind, ItemID ORDER BY Day), 0) AS change FROM ({history})) "
+                    f"GROUP BY Day, currency) WHERE Day >= ? ORDER BY Day, currency",
+                    (dayNumber(since) if since is not None else 0,), db)
+
+    return [(dayDate(day), currency, value) for day, currency, value in rows]
+
+
+def biggestMovers(tables: list, since: date, limit: int = 10, db: QSqlDatabase = None) -> list:
+    """
+    Finds the owned items whose price changed the most since a day, from the price history.
+    An item's price then is its last recorded price on or before the day, or the first one
+    recorded after it.
+    :param tables: Item tables to include
+    :param since: The day to compare with
+    :param limit: Maximum number of items
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Tuples of table, item ID, platform, name, currency, price then and price now
+             in cents, biggest change first
+    """
+    # A day and a price packed into one integer, so the price of the latest (or earliest) day
+    # comes out of a single MAX (or MIN) while the history is aggregated per item in one pass
+    packed = "((Day << 32) + price)"
+    movers = []
+    for table in tables:
+        movers.append(f"SELECT '{table}' AS tableName, m.ItemID, i.Platform, i.Name, i.currency, "
+                      f"m.pricedThen & 4294967295 AS priceThen, m.pricedNow & 4294967295 AS priceNow "
+                      f"FROM (SELECT ItemID, MAX({packed}) AS pricedNow, "
+                      f"IFNULL(MAX(CASE WHEN Day <= {dayNumber(since)} THEN {packed} END), MIN({packed})) AS pricedThen "
+                      f"FROM ({_ownedHistory(table)}) WHERE price IS NOT NULL GROUP BY ItemID) m "
+                      f"JOIN {table} i ON i.ID = m.ItemID")
+
+    return fetchAll(f"SELECT * FROM ({' UNION ALL '.join(movers)}) WHERE priceThen <> priceNow "
+                    f"ORDER BY ABS(priceNow - priceThen) DESC LIMIT ?", (limit,), db)
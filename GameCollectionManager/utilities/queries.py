@@ -0,0 +1,152 @@
+"""
+Prepared queries for the collection database. Statements are prepared once per
+connection and kept in a small LRU cache keyed by their SQL, so running the same
+kind of query again only binds new values instead of compiling the SQL again.
+Values are always bound, never put in the SQL itself. Without a connection given,
+queries run on the current thread's connection.
+"""
+import threading
+from collections import OrderedDict
+
+from PySide2.QtSql import QSqlDatabase, QSqlQuery
+
+from utilities.database import connection
+from utilities.log import logger
+
+_maxQueries = 64
+_local = threading.local()  # Each thread has its own connection, and so its own prepared queries
+
+
+def _queries() -> OrderedDict:
+    # (connection name, SQL): prepared query, least recently used first
+    if not hasattr(_local, "queries"):
+        _local.queries = OrderedDict()
+    return _local.queries
+
+
+def preparedQuery(sql: str, db: QSqlDatabase = None) -> QSqlQuery:
+    """
+    Gets a prepared query from the cache, or prepares it
+    :param sql: The SQL, with '?' for values
+    :param db: Database connection, the current thread's connection if not given
+    :return: (QSqlQuery) The prepared query
+    """
+    db = db if db is not None else connection()
+    key = (db.connectionName(), sql)
+    queries = _queries()
+
+    query = queries.get(key)
+    if query is not None:
+        queries.move_to_end(key)
+        return query
+
+    query = QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(sql):
+        logger.error(f"Couldn't prepare query '{sql}': {query.lastError().text()}")
+        return query
+
+    queries[key] = query
+    if len(queries) > _maxQueries:
+        queries.popitem(last=False)
+
+    return query
+
+
+def execQuery(sql: str, params=(), db: QSqlDatabase = None) -> QSqlQuery:
+    """
+    Runs a prepared query with values bound to it
+    :param sql: The SQL, with '?' for values
+    :param params: Values for the '?'s, in order
+    :param db: Database connection, the current thread's connection if not given
+    :return: (QSqlQuery) The query, positioned before the first result row, or None if it failed
+    """
+    query = preparedQuery(sql, db)
+    for param in params:
+        query.addBindValue(param)
+    if not query.exec_():
+        logger.error(f"Query '{sql}' failed: {query.lastError().text()}")
+        query.finish()
+        return None
+
+    return query
+
+
+def fetchAll(sql: str, params=(), db: QSqlDatabase = None) -> list:
+    """
+    Runs a prepared query and reads all of its results
+    :param sql: The SQL, with '?' for values
+    :param params: Values for the '?'s, in order
+    :param db: Database connection, the current thread's connection if not given
+    :return: (list) Result rows as tuples
+    """
+    rows = []
+    query = execQuery(sql, params, db)
+    if query is not None:
+        columns = query.record().count()
+        while query.next():
+            rows.append(tuple(query.value(i) for i in range(columns)))
+        query.finish()
+
+    return rows
+
+
+def fetchValue(sql: str, params=(), db: QSqlDatabase = None, default=None):
+    """
+    Runs a prepared query and reads the first column of its first result row
+    :param sql: The SQL, with '?' for values
+    :param params: Values for the '?'s, in order
+    :param db: Database connection, the current thread's connection if not given
+    :param default: Returned if there are no results
+    :return: The value
+    """
+    value = default
+    query = execQuery(sql, params, db)
+    if query is not None:
+        if query.next():
+            value = query.value(0)
+        query.finish()
+
+    return value
+
+
+def clearQueryCache(db: QSqlDatabase = None):
+    """
+    Forgets the current thread's prepared queries of a connection, e.g. before it's closed
+    :param db: Database connection, all of the thread's connections if not given
+    """
+    queries = _queries()
+    for key in list(queries.keys()):
+        if db is None or key[0] == db.connectionName():
+            queries.pop(key).finish()
+
+
+def selectionFilter(selections: dict, table: str = "games") -> tuple:
+    """
+    Builds an SQL condition from the advanced search options. Every column has to have
+    one of its selected values. Games can be in several genres, and have to be in one of
+    the selected ones, which is looked up in the genre links.
+    :param selections: Column: set of selected values, like FilterDock.getSelections()
+    :param table: Item table the condition is for
+    :return: (tuple) SQL condition, list of values to bind
+    """
+    conditions = []
+    params = []
+
+    # Sorted, so the same selections always give the same SQL and reuse its prepared query
+    for column in sorted(selections.keys()):
+        values = sorted(selections[column])
+        if len(values) == 0:
+            continue
+
+        if column == "Genre" and table != "games":
+            conditions.append("0")  # Only games have genres
+        elif column == "Genre":
+            conditions.append(f"ID IN (SELECT GameID FROM game_genres WHERE GenreID IN "
+                              f"(SELECT ID FROM genres WHERE Name IN ({', '.join(['?'] * len(values))})))")
+            params += values
+        else:
+            conditions.append(f'"{column}" IN ({", ".join(["?"] * len(values))})')
+            params += values
+
+    return " AND ".join(conditions) if len(conditions) > 0 else "1=1", params
@@ -0,0 +1,111 @@
+"""
+Rate limits for the sites the scrapers fetch from. Each host has a token bucket of its own,
+so requests to one site only wait for that site's limit and requests to different sites
+can be sent at the same time. A job running on a worker thread can be cancelled while one
+of its requests waits for its turn.
+"""
+import threading
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+# Host: (requests per second, burst). The burst is how many requests can be sent right away
+# after a pause, so looking up a single game, which takes a handful, doesn't wait.
+hostRates = {"www.mobygames.com": (1.0, 6),
+             "www.pricecharting.com": (1.0, 4)}
+defaultRate = (4.0, 8)  # Other hosts, e.g. where the cover images are
+
+_buckets = {}
+_bucketsLock = threading.Lock()
+_thread = threading.local()
+
+
+class Cancelled(Exception):
+    """Raised on a thread whose job was cancelled while waiting for its turn to send a request"""
+
+
+class TokenBucket:
+    """
+    Allows a number of requests per second on average, and a burst of them after a pause
+    rate: Tokens added per second
+    burst: Most tokens the bucket holds
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, cancel: threading.Event = None):
+        """
+        Takes a token, waiting for one if the bucket is empty
+        :param cancel: Stops waiting and raises Cancelled when set
+        """
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+
+            if cancel is None:
+                sleep(wait)
+            elif cancel.wait(wait):
+                raise Cancelled()
+
+    def holdOff(self, seconds: float):
+        """
+        Makes the next request wait at least a while, e.g. when the server asked us to slow down
+        :param seconds: How long to wait
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            # The bucket holds one token again once the time is up
+            self._tokens = min(self._tokens, 1 - seconds * self._rate)
+
+
+def bucket(host: str) -> TokenBucket:
+    """
+    Gets the token bucket of a host, shared by all threads
+    :param host: The host name, e.g. 'www.mobygames.com'
+    :return: (TokenBucket) The bucket
+    """
+    with _bucketsLock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*hostRates.get(host, defaultRate))
+        return _buckets[host]
+
+
+def setCancelEvent(cancel: threading.Event):
+    """
+    Makes waiting for a turn on the current thread raise Cancelled once an event is set
+    :param cancel: The event, None to wait without one
+    """
+    _thread.cancel = cancel
+
+
+def holdOff(url: str, seconds: float):
+    """
+    Makes the requests to a URL's host wait a while before the next one is sent
+    :param url: A URL on the host
+    :param seconds: How long to wait
+    """
+    bucket(urlsplit(url).hostname).holdOff(seconds)
+
+
+def waitTurn(url: str):
+    """
+    Waits until a request can be sent to a URL's host. Raises Cancelled if the
+    current thread's cancel event is set while waiting.
+    :param url: The URL the request is for
+    """
+    cancel = getattr(_thread, "cancel", None)
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+    bucket(urlsplit(url).hostname).take(cancel)
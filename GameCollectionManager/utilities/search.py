@@ -0,0 +1,79 @@
+"""
+Helpers for the full-text search index. Each item table has an FTS5 table
+named '<table>_fts' that is kept in sync with it by triggers.
+
+The index only finds words by how they start, so a search also looks for the text
+anywhere in the columns with LIKE, like it did before there was an index. SQLite's
+trigram tokenizer would find those through the index, but the SQLite in QtSql is
+too old for it, and the index has to be written through QtSql.
+"""
+import re
+
+# Columns the simple search looks in, per table
+searchColumns = {"games": ["Platform", "Name", "Region", "Comment", "Year", "Genre", "Code"],
+                 "consoles": ["Platform", "Name", "Region", "Comment", "Year", "Country", "Serial number"],
+                 "accessories": ["Platform", "Name", "Region", "Comment", "Year", "Country"]}
+
+
+def matchExpression(text: str, columns: list = None) -> str:
+    """
+    Turns search text into an FTS5 query where every word has to match
+    the start of a word in the item, e.g. 'zelda link' -> '"zelda"* "link"*'
+    :param text: The search text
+    :param columns: Optionally only search these columns
+    :return: (str) FTS5 query, or an empty string if there's nothing to search for
+    """
+
+    words = ['"' + word.replace('"', '""') + '"*' for word in text.split()]
+    if len(words) == 0:
+        return ""
+
+    expression = " ".join(words)
+    if columns is not None:
+        expression = "{" + " ".join(f'"{column}"' for column in columns) + "} : (" + expression + ")"
+
+    return expression
+
+
+def likeCondition(text: str, columns: list) -> tuple:
+    """
+    Builds an SQL condition where the search text is found anywhere in one of the columns,
+    e.g. 'ario' finds 'Super Mario Bros.', which the index doesn't
+    :param text: The search text
+    :param columns: The columns to look in
+    :return: (tuple) SQL condition, list of values to bind. The condition is empty if
+             there's nothing to search for.
+    """
+
+    text = text.strip()
+    if text == "":
+        return "", []
+
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+    condition = " OR ".join(f'"{column}" LIKE ? ESCAPE \'\\\'' for column in columns)
+
+    return f"({condition})", [pattern] * len(columns)
+
+
+def searchCondition(table: str, text: str, columns: list = None, indexed: bool = True) -> tuple:
+    """
+    Builds an SQL condition for the items a search finds: the ones the index matches
+    (see matchExpression()), and the ones with the text anywhere in a column
+    :param table: The item table
+    :param text: The search text
+    :param columns: Optionally only search these columns
+    :param indexed: Use the index. Without it only the text anywhere in a column is found.
+    :return: (tuple) SQL condition, list of values to bind. The condition is empty if
+             there's nothing to search for.
+    """
+
+    match = matchExpression(text, columns)
+    if match == "":
+        return "", []
+
+    ftsTable = f"{table}_fts"
+    like, params = likeCondition(text, columns if columns is not None else searchColumns[table])
+    if not indexed:
+        return like, params
+
+    return f"(ID IN (SELECT rowid FROM {ftsTable} WHERE {ftsTable} MATCH ?) OR {like})", [match] + params
@@ -0,0 +1,91 @@
+"""
+Runs searches off the GUI thread. Each search gets a token, and starting a new one
+interrupts the one in progress, so only the results of the latest search are delivered.
+"""
+import sqlite3
+
+from PySide2.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from utilities.database import sqliteConnection
+from utilities.log import logger
+
+
+class _Search(QRunnable):
+    def __init__(self, worker, token: int, sql: str, params: list):
+        super(_Search, self).__init__()
+        self._worker = worker
+        self._token = token
+        self._sql = sql
+        self._params = params
+
+    def run(self):
+        worker = self._worker
+        if self._token != worker.latestToken:
+            return  # Already replaced by a newer search before it got to run
+
+        try:
+            ids = [row[0] for row in worker.connection().execute(self._sql, self._params)]
+        except sqlite3.OperationalError as e:
+            # Interrupted because a newer search was started, or it's a real error
+            if self._token == worker.latestToken:
+                logger.error(f"Search failed: {e}")
+                worker.failed.emit(self._token)
+            return
+
+        if self._token == worker.latestToken:
+            worker.searched.emit(self._token, ids)
+
+
+class SearchWorker(QObject):
+    """
+    Finds the IDs of the items matching a search on a background thread,
+    using a connection of its own to the database
+    """
+
+    searched = Signal(int, object)  # Token, list of IDs in display order
+    failed = Signal(int)  # Token
+
+    def __init__(self, dbPath: str, parent=None):
+        super(SearchWorker, self).__init__(parent)
+
+        self._dbPath = dbPath
+        self._con = None
+        self.latestToken = 0
+
+        # One thread, so the searches run one at a time on the connection
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+    def connection(self) -> sqlite3.Connection:
+        # The pool's thread can change after it's been idle for a while, so the connection
+        # isn't tied to one thread. It's only ever used by one at a time.
+        if self._con is None:
+            self._con = sqliteConnection(self._dbPath, check_same_thread=False)
+        return self._con
+
+    def search(self, sql: str, params=()) -> int:
+        """
+        Starts a search, cancelling the one in progress
+        :param sql: Query selecting the item IDs, with '?' for values
+        :param params: Values for the '?'s, in order
+        :return: (int) Token of the search, sent along with its results
+        """
+        self.cancel()
+        self._pool.start(_Search(self, self.latestToken, sql, list(params)))
+
+        return self.latestToken
+
+    def cancel(self):
+        # Interrupts the search in progress, if any, and makes sure its results are dropped
+        self.latestToken += 1
+        if self._con is not None:
+            self._con.interrupt()
+
+    def stop(self):
+        # Cancels all searches and waits for the thread to finish
+        self.cancel()
+        self._pool.clear()
+        self._pool.waitForDone()
+        if self._con is not None:
+            self._con.close()
+            self._con = None
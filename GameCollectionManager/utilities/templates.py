@@ -0,0 +1,186 @@
+"""
+Platform templates, the vgdb.io lists of every game released on a platform, that can be
+imported into the collection as not owned. Parsing the text files on every import is slow,
+so they're compiled into an SQLite index in the data directory, next to the HTTP cache. The
+index keeps each file's checksum and game count, and a file that has changed since it was
+compiled is compiled again.
+Importing is then a single INSERT ... SELECT from the attached index.
+"""
+import hashlib
+import sqlite3
+from os import path
+from pathlib import Path
+
+from PySide2.QtSql import QSqlDatabase, QSqlQuery
+
+from utilities.bulkdelete import suspendTriggers
+from utilities.database import beginWrite
+from utilities.log import logger
+from utilities.migrations import bulkInsertTriggers
+from utilities.prices import priceValues
+from utilities.text2dict import readTextFile
+
+templatesDir = path.join("data", "vgdb")
+indexPath = path.join("data", "db", "templates.db")
+
+# Imported games aren't owned, and their prices are fetched later
+templatePrice = "$0,$0,$0,$0"
+
+# Bumped when the index tables change, so an index made by an older version is compiled from scratch
+_indexVersion = 1
+
+
+def _checksum(file: Path) -> str:
+    digest = hashlib.sha256()
+    with file.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _createIndex(con: sqlite3.Connection):
+    if con.execute("PRAGMA user_version").fetchone()[0] != _indexVersion:
+        con.execute("DROP TABLE IF EXISTS template_files")
+        con.execute("DROP TABLE IF EXISTS templates")
+        con.execute(f"PRAGMA user_version = {_indexVersion}")
+    # Size and MTime are only there to skip hashing files that obviously haven't changed
+    con.execute("CREATE TABLE IF NOT EXISTS template_files (Template TEXT PRIMARY KEY, Size INTEGER NOT NULL, "
+                "MTime INTEGER NOT NULL, Checksum TEXT NOT NULL, Rows INTEGER NOT NULL)")
+    # Clustered by template and line, so a template's games are read in the order they're in the file
+    con.execute("CREATE TABLE IF NOT EXISTS templates (Template TEXT NOT NULL, Line INTEGER NOT NULL, "
+                "Platform TEXT, Name TEXT, Region TEXT, Code TEXT, Year TEXT, "
+                "PRIMARY KEY (Template, Line)) WITHOUT ROWID")
+
+
+def compileTemplates(directory: str = templatesDir, index: str = None) -> dict:
+    """
+    Brings the index up to date with the template files. New and changed files are
+    compiled, and the games of removed files are dropped from the index.
+    :param directory: Directory with the template files
+    :param index: Path to the index, indexPath if not given
+    :return: (dict) Template name: number of games, for every template in the index
+    """
+    index = index if index is not None else indexPath
+    files = {file.stem: file for file in Path(directory).glob("*.dat")}
+
+    con = sqlite3.connect(index, isolation_level=None)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        _createIndex(con)
+        compiled = {row[0]: row[1:] for row in con.execute("SELECT Template, Size, MTime, Checksum "
+                                                           "FROM template_files")}
+
+        for template in compiled.keys() - files.keys():
+            con.execute("DELETE FROM templates WHERE Template = ?", (template,))
+            con.execute("DELETE FROM template_files WHERE Template = ?", (template,))
+            logger.info(f"Removed template '{template}' from the index.")
+
+        for template, file in sorted(files.items()):
+            stat = file.stat()
+            size, mtime, checksum = compiled.get(template, (None, None, None))
+            if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            newChecksum = _checksum(file)
+            if newChecksum == checksum:  # Only touched
+                con.execute("UPDATE template_files SET Size = ?, MTime = ? WHERE Template = ?",
+                            (stat.st_size, stat.st_mtime_ns, template))
+                continue
+
+            try:
+                games = readTextFile(file)
+            except (IOError, TypeError) as e:
+                logger.error(f"Couldn't compile template '{template}': {e}")
+                games = []
+            con.execute("DELETE FROM templates WHERE Template = ?", (template,))
+            con.executemany("INSERT INTO templates (Template, Line, Platform, Name, Region, Code, Year) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            ((template, line, game["platform"], game["name"], game["region"], game["code"],
+                              game["year"]) for line, game in enumerate(games)))
+            con.execute("INSERT OR REPLACE INTO template_files (Template, Size, MTime, Checksum, Rows) "
+                        "VALUES (?, ?, ?, ?, ?)", (template, stat.st_size, stat.st_mtime_ns, newChecksum, len(games)))
+            logger.info(f"Compiled template '{template}' ({len(games)} games).")
+
+        con.execute("COMMIT")
+        return dict(con.execute("SELECT Template, Rows FROM template_files ORDER BY Template"))
+    except sqlite3.Error as e:
+        logger.error(f"Couldn't compile the templates into '{index}': {e}")
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        return {}
+    finally:
+        con.close()
+
+
+def _insertTemplates(db: QSqlDatabase, templates: list) -> tuple:
+    # Adds the games in the current transaction. Returns the number of games added,
+    # and an error message if something failed.
+    query = QSqlQuery(db)
+    query.exec_("SELECT IFNULL(MAX(ID), 0) + 1 FROM games")
+    query.first()
+    firstId = query.value(0)
+
+    # Like a batch insert, the search index and counts are updated once for all games
+    triggers, statements = bulkInsertTriggers("games")
+    triggerSql = suspendTriggers(db, triggers)
+    if triggerSql is None:
+        return 0, "Couldn't drop the insert triggers"
+
+    prices = priceValues(templatePrice)
+    query.prepare(f"INSERT INTO games (Platform, Name, Region, Code, Game, Box, Manual, Year, Genre, Comment, "
+                  f"Publisher, Developer, Platforms, Price, {', '.join(prices.keys())}) "
+                  f"SELECT Platform, Name, Region, Code, 'No', 'No', 'No', Year, '', '', '', '', '', ?, "
+                  f"{', '.join(['?'] * len(prices))} FROM templates.templates "
+                  f"WHERE Template IN ({', '.join(['?'] * len(templates))}) ORDER BY Template, Line")
+    for value in [templatePrice] + list(prices.values()) + templates:
+        query.addBindValue(value)
+    if not query.exec_():
+        return 0, query.lastError().text()
+    inserted = query.numRowsAffected()
+
+    for statement in statements:
+        query.prepare(statement)
+        for _ in range(statement.count("?")):
+            query.addBindValue(firstId)
+        if not query.exec_():
+            return 0, query.lastError().text()
+    for sql in triggerSql:
+        if not query.exec_(sql):
+            return 0, query.lastError().text()
+
+    return inserted, None
+
+
+def importTemplates(db: QSqlDatabase, templates: list, index: str = None) -> int:
+    """
+    Adds every game in platform templates to the collection as not owned, in one transaction
+    :param db: Database connection
+    :param templates: Names of the templates, e.g. 'Nintendo 64'
+    :param index: Path to a compiled, up to date index, indexPath if not given
+    :return: (int) Number of games added
+    """
+    if len(templates) == 0:
+        return 0
+
+    # Databases can't be attached in a transaction, so it's attached for the whole import
+    query = QSqlQuery(db)
+    query.prepare("ATTACH DATABASE ? AS templates")
+    query.addBindValue(path.abspath(index if index is not None else indexPath))
+    if not query.exec_():
+        logger.error(f"Couldn't open the template index: {query.lastError().text()}")
+        return 0
+
+    inserted, error = _insertTemplates(db, templates) if beginWrite(db) else (0, "Couldn't start a transaction")
+    if error is None and db.commit():
+        logger.info(f"Imported {inserted} games from templates {', '.join(templates)}.")
+    else:
+        logger.error(f"Couldn't import templates {', '.join(templates)}: "
+                     f"{error if error is not None else db.lastError().text()}")
+        db.rollback()
+        inserted = 0
+
+    if not query.exec_("DETACH DATABASE templates"):
+        logger.error(f"Couldn't close the template index: {query.lastError().text()}")
+
+    return inserted
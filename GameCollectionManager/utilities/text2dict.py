@@ -6,7 +6,12 @@ into csv data that can be used with GCM.
 """
 
 
-def _readTextFile(infile):
+def readTextFile(infile):
+    """
+    Reads the games in a vgdb.io text file
+    :param infile: Path to the file
+    :return: (list) Dictionaries with the name, platform, region, year and code of each game
+    """
     try:
         with open(infile, 'r', encoding='utf8') as f:
             lines = f.readlines()
@@ -47,7 +52,7 @@ def _readTextFile(infile):
 
 
 def createGameData(infile):
-    filedata = _readTextFile(infile)
+    filedata = readTextFile(infile)
     gamedata = []
 
     for game in filedata:
@@ -156,22 +156,28 @@ class FilterDock(QDockWidget):
     def toggleVisibility(self):
         self.setVisible(False if self.isVisible() else True)
 
+    @staticmethod
+    def _setItems(listWidget: QListWidget, items: list):
+        # Replaces the items, keeping the ones that are still there selected
+        selected = {item.text() for item in listWidget.selectedItems()}
+        listWidget.clear()
+        listWidget.addItems(items)
+        for i in range(listWidget.count()):
+            if listWidget.item(i).text() in selected:
+                listWidget.item(i).setSelected(True)
+
     def updatePlatforms(self, platforms):
-        self._platforms.clear()
-        self._platforms.addItems(platforms)
+        self._setItems(self._platforms, platforms)
         logger.info("Updated platforms list.")
 
     def updateRegions(self, regions):
-        self._regions.clear()
-        self._regions.addItems(regions)
+        self._setItems(self._regions, regions)
         logger.info("Updated regions list.")
 
     def updateGenres(self, genres):
-        self._genres.clear()
-        self._genres.addItems(genres)
+        self._setItems(self._genres, genres)
         logger.info("Updated genres list.")
 
     def updateYears(self, years):
-        self._years.clear()
-        self._years.addItems(years)
+        self._setItems(self._years, years)
         logger.info("Updated years list.")
\ No newline at end of file
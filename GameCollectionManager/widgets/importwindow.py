@@ -1,9 +1,8 @@
-from pathlib import Path
-
+from PySide2.QtCore import Qt
 from PySide2.QtWidgets import QDialog, QLabel, QHBoxLayout, QVBoxLayout, \
     QDesktopWidget, QPushButton, QListWidget, QAbstractItemView, QMessageBox
 
-from utilities.text2dict import createGameData
+from utilities.templates import compileTemplates
 
 
 class ImportWindow(QDialog):
@@ -12,19 +11,18 @@ class ImportWindow(QDialog):
 
         self.setContentsMargins(5, 5, 5, 5)
 
-        self._gamesdata = []
-        self._platforms = []
-        self._regions = set()
+        self._templates = []
 
-        self._platformListPath = Path("data/vgdb/")
-        self._platformList = []
-        for file in self._platformListPath.iterdir():
-            self._platformList.append(file.stem)
+        # Only new and changed template files are compiled, usually none
+        self._gameCounts = compileTemplates()
 
         self._lblSelect = QLabel("Select platforms to import from:")
 
         self._consoleList = QListWidget()
-        self._consoleList.addItems(sorted(self._platformList))
+        self._consoleList.addItems(sorted(self._gameCounts.keys()))
+        for i in range(self._consoleList.count()):
+            item = self._consoleList.item(i)
+            item.setData(Qt.ToolTipRole, f"{self._gameCounts[item.text()]} games")
         self._consoleList.setSelectionMode(QAbstractItemView.MultiSelection)
 
         self._btnCancel = QPushButton("Cancel")
@@ -66,16 +64,12 @@ class ImportWindow(QDialog):
                                                 QMessageBox.Cancel | QMessageBox.Ok, QMessageBox.Cancel)
 
         if proceed == QMessageBox.Ok:
-            newData = []
-            for file in self._platformListPath.iterdir():
-                if file.stem in platforms:
-                    self._platforms.append(file.stem)
-                    newData.append(createGameData(file))
-            for lst in newData:
-                for game in lst:
-                    self._gamesdata.append(game)
-                    self._regions.add(game["region"])
+            self._templates = platforms
             self.accept()
 
-    def returnData(self):
-        return self._gamesdata, self._platforms, self._regions
+    def returnData(self) -> list:
+        """
+        Gets the platform templates that were selected
+        :return: (list) Names of the templates
+        """
+        return self._templates
@@ -2,8 +2,6 @@ from PySide2.QtCore import QSize, Qt
 from PySide2.QtWidgets import QDialog, QLabel, QComboBox, QLineEdit, QCheckBox, QPushButton, QVBoxLayout, QHBoxLayout, \
     QInputDialog, QDesktopWidget, QMessageBox
 
-from utilities.fetchinfo import getMobyRelease
-
 
 class InputWindow(QDialog):
     """Window where user can enter new data into a table.
@@ -501,6 +499,8 @@ class InputWindow(QDialog):
             self._displayMsgBox(1)
         else:
             # Fill in missing info
+            from utilities.fetchinfo import getMobyRelease  # The scraper's imports are slow, so only when used
+
             info = getMobyRelease(name, platform, region, country)
             if info["publisher"] == "":
                 self._displayMsgBox(2)
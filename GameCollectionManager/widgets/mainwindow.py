@@ -1,22 +1,22 @@
 #!/usr/bin/env python
-from os import path
-from time import sleep
-
-import requests
+from PySide2.QtCore import QTimer
 from PySide2.QtGui import QIcon
-from PySide2.QtSql import QSqlDatabase, QSqlQuery
 from PySide2.QtWidgets import QMainWindow, QDialog, QTabWidget, \
     QAction, QMenu, QApplication, QMessageBox, QLineEdit, QDesktopWidget, \
     QWidget, QLabel, QPushButton, QInputDialog, QProgressBar, QVBoxLayout, QComboBox, QHBoxLayout
 
+from utilities.bulkfetch import BulkFetcher, durationText
+from utilities.covercache import CoverCache
+from utilities.database import connection, setDatabasePath
 from utilities.exportcsv import sql2csv
-from utilities.fetchinfo import getMobyRelease
-from utilities.fetchprice import getPriceData
-from utilities.steamlibrary import getSteamLibrary
+from utilities.facets import FacetCatalog, facetNames
+from utilities.prices import collectionValue, formatCents, platformValues
 from utilities.log import logger
+from utilities.queries import fetchAll
+from utilities.searchworker import SearchWorker
 from widgets.importwindow import ImportWindow
 from widgets.inputwindow import InputWindow
-from widgets.overview import Overview
+from widgets.notfoundwindow import NotFoundWindow
 from widgets.randomizer import Randomizer
 from widgets.filterdock import FilterDock
 from widgets.sidepanel import SidePanel
@@ -37,55 +37,39 @@ class MainWindow(QMainWindow):
         # 'Import games' window
         self.importWindow = None
 
+        # Decoded covers, shared by the side panel and the randomizer
+        self.coverCache = CoverCache(parent=self)
+        QApplication.instance().aboutToQuit.connect(self.coverCache.stop)
+
         # Side panel
-        self.sidePanel = SidePanel()
+        self.sidePanel = SidePanel(self.coverCache)
 
         # Tables and their databases
-        db = QSqlDatabase.addDatabase("QSQLITE")
-        db.setDatabaseName(dbpath)
-        if not db.open():
-            logger.critical(f"Couldn't open database: {db.lastError().text()}")
+        setDatabasePath(dbpath)
+        db = connection()
+        if not db.isOpen():
             QMessageBox.critical(None, "Database Error", db.lastError().text())
-        self.gamesTableView = Table("games", db)
+        # Platforms, regions, genres and years in the collection, kept up to date by the tables
+        self.facets = FacetCatalog(db, self)
+        self.facets.changed.connect(self._facetChanged)
+        self.gamesTableView = Table("games", db, self.facets)
         self.gamesTableView.doubleClick.connect(self.sidePanel.showDetails)
-        self.consolesTableView = Table("consoles", db)
+        self.consolesTableView = Table("consoles", db, self.facets)
         self.consolesTableView.doubleClick.connect(self.sidePanel.showDetails)
-        self.accessoriesTableView = Table("accessories", db)
+        self.accessoriesTableView = Table("accessories", db, self.facets)
         self.accessoriesTableView.doubleClick.connect(self.sidePanel.showDetails)
         self.tableViewList = [self.gamesTableView,
                               self.consolesTableView,
                               self.accessoriesTableView]
 
-        self.allPlatforms = set()
-        self.allRegions = set()
-        self.allGenres = set()
-        self.allYears = set()
-        for table in self.tableViewList:
-            for row in table.ownedItems():
-                self.allPlatforms.add(row["platform"])
-                self.allRegions.add(row["region"])
-                self.allYears.add(row["year"])
-                # Split multi-genre entries
-                for genre in row["genre"].split(", "):
-                    self.allGenres.add(genre)
-
-        self.filterDock = FilterDock(sorted(self.allPlatforms, key=str.lower),
-                                     sorted(self.allRegions, key=str.lower),
-                                     sorted(self.allGenres, key=str.lower),
-                                     sorted(self.allYears, key=str.lower))
-
-        # Overview tab
-        self.overview = Overview(self.tableViewList)
+        self.filterDock = FilterDock(*[self.facets.values(facet) for facet in facetNames])
 
-        # Randomizer tab
-        self.randomizer = Randomizer(self.gamesTableView.ownedItems(),
-                                     sorted(self.allPlatforms, key=str.lower),
-                                     sorted(self.allGenres, key=str.lower))
-        self.randomizer.consoleList.itemClicked.connect(self.updateStatusbar)
-        self.randomizer.genreList.itemClicked.connect(self.updateStatusbar)
-        self.randomizer.genreMatchExclusiveCB.stateChanged.connect(self.updateStatusbar)
-        self.randomizer.btnAll.clicked.connect(self.updateStatusbar)
-        self.randomizer.btnNone.clicked.connect(self.updateStatusbar)
+        # Overview and Randomizer tabs. They're built the first time they're shown, so their
+        # queries and the charts, with matplotlib's imports, don't hold up starting the program.
+        # The tables' rows are read the first time they're shown, when the search sets their filter.
+        self.overview = None
+        self.randomizer = None
+        self._tabBuilders = {0: self._buildOverview, 4: self._buildRandomizer}  # Tab index: builder
 
         ## MainWindow layout
         # Widgets
@@ -110,6 +94,7 @@ class MainWindow(QMainWindow):
         self.viewMenu.addAction(self.buttonActions("owned"))
         self.viewMenu.addAction(self.buttonActions("delnotowned"))
         self.viewMenu.addAction(self.buttonActions("value"))
+        self.viewMenu.addAction(self.buttonActions("notfound"))
         self.helpMenu = self.menuBar().addMenu(self.tr("&Help"))
         self.helpMenu.addAction(self.buttonActions("about"))
 
@@ -118,6 +103,22 @@ class MainWindow(QMainWindow):
         self.statusProgressBar.setRange(0, 0)
         self.statusProgressBar.setVisible(False)
         self.statusBar().addPermanentWidget(self.statusProgressBar)
+        for table in self.tableViewList:
+            table.model.insertProgress.connect(self.updateProgress)
+
+        # Fetching info for all games runs in the background, and can be cancelled from the status bar.
+        # A fetch that was still running when the program was closed carries on after starting.
+        self.bulkFetcher = BulkFetcher(self.gamesTableView, self)
+        self.bulkFetcher.coverSaved.connect(self.coverCache.forget)
+        self.bulkFetcher.progress.connect(self._fetchProgress)
+        self.bulkFetcher.finished.connect(self._fetchFinished)
+        QApplication.instance().aboutToQuit.connect(self.bulkFetcher.stop)
+        self.cancelFetchBtn = QPushButton("Cancel")
+        self.cancelFetchBtn.setMaximumHeight(18)
+        self.cancelFetchBtn.setToolTip("Stop fetching info. Info fetched so far is kept.")
+        self.cancelFetchBtn.setVisible(False)
+        self.cancelFetchBtn.clicked.connect(self.bulkFetcher.cancel)
+        self.statusBar().addPermanentWidget(self.cancelFetchBtn)
 
         # Search stuff
         self.searchLabel = QLabel("Search")
@@ -125,7 +126,20 @@ class MainWindow(QMainWindow):
         self.searchBox = QLineEdit()
         self.searchBox.setVisible(False)
         self.searchBox.setClearButtonEnabled(True)
-        # self.searchBox.textChanged.connect(self.search)
+        # Search as you type, once typing pauses. The searches run on a worker thread with a
+        # connection of its own, and a new one cancels the one that's still running.
+        self.searchWorker = SearchWorker(dbpath, self)
+        self.searchWorker.searched.connect(self._showSearchResult)
+        self.searchWorker.failed.connect(self._searchFailed)
+        QApplication.instance().aboutToQuit.connect(self.searchWorker.stop)
+        # Table, SQL condition and its values, the ID query, and the condition without the full-text index
+        # to fall back to if the search fails, of the search in progress
+        self._searchTable = None
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(250)
+        self.searchTimer.timeout.connect(self.search)
+        self.searchBox.textChanged.connect(self.searchTimer.start)
         self.searchBox.returnPressed.connect(self.search)
         self.searchBtn = QPushButton("Search")
         self.searchBtn.clicked.connect(self.search)
@@ -135,19 +149,16 @@ class MainWindow(QMainWindow):
         self.filterBtn.setVisible(False)
 
         # Tab layout.
-        self.tab.addTab(self.overview.widget, "Overview")
+        self.tab.addTab(self._lazyTab(), "Overview")
         self.tab.addTab(self.gamesTableView, "Games")
         self.tab.addTab(self.consolesTableView, "Consoles")
         self.tab.addTab(self.accessoriesTableView, "Accessories")
-        self.tab.addTab(self.randomizer.widget, "Randomizer")
+        self.tab.addTab(self._lazyTab(), "Randomizer")
+        self.tab.currentChanged.connect(self._buildTab)
         self.tab.currentChanged.connect(self.search)
         self.tab.currentChanged.connect(self.sidePanel.hideDetails)
         # Connect sidePanel's saved signal to corresponding table's updateData()
-        # TODO: Update the sets of platforms and genres properly
         self.sidePanel.saved.connect(self.tableViewList[self.tab.currentIndex()].updateData)
-        self.sidePanel.saved.connect(lambda: self.randomizer.updateLists(self.gamesTableView.ownedItems(),
-                                                                         sorted(self.allPlatforms, key=str.lower),
-                                                                         sorted(self.allGenres, key=str.lower)))
 
         # Main layout
         self.tabHbox = QHBoxLayout()
@@ -178,6 +189,66 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(f"Game Collection Manager v{_VERSION}")
         self.statusBar().showMessage("")
 
+        # Start on the games. Only their table is read at startup, the other tabs when they're first shown.
+        self.tab.setCurrentIndex(self.tableViewList.index(self.gamesTableView) + 1)
+
+        self._painted = False  # The tab shown at startup is built once the window has been painted
+
+    def paintEvent(self, event):
+        super(MainWindow, self).paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            QTimer.singleShot(0, lambda: self._buildTab(self.tab.currentIndex()))
+            QTimer.singleShot(0, self._resumeFetch)
+
+    @staticmethod
+    def _lazyTab() -> QWidget:
+        # Holds a tab's widget once it's built
+        widget = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        widget.setLayout(layout)
+        return widget
+
+    def _buildTab(self, index: int):
+        build = self._tabBuilders.pop(index, None)
+        if build is not None:
+            self.tab.widget(index).layout().addWidget(build())
+
+    def _buildOverview(self) -> QWidget:
+        from widgets.overview import Overview  # Imports matplotlib, which takes a while
+
+        self.overview = Overview(self.tableViewList)
+        return self.overview.widget
+
+    def _buildRandomizer(self) -> QWidget:
+        self.randomizer = Randomizer(self.gamesTableView.model.database(), self.coverCache,
+                                     self.facets.values("platform"), self.facets.values("genre"))
+        self.randomizer.consoleList.itemClicked.connect(self.updateStatusbar)
+        self.randomizer.genreList.itemClicked.connect(self.updateStatusbar)
+        self.randomizer.genreMatchExclusiveCB.stateChanged.connect(self.updateStatusbar)
+        self.randomizer.btnAll.clicked.connect(self.updateStatusbar)
+        self.randomizer.btnNone.clicked.connect(self.updateStatusbar)
+        return self.randomizer.widget
+
+    def _updateOverview(self, table: Table):
+        # An overview that hasn't been built yet reads the counts when it is
+        if self.overview is not None:
+            self.overview.updateData(table)
+
+    def _facetChanged(self, facet: str):
+        # A platform, region, genre or year was added to or gone from the collection
+        self._updateFilterDock([facet])
+        if facet in ("platform", "genre") and self.randomizer is not None:
+            self.randomizer.updateLists(self.facets.values("platform"), self.facets.values("genre"))
+
+    def _updateFilterDock(self, facets: list):
+        # The filter lists have the values of the items the tables show
+        updates = {"platform": self.filterDock.updatePlatforms, "region": self.filterDock.updateRegions,
+                   "genre": self.filterDock.updateGenres, "year": self.filterDock.updateYears}
+        for facet in facets:
+            updates[facet](self.facets.values(facet, ownedOnly=self.gamesTableView.hideNotOwned))
+
     def about(self):
         aboutMsg = QMessageBox()
         aboutMsg.setIcon(QMessageBox.Information)
@@ -194,7 +265,7 @@ class MainWindow(QMainWindow):
 
         # Loop until user enters valid data
         while True:
-            self.addWindow = InputWindow(self.allPlatforms)
+            self.addWindow = InputWindow(self.facets.values("platform", ownedOnly=False))
             if self.addWindow.exec_() == QDialog.Accepted:
                 data = self.addWindow.returnData()
 
@@ -206,32 +277,15 @@ class MainWindow(QMainWindow):
                     msgBox.exec_()
                     continue
 
-                # Update Platform, Region, Genre, and Year in filter dock if necessary
-                if data["platform"] not in self.allPlatforms:
-                    self.allPlatforms.add(data["platform"])
-                    self.filterDock.updatePlatforms(sorted(self.allPlatforms, key=str.lower))
-                if data["region"] not in self.allRegions:
-                    self.allRegions.add(data["region"])
-                    self.filterDock.updateRegions(sorted(self.allRegions, key=str.lower))
-                if data["genre"] not in self.allGenres:
-                    self.allGenres.add(data["genre"])
-                    self.filterDock.updateGenres(sorted(self.allGenres, key=str.lower))
-                if data["year"] not in self.allYears:
-                    self.allYears.add(data["year"])
-                    self.filterDock.updateYears(sorted(self.allYears, key=str.lower))
-
                 if "game" in data.keys():
                     self.gamesTableView.addData(data)
-                    self.overview.updateData(self.gamesTableView)
-                    self.randomizer.updateLists(self.gamesTableView.ownedItems(),
-                                                sorted(self.allPlatforms, key=str.lower),
-                                                sorted(self.allGenres, key=str.lower))
+                    self._updateOverview(self.gamesTableView)
                 elif "console" in data.keys():
                     self.consolesTableView.addData(data)
-                    self.overview.updateData(self.consolesTableView)
+                    self._updateOverview(self.consolesTableView)
                 elif "accessory" in data.keys():
                     self.accessoriesTableView.addData(data)
-                    self.overview.updateData(self.accessoriesTableView)
+                    self._updateOverview(self.accessoriesTableView)
                 self.search()
             else:
                 break
@@ -254,11 +308,7 @@ class MainWindow(QMainWindow):
                 for index in indexes:
                     rows.append(index.row())
                 self.tableViewList[currentTab-1].deleteData(rows)
-                self.overview.updateData(self.tableViewList[currentTab-1])
-                if currentTab == 1:
-                    self.randomizer.updateLists(self.gamesTableView.ownedItems(),
-                                                sorted(self.allPlatforms, key=str.lower),
-                                                sorted(self.allGenres, key=str.lower))
+                self._updateOverview(self.tableViewList[currentTab-1])
                 self.search()
 
     def deleteNotOwned(self):
@@ -283,38 +333,45 @@ class MainWindow(QMainWindow):
 
     def fetchInfo(self):
         """
-        Fetches info for all games from MobyGames. Sleeps for 5 seconds
-        between game so we don't annoy their servers.
-        :return:
+        Fetches info, prices and missing covers for all owned games from MobyGames and
+        PriceCharting in the background. Each site's requests are rate limited so we
+        don't annoy their servers. Games fetched recently are skipped.
         """
+        if self.bulkFetcher.isRunning():
+            return
+
         msgBox = QMessageBox()
         msgBox.setWindowTitle("Fetch info for all games")
         msgBox.setText("This will take a long time. Are you sure?")
+        msgBox.setInformativeText("You can keep using the program while it runs.")
         msgBox.setIcon(QMessageBox.Warning)
         msgBox.setStandardButtons(QMessageBox.Ok | QMessageBox.Cancel)
         msgBox.setDefaultButton(QMessageBox.Cancel)
         ok = msgBox.exec_()
 
         if ok == QMessageBox.Ok:
-            games = self.gamesTableView.ownedItems()
-            for game in games:
-                info = getMobyRelease(game["name"], game["platform"], game["region"])
-                price = getPriceData(game["name"], game["platform"], game["region"])
-                paidPrice = game["price"].split(",")[0]
-                info["price"] = ",".join((paidPrice, price["loose"], price["cib"], price["new"]))
-                info["id"] = game["id"]
-                self.gamesTableView.updateData(info)
-
-                if "image" in info.keys() and info["image"] != "":
-                    coverDir = path.join("data", "images", "covers")
-                    id = str(game["id"]) + ".jpg"
-                    imageData = requests.get(info["image"]).content
-
-                    if not path.exists(path.join(coverDir, id)):
-                        with open(path.join(coverDir, id), "wb") as f:
-                            f.write(imageData)
-
-                sleep(5)  # Be nice
+            self.bulkFetcher.start()
+
+    def _resumeFetch(self):
+        if self.bulkFetcher.resume():
+            self.statusBar().showMessage("Carrying on with fetching info...")
+
+    def _fetchProgress(self, done: int, total: int, secondsLeft: float):
+        self.statusProgressBar.setVisible(True)
+        self.cancelFetchBtn.setVisible(True)
+        self.statusProgressBar.setRange(0, total)
+        self.statusProgressBar.setValue(done)
+        self.statusBar().showMessage(f"Fetching info... {done}/{total}, about {durationText(secondsLeft)} left")
+
+    def _fetchFinished(self, done: int, total: int, cancelled: bool):
+        self.statusProgressBar.setVisible(False)
+        self.cancelFetchBtn.setVisible(False)
+        if cancelled:
+            self.statusBar().showMessage("Stopped fetching info.", 10000)
+        elif total == 0:
+            self.statusBar().showMessage("All games were fetched recently, nothing to fetch.", 10000)
+        else:
+            self.statusBar().showMessage("Fetched info for all games.", 10000)
 
     def importToDatabase(self):
         """
@@ -324,19 +381,8 @@ class MainWindow(QMainWindow):
         """
         self.importWindow = ImportWindow()
         if self.importWindow.exec_() == QDialog.Accepted:
-            data, platforms, regions = self.importWindow.returnData()
-            self.statusProgressBar.setVisible(True)
-            self.gamesTableView.addData(data)
-            self.statusProgressBar.setVisible(False)
-
-            for platform in platforms:
-                if platform not in self.allPlatforms:
-                    self.allPlatforms.add(platform)
-                    self.filterDock.updatePlatforms(sorted(self.allPlatforms, key=str.lower))
-            for region in regions:
-                if region not in self.allRegions:
-                    self.allRegions.add(region)
-                    self.filterDock.updateRegions(sorted(self.allRegions, key=str.lower))
+            templates = self.importWindow.returnData()
+            self.gamesTableView.importTemplates(templates)
             self.search()
 
     def importSteamLibrary(self):
@@ -344,6 +390,8 @@ class MainWindow(QMainWindow):
         if ok and not (apiKey.isspace() or apiKey == ""):
             steamID, ok = QInputDialog.getText(self, "Import Steam Library", "Enter Steam User ID:")
             if ok and not (steamID.isspace() or steamID == ""):
+                from utilities.steamlibrary import getSteamLibrary  # Imports the Steam API, which is slow
+
                 try:
                     games = getSteamLibrary(apiKey, steamID)
                 except (PermissionError, ValueError) as e:
@@ -351,26 +399,15 @@ class MainWindow(QMainWindow):
                     msgBox.setInformativeText(str(e))
                     msgBox.exec_()
                 else:
-                    if "Steam" not in self.allPlatforms:
-                        self.allPlatforms.add("Steam")
-                        self.allRegions.add("Steam")
-                        self.filterDock.updatePlatforms(sorted(self.allPlatforms, key=str.lower))
-                        self.filterDock.updateRegions(sorted(self.allRegions, key=str.lower))
-                        self.gamesTableView.addData(games)
+                    if self.facets.count("platform", "Steam", ownedOnly=False) == 0:
+                        self._addItems(self.gamesTableView, games)
                     else:  # Only add games not already in collection
-                        existingGames = []
-                        query = QSqlQuery()
-                        query.exec_("SELECT Name from games WHERE Region='Steam'")
-                        while query.next():
-                            existingGames.append(query.value(0))
-
-                        for game in games:
-                            if game["name"] not in existingGames:
-                                self.gamesTableView.addData(game)
-                    self.overview.updateData(self.gamesTableView)
-                    self.randomizer.updateLists(self.gamesTableView.ownedItems(),
-                                                sorted(self.allPlatforms, key=str.lower),
-                                                sorted(self.allGenres, key=str.lower))
+                        existingGames = {row[0] for row in fetchAll("SELECT Name FROM games WHERE Region=?",
+                                                                    ("Steam",))}
+
+                        self._addItems(self.gamesTableView,
+                                       [game for game in games if game["name"] not in existingGames])
+                    self._updateOverview(self.gamesTableView)
                     self.search()
 
     def exportToCSV(self):
@@ -494,10 +531,14 @@ class MainWindow(QMainWindow):
         valAct.setToolTip("Rough estimate of the total value of collection")
         valAct.triggered.connect(self.totalValue)
 
+        notFoundAct = QAction("Titles not found...", self)
+        notFoundAct.setToolTip("Lists the games MobyGames and Pricecharting didn't have")
+        notFoundAct.triggered.connect(self.showNotFound)
+
         act = {"add": addAct, "del": delAct, "det": detAct, "export": expAct,
                "import": impAct, "steam": stmAct, "owned": ownAct,
                "delnotowned": delNotOwned, "about": aboutAct, "exit": exitAct,
-               "info": infoAct, "fetch": fetchAct, "value": valAct}
+               "info": infoAct, "fetch": fetchAct, "value": valAct, "notfound": notFoundAct}
 
         return act.get(action)
 
@@ -542,14 +583,21 @@ class MainWindow(QMainWindow):
             self.filterBtn.setVisible(True)
             self.searchBtn.setVisible(True)
             self.filterDock.setItemType(currentTab)
-            itemCount = self.tableViewList[currentTab - 1].filterTable(searchText, self.filterDock.getSelections())
-
-            if searchText != "" or len(self.filterDock.getSelections()) > 0:
-                self.statusBar().showMessage("Found {} {}.".format(itemCount,
-                                                                   self.tableViewList[currentTab-1].model.tableName()))
+            self.searchTimer.stop()
+
+            table = self.tableViewList[currentTab - 1]
+            selections = self.filterDock.getSelections()
+            if searchText != "" or len(selections) > 0:
+                where, params, sql, sqlParams = table.searchQuery(searchText, selections)
+                fallback = table.filterCondition(searchText, selections, indexed=False)
+                self._searchTable = (table, where, params, (sql, sqlParams), fallback if fallback[0] != where else None)
+                self.searchWorker.search(sql, sqlParams)
             else:
+                self.searchWorker.cancel()
+                table.filterTable(searchText, selections)
                 self.updateStatusbar()
         else:
+            self.searchWorker.cancel()
             self.searchLabel.setVisible(False)
             self.searchBox.setVisible(False)
             self.filterBtn.setVisible(False)
@@ -557,34 +605,99 @@ class MainWindow(QMainWindow):
             if self.filterDock.isVisible():
                 self.filterDock.toggleVisibility()
 
+    def _showSearchResult(self, token: int, ids: list):
+        # Only the latest search's results are shown, older ones can still arrive after a new search started
+        if token != self.searchWorker.latestToken or self._searchTable is None:
+            return
+
+        table, where, params, idQuery, fallback = self._searchTable
+        table.model.setFilter(where, params, ids=ids, idQuery=idQuery)
+        self.statusBar().showMessage("Found {} {}.".format(len(ids), table.model.tableName()))
+
+    def _searchFailed(self, token: int):
+        # The results of an older search aren't left showing. The search is tried again without
+        # the full-text index, and if it's failed without it as well, nothing is shown.
+        if token != self.searchWorker.latestToken or self._searchTable is None:
+            return
+
+        table, where, params, idQuery, fallback = self._searchTable
+        if fallback is None:
+            self._searchTable = None
+            table.model.setFilter("0", count=0)
+            self.statusBar().showMessage("The search failed.")
+            return
+
+        where, params = fallback
+        sql = table.model.idQuery(where)
+        self._searchTable = (table, where, params, (sql, params), None)
+        self.searchWorker.search(sql, params)
+        self.statusBar().showMessage("The search failed, searching again without the search index...")
+
     def toggleOwnedFilter(self):
         for table in self.tableViewList:
             table.setHideNotOwned(False) if table.hideNotOwned\
                 else table.setHideNotOwned(True)
-        currentTab = self.tab.currentIndex()
-        if 0 < currentTab < 4:
-            self.tableViewList[currentTab-1].filterTable(self.searchBox.text(), self.filterDock.getSelections())
-        self.search()
+        self._updateFilterDock(facetNames)
+        self.searchTimer.start()
 
     def totalValue(self):
-        value = 0.0
-        items = []
-        for table in self.tableViewList:
-            items.extend(table.ownedItems())
+        tables = [table.model.tableName() for table in self.tableViewList]
+        values = collectionValue(tables, self.gamesTableView.model.database())
+        if len(values) == 0:
+            values = [("USD", 0, 0, 0, 0)]
 
-        for item in items:
-            if item["item"] == "Yes" and item["box"] == "Yes" and item["manual"] == "Yes":
-                price = item["price"].split(",")[2]
-            else:
-                price = item["price"].split(",")[1]
+        info = ""
+        for currency, value, cibValue, looseValue, paid in values:
+            info += f"<h2>{formatCents(value, currency)}</h2>" \
+                    f"CIB: {formatCents(cibValue, currency)}, loose: {formatCents(looseValue, currency)}, " \
+                    f"paid: {formatCents(paid, currency)}<br>"
 
-            if price == "N/A":
-                value += 0
-                continue
-            value += float(price.lstrip("$"))
+        platforms = platformValues(tables, self.gamesTableView.model.database())[:5]
+        if len(platforms) > 0:
+            info += "<br>Most valuable platforms:<br>" + \
+                    "<br>".join(f"{platform}: {formatCents(value, currency)}" for platform, currency, value in platforms)
 
-        displayMsgBox("Collection value", "Rough estimate of collection's value.",
-                      f"<h2>${str(value)}</h2>", "information")
+        displayMsgBox("Collection value", "Rough estimate of collection's value.", info, "information")
+
+    def showNotFound(self):
+        """
+        Lists the titles that weren't found when fetching info. Choosing one searches
+        the games for it, so its name can be fixed.
+        """
+        notFoundWindow = NotFoundWindow(self.gamesTableView.model.database())
+        if notFoundWindow.exec_() == QDialog.Accepted:
+            self.tab.setCurrentIndex(self.tableViewList.index(self.gamesTableView) + 1)
+            self.searchBox.setText(notFoundWindow.returnData())
+            self.search()
+
+    def _addItems(self, table: Table, items: list):
+        # Adds items to a table with the progress in the status bar. A bulk fetch uses the same
+        # progress bar, so it's put back the way it was when the items are in, or adding them failed.
+        bar = self.statusProgressBar
+        shown, minimum, maximum, value = not bar.isHidden(), bar.minimum(), bar.maximum(), bar.value()
+        self.updateProgress(0, len(items))
+        bar.setVisible(True)
+        try:
+            table.addData(items)
+        finally:
+            bar.setRange(minimum, maximum)
+            bar.setValue(value)
+            bar.setVisible(shown)
+            self.statusBar().clearMessage()
+
+    def updateProgress(self, done: int, total: int):
+        """
+        Shows the progress of a long running job in the status bar
+        :param done: How much is done
+        :param total: How much there is to do in total
+        """
+        self.statusProgressBar.setRange(0, total)
+        self.statusProgressBar.setValue(done)
+        self.statusBar().showMessage(f"Adding items... {done}/{total}")
+        # Jobs run on the GUI thread, so the status bar is repainted right away. Running the event loop
+        # instead would also run timers and queued signals, which read and write the database while
+        # the job is in the middle of a transaction.
+        self.statusBar().repaint()
 
     def updateStatusbar(self):
         currentTab = self.tab.currentIndex()
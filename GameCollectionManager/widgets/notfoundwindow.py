@@ -0,0 +1,104 @@
+from datetime import date
+
+from PySide2.QtWidgets import QDialog, QLabel, QHBoxLayout, QVBoxLayout, QDesktopWidget, \
+    QPushButton, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView
+
+from utilities import notfound
+
+
+class NotFoundWindow(QDialog):
+    """
+    Lists the titles the scrapers couldn't find, so their names can be fixed,
+    or they can be looked for again
+    """
+
+    def __init__(self, db=None):
+        super(NotFoundWindow, self).__init__()
+
+        self.setContentsMargins(5, 5, 5, 5)
+
+        self._db = db
+        self._misses = notfound.misses(db)
+        self._name = ""
+
+        self._lblInfo = QLabel("These titles weren't found, and aren't looked for again until the date shown.\n"
+                               "Find a game to fix its name, or try a title again right away.")
+
+        self._missTable = QTableWidget(len(self._misses), 6)
+        self._missTable.setHorizontalHeaderLabels(["Site", "Title", "Platform", "Region", "Reason", "Until"])
+        self._missTable.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._missTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self._missTable.verticalHeader().setVisible(False)
+        for row, miss in enumerate(self._misses):
+            values = (notfound.sources.get(miss.source, miss.source), miss.name, miss.platform, miss.region,
+                      notfound.reasons.get(miss.reason, (miss.reason,))[0],
+                      date.fromtimestamp(miss.expires).isoformat())
+            for column, value in enumerate(values):
+                self._missTable.setItem(row, column, QTableWidgetItem(value))
+        self._missTable.resizeColumnsToContents()
+        self._missTable.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self._missTable.doubleClicked.connect(self._find)
+        self._missTable.itemSelectionChanged.connect(self._selectionChanged)
+
+        self._btnFind = QPushButton("Find in collection")
+        self._btnFind.setToolTip("Searches the games for the title, so its name can be fixed")
+        self._btnFind.clicked.connect(self._find)
+        self._btnRetry = QPushButton("Try again")
+        self._btnRetry.setToolTip("Looks for the selected titles again the next time they're fetched")
+        self._btnRetry.clicked.connect(self._retry)
+        self._btnClose = QPushButton("Close")
+        self._btnClose.clicked.connect(self.close)
+        self._selectionChanged()
+
+        self._hboxButtons = QHBoxLayout()
+        self._hboxButtons.addWidget(self._btnFind, 0)
+        self._hboxButtons.addWidget(self._btnRetry, 0)
+        self._hboxButtons.addStretch(5)
+        self._hboxButtons.addWidget(self._btnClose, 0)
+
+        self._vbox = QVBoxLayout()
+        self._vbox.addWidget(self._lblInfo, 0)
+        self._vbox.addWidget(self._missTable, 1)
+        self._vbox.addLayout(self._hboxButtons, 0)
+
+        self.setLayout(self._vbox)
+        self.setWindowTitle(f"Titles not found ({len(self._misses)})")
+        self.resize(800, 500)
+        self._center()
+
+    def _center(self):
+        """Centers window on screen"""
+
+        qr = self.frameGeometry()
+        cp = QDesktopWidget().availableGeometry().center()
+        qr.moveCenter(cp)
+        self.move(qr.topLeft())
+
+    def _selectedRows(self) -> list:
+        return sorted({index.row() for index in self._missTable.selectionModel().selectedRows()})
+
+    def _selectionChanged(self):
+        rows = self._selectedRows()
+        self._btnFind.setEnabled(len(rows) == 1)
+        self._btnRetry.setEnabled(len(rows) > 0)
+
+    def _find(self):
+        rows = self._selectedRows()
+        if len(rows) != 1:
+            return
+        self._name = self._misses[rows[0]].name
+        self.accept()
+
+    def _retry(self):
+        for row in reversed(self._selectedRows()):
+            if notfound.forget(self._misses[row], self._db):
+                del self._misses[row]
+                self._missTable.removeRow(row)
+        self.setWindowTitle(f"Titles not found ({len(self._misses)})")
+
+    def returnData(self) -> str:
+        """
+        Gets the title to search the games for
+        :return: (str) The title, empty if none was chosen
+        """
+        return self._name
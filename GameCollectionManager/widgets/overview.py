@@ -159,32 +159,36 @@ class Overview(QWidget):
         self._platforms = sorted(tempPlatforms, key=str.lower)
         for table in self._tables:
             self._totalItems += table.ownedCount
+            counts = table.platformCounts()
             for platform in self._platforms:
                 if table.model.tableName() == "games":
-                    self._gamesData[platform] = table.itemsInPlatform(platform)
+                    self._gamesData[platform] = counts.get(platform, 0)
                 elif table.model.tableName() == "consoles":
-                    self._consoleData[platform] = table.itemsInPlatform(platform)
+                    self._consoleData[platform] = counts.get(platform, 0)
                 elif table.model.tableName() == "accessories":
-                    self._accessoryData[platform] = table.itemsInPlatform(platform)
+                    self._accessoryData[platform] = counts.get(platform, 0)
 
     def updateData(self, table):
         if table.model.tableName() == "games":
             self._gamesData.clear()
             self._lblTables[0].setText(f"Number of games: {table.ownedCount}")
-            for platform in sorted(table.platforms(), key=str.lower):
-                self._gamesData[platform] = table.itemsInPlatform(platform)
+            counts = table.platformCounts()
+            for platform in sorted(counts.keys(), key=str.lower):
+                self._gamesData[platform] = counts[platform]
             self._gd.updateFigure(self._gamesData)
         elif table.model.tableName() == "consoles":
             self._consoleData.clear()
             self._lblTables[1].setText(f"Number of consoles: {table.ownedCount}")
-            for platform in sorted(table.platforms(), key=str.lower):
-                self._consoleData[platform] = table.itemsInPlatform(platform)
+            counts = table.platformCounts()
+            for platform in sorted(counts.keys(), key=str.lower):
+                self._consoleData[platform] = counts[platform]
             self._cd.updateFigure(self._consoleData)
         elif table.model.tableName() == "accessories":
             self._accessoryData.clear()
             self._lblTables[2].setText(f"Number of accessories: {table.ownedCount}")
-            for platform in sorted(table.platforms(), key=str.lower):
-                self._accessoryData[platform] = table.itemsInPlatform(platform)
+            counts = table.platformCounts()
+            for platform in sorted(counts.keys(), key=str.lower):
+                self._accessoryData[platform] = counts[platform]
             self._ad.updateFigure(self._accessoryData)
 
         self._totalItems = 0
@@ -1,27 +1,33 @@
 from random import randint
-from os import path
 
-from PySide2.QtCore import Qt
+from PySide2.QtCore import QSize, Qt
 from PySide2.QtGui import QFont, QPixmap
+from PySide2.QtSql import QSqlDatabase
 from PySide2.QtWidgets import QWidget, QLabel, QListWidget, QAbstractItemView, QPushButton, QHBoxLayout, QVBoxLayout, \
     QGridLayout, QCheckBox
 
+from utilities.covercache import CoverCache
+from utilities.genres import matchingGames
+
 
 class Randomizer(QWidget):
     """A game randomizer for selecting a random game to play
        from the user's collection. User can select which
        platforms to choose from.
-       gamesData: Raw table data in list of dictionaries"""
+       db: Database connection to find the owned games in
+       covers: Cache to get the games' covers from"""
 
-    def __init__(self, gamesData: list, platformsData: list, genresData: list):
+    def __init__(self, db: QSqlDatabase, covers: CoverCache, platformsData: list, genresData: list):
         super(Randomizer, self).__init__()
 
         self._consoleItems = platformsData
         self._genreItems = genresData
-        self._gamesData = gamesData
+        self._db = db
+        self._covers = covers
+        self._covers.loaded.connect(self._coverLoaded)
+        self._coverId = None  # ID of the game whose cover is shown
         self._games = []  # For holding the games to randomize
         self._gameCount = 0
-        self._coverdir = path.join("data", "images", "covers")
 
         self.consoleLabel = QLabel("Platforms")
         self.consoleList = QListWidget()
@@ -70,10 +76,7 @@ class Randomizer(QWidget):
         self._cover = QLabel()
         self._cover.setVisible(False)
         self._cover.setAlignment(Qt.AlignCenter)
-        p = QPixmap(path.join(self._coverdir, "none.png"))
-        w = self._cover.width()
-        h = self._cover.height()
-        self._cover.setPixmap(p.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self._cover.setPixmap(self._covers.placeholder(self._cover.size()))
 
         self._hboxButtons = QHBoxLayout()
         self._vboxLists = QVBoxLayout()
@@ -110,6 +113,17 @@ class Randomizer(QWidget):
         self.widget = QWidget()
         self.widget.setLayout(self._grid)
 
+    def _coverLoaded(self, gameId: int, size: QSize, pixmap: QPixmap):
+        if gameId != self._coverId:
+            return
+        if not pixmap.isNull() and size != self._cover.size():
+            # The label was resized after the cover was asked for. Show this one scaled until it's decoded at this size.
+            resized = self._covers.cover(gameId, self._cover.size())
+            pixmap = resized if resized is not None else \
+                pixmap.scaled(self._cover.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self._cover.setVisible(not pixmap.isNull())
+        self._cover.setPixmap(pixmap)
+
     def _getSelectedItems(self) -> tuple:
         return [x.text() for x in self.consoleList.selectedItems()], [x.text() for x in self.genreList.selectedItems()]
 
@@ -121,19 +135,11 @@ class Randomizer(QWidget):
             self._lblPlay.setText("You will play:")
             self._lblTitle.setText(f"{self._games[choice]['name']}" if len(platforms) == 1 else
                                    f"{self._games[choice]['name']} [{self._games[choice]['platform']}]")
-            # Cover image
-            cover = str(self._games[choice]['id']) + ".jpg"
-            if path.exists(path.join(self._coverdir, cover)):
-                # Update cover image if the game has one
-                pixmap = path.join(self._coverdir, cover)
-                self._cover.setVisible(True)
-            else:
-                pixmap = path.join(self._coverdir, "none.png")
-                self._cover.setVisible(False)
-            p = QPixmap(pixmap)
-            w = self._cover.width()
-            h = self._cover.height()
-            self._cover.setPixmap(p.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            # Cover image, hidden if the game doesn't have one. Until it's decoded, the placeholder is shown.
+            self._coverId = self._games[choice]['id']
+            pixmap = self._covers.cover(self._coverId, self._cover.size())
+            self._cover.setVisible(pixmap is None or not pixmap.isNull())
+            self._cover.setPixmap(pixmap if pixmap is not None else self._covers.placeholder(self._cover.size()))
         elif len(self._games) == 0 and (len(platforms) > 0 or len(genres) > 0):
             self._lblPlay.setText("")
             self._lblTitle.setText("No games found with those criteria.")
@@ -149,54 +155,13 @@ class Randomizer(QWidget):
         self._games = []
 
         if len(platforms) > 0 or len(genres) > 0:
-            for row in self._gamesData:
-                if len(platforms) > 0 and len(genres) > 0:
-                    if row["platform"] in platforms:
-                        if self.genreMatchExclusiveCB.isChecked():
-                            count = 0
-                            for genre in row["genre"].split(", "):
-                                if genre in genres:
-                                    count += 1
-                                else:  # Not exclusive
-                                    count = 0
-                                    break
-                            if count == len(genres):
-                                self._gameCount += 1
-                                self._games.append(row)
-                        else:
-                            for genre in row["genre"].split(", "):
-                                if genre in genres:
-                                    self._gameCount += 1
-                                    self._games.append(row)
-                                    break  # We only need to match with one genre
-                elif len(platforms) > 0 and len(genres) == 0:
-                    if row["platform"] in platforms:
-                        self._gameCount += 1
-                        self._games.append(row)
-                elif len(platforms) == 0 and len(genres) > 0:
-                    if self.genreMatchExclusiveCB.isChecked():
-                        count = 0
-                        for genre in row["genre"].split(", "):
-                            if genre in genres:
-                                count += 1
-                            else:  # Not exclusive
-                                count = 0
-                                break
-                        if count == len(genres):
-                            self._gameCount += 1
-                            self._games.append(row)
-                    else:
-                        for genre in row["genre"].split(", "):
-                            if genre in genres:
-                                self._gameCount += 1
-                                self._games.append(row)
-                                break  # We only need to match with one genre
+            self._games = matchingGames(platforms, genres, self.genreMatchExclusiveCB.isChecked(), self._db)
+            self._gameCount = len(self._games)
 
     def gameCount(self) -> int:
         return self._gameCount
 
-    def updateLists(self, gamesData: list, platformsData: list, genresData: list):
-        self._gamesData = gamesData
+    def updateLists(self, platformsData: list, genresData: list):
         self._consoleItems = platformsData
         self._genreItems = genresData
         self.consoleList.clear()
@@ -1,24 +1,24 @@
 #!/usr/bin/env python
-import requests
-from os import path
-from PySide2.QtCore import Signal
+from PySide2.QtCore import QSize, Signal
 from PySide2.QtGui import Qt, QPixmap, QFont
 from PySide2.QtWidgets import QDockWidget, QLabel, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QFrame, QLineEdit, \
     QTextEdit, QStackedLayout, QCheckBox, QComboBox, QTabWidget
 
-from utilities.fetchinfo import getMobyRelease
-from utilities.fetchprice import getPriceData
+from utilities.covercache import CoverCache
+from utilities.coverstore import hasCover, saveCover
 from utilities.log import logger
 
 
 class SidePanel(QDockWidget):
     saved = Signal(dict)
 
-    def __init__(self):
+    def __init__(self, covers: CoverCache):
         super(SidePanel, self).__init__()
 
         # Internal variables
-        self._coverdir = path.join("data", "images", "covers")
+        self._covers = covers
+        self._covers.loaded.connect(self._coverLoaded)
+        self._coverId = None  # ID of the game whose cover is shown
         self._id = 0
         self._imagedata = ""
         size = [220, 16]  # Width, Height (for QLineEdits/QTextEdits)
@@ -364,6 +364,19 @@ class SidePanel(QDockWidget):
         self.tab.addTab(self.priceWidget, "Price info")
         self.setWidget(self.tab)
 
+    def _coverLoaded(self, gameId: int, size: QSize, pixmap: QPixmap):
+        if gameId != self._coverId or self._imagedata != "":
+            return
+        if pixmap.isNull():
+            self.cover.setPixmap(self._covers.placeholder(self.cover.size()))
+        elif size != self.cover.size():
+            # The label was resized after the cover was asked for. Show this one scaled until it's decoded at this size.
+            resized = self._covers.cover(gameId, self.cover.size())
+            self.cover.setPixmap(resized if resized is not None else
+                                 pixmap.scaled(self.cover.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        else:
+            self.cover.setPixmap(pixmap)
+
     def _editDetails(self):
         if self.editDetailsButton.isChecked():
             self._updateWidgetData(1)
@@ -376,9 +389,13 @@ class SidePanel(QDockWidget):
         name = self.nameDataLabel.text()
         platform = self.platformDataLabel.text()
         region = self.regionDataLabel.text()
+        # The scrapers' imports are slow, so only when used
+        from utilities import httpclient
+        from utilities.fetchinfo import getMobyRelease
+
         info = getMobyRelease(name, platform, region)
         if "image" in info.keys() and info["image"] != "":
-            self._imagedata = requests.get(info["image"]).content
+            self._imagedata = httpclient.get(info["image"]).content
             pixmap = QPixmap()
             pixmap.loadFromData(self._imagedata)
             w = self.cover.width()
@@ -405,6 +422,8 @@ class SidePanel(QDockWidget):
         name = self.nameDataLabel.text()
         platform = self.platformDataLabel.text()
         region = self.regionDataLabel.text()
+        from utilities.fetchprice import getPriceData  # The scraper's imports are slow, so only when used
+
         prices = getPriceData(name, platform, region)
 
         self.loosePriceDataLabel.setText(prices["loose"])
@@ -434,10 +453,10 @@ class SidePanel(QDockWidget):
                 "price": ",".join((paidPrice, self.loosePriceDataLabel.text(),
                                    self.cibPriceDataLabel.text(), self.newPriceDataLabel.text()))}
 
-        # Save imagedata to file
-        if self._imagedata != "" and not path.exists(path.join(self._coverdir, str(self._id) + ".jpg")):
-            with open(path.join(self._coverdir, str(self._id) + ".jpg"), "wb") as f:
-                f.write(self._imagedata)
+        # Save imagedata to the cover store
+        if self._imagedata != "" and not hasCover(self._id):
+            saveCover(self._id, self._imagedata)
+            self._covers.forget(self._id)
 
         self.saved.emit(info)
 
@@ -486,13 +505,11 @@ class SidePanel(QDockWidget):
 
         self._id = info["id"]
         self._imagedata = ""
-        pixmap = path.join(self._coverdir, "none.png")
-        if path.exists(path.join(self._coverdir, str(self._id) + ".jpg")) and info["table"] == "games":
-            pixmap = path.join(self._coverdir, str(self._id) + ".jpg")
-        p = QPixmap(pixmap)
-        w = self.cover.width()
-        h = self.cover.height()
-        self.cover.setPixmap(p.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        # Only games have covers. Until it's decoded, the placeholder is shown.
+        self._coverId = self._id if info["table"] == "games" else None
+        pixmap = self._covers.cover(self._id, self.cover.size()) if self._coverId is not None else None
+        self.cover.setPixmap(pixmap if pixmap is not None and not pixmap.isNull()
+                             else self._covers.placeholder(self.cover.size()))
 
         # Price data is stored in form $x,$x,$x,$x [paid, loose, cib, new]
         paidPrice, loosePrice, cibPrice, newPrice = info["price"].split(",")
@@ -1,68 +1,62 @@
-from os import path, remove
+import json
+from collections import OrderedDict
 
-from PySide2.QtCore import Qt, Signal, QModelIndex, QItemSelectionModel
+from PySide2.QtCore import Qt, Signal, QAbstractTableModel, QModelIndex, QItemSelectionModel, QTimer
 from PySide2.QtGui import QKeyEvent, QMouseEvent, QFont, QColor
-from PySide2.QtSql import QSqlTableModel, QSqlQuery
-from PySide2.QtWidgets import QAbstractItemView, QTableView
+from PySide2.QtSql import QSqlDatabase, QSqlQuery
+from PySide2.QtWidgets import QAbstractItemView, QHeaderView, QTableView
 
-from utilities.fetchinfo import getMobyInfo, printInfo
+from utilities.bulkdelete import deleteItems, suspendTriggers
+from utilities.database import beginWrite
+from utilities.facets import FacetCatalog
+from utilities.genres import linkGenres, linkNewGames
 from utilities.log import logger
+from utilities.migrations import bulkInsertTriggers
+from utilities.prices import priceColumns, priceValues
+from utilities.queries import execQuery, fetchAll, fetchValue, selectionFilter
+from utilities.search import matchExpression, searchCondition
+from utilities.templates import importTemplates
+
+# Columns shown as checkboxes, bold, and centered
+_checkColumns = ("Game", "Console", "Accessory", "Box", "Manual")
+_boldColumns = ("Region", "Country") + _checkColumns
+_centeredColumns = ("Region", "Country")
+
+# Text colors for regions and for the Yes/No of the checkbox columns
+_regionColors = {"PAL": QColor(255, 255, 0), "PAL A": QColor(255, 255, 0), "PAL B": QColor(255, 255, 0),
+                 "Europe": QColor(255, 255, 0),
+                 "NTSC (JP)": QColor(255, 0, 0), "Japan": QColor(255, 0, 0),
+                 "NTSC (NA)": QColor(0, 0, 255), "North America": QColor(0, 0, 255)}
+_checkColors = {"Yes": QColor(0, 255, 0), "No": QColor(255, 0, 0)}
+_checkStates = {"Yes": Qt.Checked, "No": Qt.Unchecked}
+
+# Columns of the item tables, in table order
+_tableColumns = {"games": ["ID", "Platform", "Name", "Region", "Code", "Game", "Box", "Manual", "Year", "Genre",
+                           "Comment", "Publisher", "Developer", "Platforms", "Price"],
+                 "consoles": ["ID", "Platform", "Name", "Region", "Country", "Serial number", "Console", "Box",
+                              "Manual", "Year", "Comment", "Price"],
+                 "accessories": ["ID", "Platform", "Name", "Region", "Country", "Accessory", "Box", "Manual",
+                                 "Year", "Comment", "Price"]}
 
 
 class Table(QTableView):
 
     doubleClick = Signal(dict)
 
-    def __init__(self, tableName: str, db):
+    def __init__(self, tableName: str, db, facets: FacetCatalog = None):
         super(Table, self).__init__()
 
         assert tableName in ("games", "consoles", "accessories")
 
         self.hideNotOwned = True
         self._table = tableName
+        self._facets = facets  # Told about the items written, if given
         self._itemType = "Game" if self._table == "games"\
             else "Console" if self._table == "consoles"\
             else "Accessory"
 
-        self.model = TableModel(self, db)
-        self.model.setTable(tableName)
-        self.model.setEditStrategy(QSqlTableModel.OnFieldChange)
-        self.model.fetched.connect(self.resizeRowsToContents)  # Resize rows when fetching more
-        self.model.select()
-
-        self.ownedCount = self.model.getOwnedCount()
-        self.allCount = self.model.getAllCount()
-
-        self.model.setHeaderData(0, Qt.Horizontal, "ID")
-        self.model.setHeaderData(1, Qt.Horizontal, "Platform")
-        self.model.setHeaderData(2, Qt.Horizontal, "Name")
-        self.model.setHeaderData(3, Qt.Horizontal, "Region")
-        if self._table == "games":
-            self.model.setHeaderData(4, Qt.Horizontal, "Code")
-            self.model.setHeaderData(5, Qt.Horizontal, "Game")
-            self.model.setHeaderData(6, Qt.Horizontal, "Box")
-            self.model.setHeaderData(7, Qt.Horizontal, "Manual")
-            self.model.setHeaderData(8, Qt.Horizontal, "Year")
-            self.model.setHeaderData(9, Qt.Horizontal, "Genre")
-            self.model.setHeaderData(10, Qt.Horizontal, "Comment")
-            self.model.setHeaderData(11, Qt.Horizontal, "Publisher")
-            self.model.setHeaderData(12, Qt.Horizontal, "Developer")
-            self.model.setHeaderData(13, Qt.Horizontal, "Platforms")
-        elif self._table == "consoles":
-            self.model.setHeaderData(4, Qt.Horizontal, "Country")
-            self.model.setHeaderData(5, Qt.Horizontal, "Serial number")
-            self.model.setHeaderData(6, Qt.Horizontal, "Console")
-            self.model.setHeaderData(7, Qt.Horizontal, "Box")
-            self.model.setHeaderData(8, Qt.Horizontal, "Manual")
-            self.model.setHeaderData(9, Qt.Horizontal, "Year")
-            self.model.setHeaderData(10, Qt.Horizontal, "Comment")
-        elif self._table == "accessories":
-            self.model.setHeaderData(4, Qt.Horizontal, "Country")
-            self.model.setHeaderData(5, Qt.Horizontal, "Accessory")
-            self.model.setHeaderData(6, Qt.Horizontal, "Box")
-            self.model.setHeaderData(7, Qt.Horizontal, "Manual")
-            self.model.setHeaderData(8, Qt.Horizontal, "Year")
-            self.model.setHeaderData(9, Qt.Horizontal, "Comment")
+        # The model is empty until a filter is set, so nothing is read before the table is shown
+        self.model = TableModel(tableName, _tableColumns[tableName], db, self, facets)
 
         self.setModel(self.model)
 
@@ -93,7 +87,27 @@ class Table(QTableView):
         self.setColumnHidden(14, True)
         self.setAlternatingRowColors(False)
         self.setShowGrid(True)
-        self.resizeRowsToContents()
+        # Measuring every row doesn't scale with the table size, so rows get the same height
+        # by default, and only the rows that come into view are measured to fit their text
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self._rowHeights = {}  # Item ID: measured row height
+        self._measureTimer = QTimer(self)
+        self._measureTimer.setSingleShot(True)
+        self._measureTimer.timeout.connect(self._measureVisibleRows)
+        self.model.modelReset.connect(self._measureTimer.start)
+        self.model.dataChanged.connect(self._measureTimer.start)
+        self.verticalScrollBar().valueChanged.connect(self._measureTimer.start)
+        self.verticalScrollBar().rangeChanged.connect(self._measureTimer.start)
+        self.horizontalHeader().sectionResized.connect(self._columnResized)
+
+    @property
+    def allCount(self) -> int:
+        return self.model.getAllCount()
+
+    @property
+    def ownedCount(self) -> int:
+        return self.model.getOwnedCount()
 
     def addData(self, newData):
         """
@@ -101,77 +115,100 @@ class Table(QTableView):
         :param newData: (dictionary or list of dictionaries) The data to be added
         """
 
-        db = self.model.database()
-        table = self._table
-        tableColumns = {"games": ["Platform", "Name", "Region", "Code", "Game", "Box", "Manual",
-                                  "Year", "Genre", "Comment", "Publisher", "Developer", "Platforms", "Price"],
-                        "consoles": ["Platform", "Name", "Region", "Country", "Serial number",
-                                     "Console", "Box", "Manual", "Year", "Comment", "Price"],
-                        "accessories": ["Platform", "Name", "Region", "Country", "Accessory",
-                                        "Box", "Manual", "Year", "Comment", "Price"]}
-
         if isinstance(newData, dict):  # Add single item
-            record = self.model.record()
-            record.remove(record.indexOf("ID"))
-            for i in tableColumns[table]:
-                record.setValue(i, newData[i.lower()])
-
-            if self.model.insertRecord(-1, record):
+            if self.model.insertItems([newData]) == 1:
                 logger.info(f"Added to table '{self._table}': {newData}")
-                pass
-            else:
-                db.rollback()
-
         elif isinstance(newData, list):  # Add list of items
-            for data in newData:
-                record = self.model.record()
-                record.remove(record.indexOf("ID"))
-                for i in tableColumns[table]:
-                    record.setValue(i, data[i.lower()])
-
-                if self.model.insertRecord(-1, record):
-                    logger.info(f"Added to table '{self._table}': {data}")
-                    pass
-                else:
-                    db.rollback()
+            self.model.insertItems(newData)
 
         self.filterTable("", dict())
-        self.ownedCount = self.model.getOwnedCount()
-        self.allCount = self.model.getAllCount()
+
+    def importTemplates(self, templates: list) -> int:
+        """
+        Adds every game in platform templates to the games table as not owned
+        :param templates: Names of the templates, e.g. 'Nintendo 64'
+        :return: (int) Number of games added
+        """
+        lastId = fetchValue(f"SELECT IFNULL(MAX(ID), 0) FROM {self._table}", db=self.model.database())
+        inserted = importTemplates(self.model.database(), templates)
+        if self._facets is not None and inserted > 0:
+            self._facets.update(after=self._facets.itemCounts(self._table, afterId=lastId))
+        self.filterTable("", dict())
+
+        return inserted
+
+    def _columnResized(self):
+        # Text wraps differently in a new column width, so every row has to be measured again
+        self._rowHeights.clear()
+        self._measureTimer.start()
 
     def deleteData(self, rows: list):
         """
         Deletes rows from SQL database
-        :param rows: Rows to delete
+        :param rows: Rows to delete, the same row can be in the list more than once
         """
-        coversdir = path.join("data", "images", "covers")
 
-        for row in rows:
-            image = str(self.model.index(row, 0).data()) + ".jpg"
-            if path.exists(path.join(coversdir, image)):
-                remove(path.join(coversdir, image))
-            self.model.removeRows(row, 1, parent=QModelIndex())
-            logger.info(f"Removed row {row} from table '{self._table}'.")
+        # Look up the IDs first, the rows can't be used once the model has changed
+        ids = {self.model.index(row, 0).data() for row in set(rows)}
+        self._deleteItems(ids)
 
+    def deleteNotOwned(self):
+        ids = [row[0] for row in fetchAll(f"SELECT ID FROM {self._table} WHERE owned_mask = 0",
+                                          db=self.model.database())]
+        self._deleteItems(ids)
+
+    def _deleteItems(self, ids):
+        counts = self._facets.itemCounts(self._table, ids) if self._facets is not None else None
+        if deleteItems(self.model.database(), self._table, ids) > 0 and counts is not None:
+            self._facets.update(before=counts)
+        self._forgetRowHeights(ids)  # The IDs can be used again by new items
+        self.model.refresh()
+
+    def filterCondition(self, filterText: str, selections: dict, indexed: bool = True) -> tuple:
+        """
+        Builds the SQL condition for a search
+        :param filterText: The text to filter
+        :param selections: Possible selected items from advanced search options
+        :param indexed: Search the text through the full-text index as well as with LIKE
+        :return: (tuple) SQL condition, list of values to bind
+        """
 
-        self.model.select()
-        self.ownedCount = self.model.getOwnedCount()
-        self.allCount = self.model.getAllCount()
-        self.resizeRowsToContents()
+        conditions = []
+        params = []
+
+        # The simple search looks in almost every column,
+        # with advanced search options only in the name, year and comment
+        search, searchParams = searchCondition(self._table, filterText, self._searchColumns(selections), indexed)
+        if search != "":
+            conditions.append(search)
+            params += searchParams
+        if self.hideNotOwned:
+            conditions.append(self._ownedCondition())
+        if len(selections) > 0:
+            condition, selectionParams = selectionFilter(selections, self._table)
+            conditions.append(condition)
+            params += selectionParams
+
+        return " AND ".join(conditions) if len(conditions) > 0 else "1=1", params
+
+    def searchQuery(self, filterText: str, selections: dict) -> tuple:
+        """
+        Builds the query for the IDs of the items a search finds, the best matches first
+        :param filterText: The text to filter
+        :param selections: Possible selected items from advanced search options
+        :return: (tuple) SQL condition, list of values to bind, the query, list of values to bind to it
+        """
 
-    def deleteNotOwned(self):
-        rows = []
-        query = QSqlQuery()
-        query.exec_(f"SELECT ID FROM {self._table} WHERE {self._itemType}='No' AND Box='No' AND Manual='No'")
-        while query.next():
-            rows.append(query.value(0))
+        where, params = self.filterCondition(filterText, selections)
+        match = matchExpression(filterText, self._searchColumns(selections))
+        if match == "":
+            return where, params, self.model.idQuery(where), params
 
-        for row in rows:
-            query.exec_(f"DELETE FROM {self._table} WHERE ID={row}")
-        self.model.select()
+        return where, params, self.model.idQuery(where, f"{self._table}_fts"), [match] + params
 
-        self.allCount = self.model.getAllCount()
-        self.resizeRowsToContents()
+    @staticmethod
+    def _searchColumns(selections: dict) -> list:
+        return ["Name", "Year", "Comment"] if len(selections) > 0 else None
 
     def filterTable(self, filterText: str, selections: dict):
         """
@@ -180,64 +217,35 @@ class Table(QTableView):
         :param selections: Possible selected items from advanced search options
         """
 
-        filterText = filterText.replace("'", "''")  # Escape single quote
-
         # Reset filtering to default if no search filters
         if filterText == "" and len(selections) == 0:
             if self.hideNotOwned:
-                self.model.setFilter(f"{self._itemType}='Yes' OR Box='Yes' OR Manual='Yes' "
-                                     "ORDER BY Platform ASC, Name ASC")
+                self.model.setFilter(self._ownedCondition(), count=self.ownedCount)
             else:
-                self.model.setFilter("1=1 ORDER BY Platform ASC, Name ASC")
-            self.resizeRowsToContents()
+                self.model.setFilter("1=1", count=self.allCount)
             return self.ownedCount
 
-        # Filter based on advanced search options
-        elif len(selections) > 0:
-            f = f"(Name LIKE '%{filterText}%' " \
-                f"OR Year LIKE '%{filterText}%' " \
-                f"OR Comment LIKE '%{filterText}%') "
-            if self.hideNotOwned:
-                f += f"AND ({self._itemType}='Yes' OR Box='Yes' OR Manual='Yes') "
-            for selection in selections:
-                items = [s.replace("'", "''") for s in list(selections[selection])]  # Escape single quotes
-                f += f"AND ({selection} LIKE '%{items[0]}%' "
-                if len(items) > 1:
-                    for item in items[1:]:
-                        f += f"OR {selection} LIKE '%{item}%' "
-                f += ") "
-        else:  # Regular, simple, filter. It just seaches almost every column
-            f = f"(Platform LIKE '%{filterText}%' " \
-                f"OR Name LIKE '%{filterText}%' " \
-                f"OR Region LIKE '%{filterText}%' " \
-                f"OR Comment LIKE '%{filterText}%' " \
-                f"OR Year LIKE '%{filterText}%' " \
-                f"OR Genre LIKE '%{filterText}%' "
-            if self._table == "games":
-                f += f"OR Code LIKE '%{filterText}%') "
-            elif self._table == "consoles":
-                f += f"OR Country LIKE '%{filterText}%' " \
-                     f"OR `Serial number` LIKE '%{filterText}%') "
-            elif self._table == "accessories":
-                f += f"OR Country LIKE '%{filterText}%') "
-            if self.hideNotOwned:
-                f += f"AND ({self._itemType}='Yes' OR Box='Yes' OR Manual='Yes') "
+        f, params, sql, sqlParams = self.searchQuery(filterText, selections)
 
-        f += "ORDER BY Platform ASC, Name ASC"
+        # Matches of a text search are shown best first
+        if matchExpression(filterText) != "":
+            ids = [row[0] for row in fetchAll(sql, sqlParams, self.model.database())]
+            self.model.setFilter(f, params, ids=ids, idQuery=(sql, sqlParams))
+            return len(ids)
 
         # Get number of items in the search
-        itemCount = 0
-        query = QSqlQuery()
-        query.exec_(f"SELECT ID FROM {self._table} WHERE {f}")
-        while query.next():
-            itemCount += 1
+        itemCount = fetchValue(f"SELECT COUNT(*) FROM {self._table} WHERE {f}", params,
+                               self.model.database(), default=0)
 
         # Apply filter to table
-        self.model.setFilter(f)
-        self.resizeRowsToContents()
+        self.model.setFilter(f, params, itemCount)
 
         return itemCount
 
+    def _forgetRowHeights(self, ids):
+        for itemId in ids:
+            self._rowHeights.pop(itemId, None)
+
     def itemsInPlatform(self, platform: str) -> int:
         """
         Counts how many items are in a platform
@@ -245,15 +253,8 @@ class Table(QTableView):
         :return: (int) Item count
         """
 
-        count = 0
-
-        query = QSqlQuery()
-        query.exec_(f"SELECT Name FROM {self._table} WHERE Platform='{platform}'"
-                    f"AND ({self._itemType}='Yes' OR Box='Yes' OR Manual='Yes')")
-        while query.next():
-            count += 1
-
-        return count
+        return fetchValue("SELECT Owned FROM collection_stats WHERE TableName=? AND Platform=?",
+                          (self._table, platform), self.model.database(), default=0)
 
     def keyPressEvent(self, event: QKeyEvent):
         # Custom handling for enter key to start editing
@@ -272,6 +273,28 @@ class Table(QTableView):
         else:
             super(Table, self).keyPressEvent(event)
 
+    def _measureVisibleRows(self):
+        # Gives the rows in view the height that fits their text, measuring only the items
+        # that haven't been measured before. The rows can hold other items than last time
+        # (after filtering or editing), so every visible row gets its item's height set.
+        rowCount = self.model.rowCount()
+        if rowCount == 0:
+            return
+
+        first = max(self.rowAt(0), 0)
+        last = self.rowAt(self.viewport().height() - 1)
+        last = last if last >= 0 else rowCount - 1
+        default = self.verticalHeader().defaultSectionSize()
+
+        for row in range(first, last + 1):
+            itemId = self.model.index(row, 0).data()
+            height = self._rowHeights.get(itemId)
+            if height is None:
+                height = max(default, self.sizeHintForRow(row))
+                self._rowHeights[itemId] = height
+            if self.rowHeight(row) != height:
+                self.setRowHeight(row, height)
+
     def mouseDoubleClickEvent(self, event: QMouseEvent):
         # Custom handling for double clicking so we open the side panel
         if event.button() == Qt.LeftButton:
@@ -285,85 +308,83 @@ class Table(QTableView):
         has either the item itself, the box, or the manual.
         :return: (list) List of items
         """
-        itemName = "Game" if self._table == "games" else "Console" if self._table == "consoles" else "Accessory"
         items = []
+        genre = "Genre" if self._table == "games" else "''"  # Only games have genres
 
-        query = QSqlQuery()
-        query.exec_(f"SELECT ID, Platform, Name, Region, {itemName}, Box, Manual, Year, Genre, Price "
-                    f"FROM {self._table} WHERE {self._itemType}='Yes' OR Box='Yes' OR Manual='Yes'")
-        while query.next():
-            items.append(dict(id=query.value(0), platform=query.value(1), name=query.value(2),
-                              region=query.value(3), item=query.value(4), box=query.value(5), manual=query.value(6),
-                              year=str(query.value(7)), genre=query.value(8), price=query.value(9)))
+        rows = fetchAll(f"SELECT ID, Platform, Name, Region, {self._itemType}, Box, Manual, Year, {genre}, Price "
+                        f"FROM {self._table} WHERE {self._ownedCondition()}",
+                        db=self.model.database())
+        for row in rows:
+            items.append(dict(id=row[0], platform=row[1], name=row[2], region=row[3], item=row[4], box=row[5],
+                              manual=row[6], year=str(row[7]), genre=row[8], price=row[9]))
 
         return items
 
+    @staticmethod
+    def _ownedCondition() -> str:
+        # The item, its box or its manual is owned. Written exactly like this so the
+        # partial index on the owned items can be used.
+        return "owned_mask <> 0"
+
+    def platformCounts(self) -> dict:
+        """
+        Counts how many owned items each platform in the table has.
+        :return: (dict) Platform: item count
+        """
+
+        return dict(fetchAll("SELECT Platform, Owned FROM collection_stats "
+                             "WHERE TableName=? AND Platform IS NOT NULL AND Total > 0",
+                             (self._table,), self.model.database()))
+
     def platforms(self) -> set:
         """
         Fetches the platforms that are currently in the table.
         :return: (set) Platforms in table
         """
 
-        platforms = set()
-
-        query = QSqlQuery()
-        query.exec_(f"SELECT Platform FROM {self._table}")
-        while query.next():
-            platforms.add(query.value(0))
-
-        return platforms
+        return set(self.platformCounts().keys())
 
     def rowData(self):
         rowData = {}
-        columns = {"games": ["id", "platform", "name", "region", "code", "game", "box", "manual", "year", "genre",
-                             "comment", "publisher", "developer", "platforms", "price"],
-                   "consoles": ["id", "platform", "name", "region", "country", "serial number", "console", "box",
-                                "manual", "year", "comment", "price"],
-                   "accessories": ["id", "platform", "name", "region", "country", "accessory", "box", "manual",
-                                   "year", "comment", "price"]}
+        columns = _tableColumns[self._table]
 
         rowid = self.model.index(self.currentIndex().row(), 0).data()
-        query = QSqlQuery()
-        query.exec_(f"SELECT * FROM {self._table} WHERE Id={rowid}")
-        query.first()
-        for i, col in enumerate(columns[self._table]):
-            rowData[col] = query.value(i)
+        columnList = ", ".join(f'"{column}"' for column in columns)
+        rows = fetchAll(f"SELECT {columnList} FROM {self._table} WHERE ID=?", (rowid,), self.model.database())
+        if len(rows) == 0:
+            return
+        for i, col in enumerate(columns):
+            rowData[col.lower()] = rows[0][i]
 
         rowData["table"] = self._table
 
         self.doubleClick.emit(rowData)
 
     def rowInfo(self):
-        row = self.currentIndex().row()
         table = self._table
-        query = QSqlQuery()
-        length = 10 if table == "accessories" else 11
-
-        query.exec_(f"SELECT * FROM {table} WHERE ID={row}")
-        query.first()
+        rowid = self.model.index(self.currentIndex().row(), 0).data()
+        columns = _tableColumns[table][:11]  # Up to and including the comment
+        columnList = ", ".join(f'"{column}"' for column in columns)
+        rows = fetchAll(f"SELECT {columnList} FROM {table} WHERE ID=?", (rowid,), self.model.database())
+        if len(rows) == 0:
+            return
 
         title = ""
         platform = ""
-        columns = {"games": ["ID", "Platform", "Name", "Region", "Code",
-                             "Game", "Box", "Manual", "Year", "Genre", "Comment"],
-                   "consoles": ["ID", "Platform", "Name", "Region", "Country", "Serial number",
-                                "Console", "Box", "Manual", "Year", "Comment"],
-                   "accessories": ["ID", "Platform", "Name", "Region", "Country",
-                                   "Accessory", "Box", "Manual", "Year", "Comment"]}
-
-        for i in range(length):
+        for i, col in enumerate(columns):
             if table == "games":
                 if i == 1:
-                    platform = query.value(i)
+                    platform = rows[0][i]
                 if i == 2:
-                    title = query.value(i)
-            col = columns[table][i]
+                    title = rows[0][i]
             print(col, end=":\t" if len(col) > 6 else ":\t\t\t" if len(col) < 3 else ":\t\t")
-            print(query.value(i))
+            print(rows[0][i])
 
         print()
 
         if table == "games":
+            from utilities.fetchinfo import getMobyInfo, printInfo  # The scraper's imports are slow, so only when used
+
             info = getMobyInfo(title, platform)
             printInfo(info)
 
@@ -371,134 +392,462 @@ class Table(QTableView):
         self.hideNotOwned = on
 
     def updateData(self, data: dict):
-        row = self.selectionModel().currentIndex().row()  # Need to use selectionModel here to also support filters
-        record = self.model.record(row)
-        gamesColumns =       ["Platform", "Name", "Region", "Code", "Game",
-                              "Box", "Manual", "Year", "Genre", "Comment",
-                              "Publisher", "Developer", "Platforms", "Price"]
-        consoleColumns =     ["Platform", "Name", "Region", "Country", "Serial number",
-                              "Console", "Box", "Manual", "Year", "Comment", "Price"]
-        accessoriesColumns = ["Platform", "Name", "Region", "Country", "Accessory",
-                              "Box", "Manual", "Year", "Comment", "Price"]
-
-        if self._table == "games":
-            for value in gamesColumns:
-                if value.lower() in data.keys():
-                    record.setValue(value, data[value.lower()])
-                    self.model.setRecord(row, record)
-        elif self._table == "consoles":
-            for value in consoleColumns:
-                if value.lower() in data.keys():
-                    record.setValue(value, data[value.lower()])
-                    self.model.setRecord(row, record)
-        elif self._table == "accessories":
-            for value in accessoriesColumns:
-                if value.lower() in data.keys():
-                    record.setValue(value, data[value.lower()])
-                    self.model.setRecord(row, record)
-
-        self.model.submitAll()
+        values = {column: data[column.lower()] for column in _tableColumns[self._table][1:]
+                  if column.lower() in data.keys()}
+        self._forgetRowHeights([data["id"]])
+        self.model.updateItem(data["id"], values)
         logger.debug(f"Updated row {data['id']} in table {self._table} with:")
         logger.debug(f"{data}")
 
-        self.resizeRowsToContents()
-
-
-class TableModel(QSqlTableModel):
+    def updateDataBatch(self, dataList: list, inTransaction=None) -> bool:
+        """
+        Saves new data for many items in one transaction
+        :param dataList: The data as dictionaries with 'id', like for updateData()
+        :param inTransaction: Called with the database connection before committing, to write
+                              something else in the same transaction. Returns False to roll back.
+        :return: (bool) True if the data was saved
+        """
+        items = {data["id"]: {column: data[column.lower()] for column in _tableColumns[self._table][1:]
+                              if column.lower() in data.keys()} for data in dataList}
+        self._forgetRowHeights(items.keys())
+        if not self.model.updateItems(items, inTransaction):
+            return False
+        logger.debug(f"Updated {len(items)} rows in table {self._table}.")
+
+        return True
+
+
+def _keyCondition(columns: list, values: list, forward: bool) -> tuple:
+    # Rows after (or before) a sort key, in ascending order where NULLs come first.
+    # The last column is the ID, which is never NULL.
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return f"{column} {'>' if forward else '<'} ?", [value]
+
+    rest, params = _keyCondition(columns[1:], values[1:], forward)
+    if value is None:
+        if forward:
+            return f"({column} IS NOT NULL OR ({column} IS NULL AND {rest}))", params
+        return f"({column} IS NULL AND {rest})", params
+    if forward:
+        return f"({column} > ? OR ({column} = ? AND {rest}))", [value, value] + params
+    return f"({column} IS NULL OR {column} < ? OR ({column} = ? AND {rest}))", [value, value] + params
+
+
+class TableModel(QAbstractTableModel):
     """
-    Subclassing QSqlTableModel to be able to customize data in our cells
+    Model for the item tables. Only a window of pages around the rows the view asks
+    for is kept in memory. Pages are fetched with keyset queries on the sort order
+    (Platform, Name, ID), starting from the nearest page whose keys are known, so
+    scrolling and jumping to the end cost the same no matter how big the table is.
     """
-    fetched = Signal()
 
-    def __init__(self, *args, **kwargs):
-        super(TableModel, self).__init__(*args, **kwargs)
+    insertProgress = Signal(int, int)  # Items inserted so far, total
 
-    def fetchMore(self, parent: QModelIndex = ...):
-        # Emit signal after fetching more rows, so we can handle resizing of the rows in the table view
-        super(TableModel, self).fetchMore(parent)
-        self.fetched.emit()
-    
-    def flags(self, index):
-        if self.headerData(index.column(), Qt.Horizontal) in ("Game", "Console", "Accessory",
-                                                              "Box", "Manual"):
-            return super().flags(index) | Qt.ItemIsUserCheckable  # Allows clicking on the checkbox
+    pageSize = 256
+    maxPages = 16
+    insertBatchSize = 5000  # Items per transaction
+    bulkInsertSize = 100  # Batches at least this big update the search index and counts in one go
+
+    _sortColumns = ["Platform", "Name", "ID"]
+
+    def __init__(self, tableName: str, columns: list, db: QSqlDatabase, parent=None, facets: FacetCatalog = None):
+        super(TableModel, self).__init__(parent)
+
+        self._table = tableName
+        self._columns = columns
+        self._db = db
+        self._facets = facets  # Told about the items written, if given
+        self._filter = "1=1"
+        self._params = []
+        self._ids = None  # IDs of the rows in order, if they're known from a search
+        self._idQuery = None  # The search's query and its values
+        self._rowCount = 0
+        self._keyColumns = [columns.index(column) for column in self._sortColumns]
+
+        self._pages = OrderedDict()  # Page number: rows, least recently used first
+        self._firstKeys = {}  # Page number: sort key of the page's first row
+        self._lastKeys = {}  # Page number: sort key of the page's last row
+
+        # The view asks for several roles of every cell it paints, so what each column
+        # answers to each role is worked out here once instead of on every call
+        self._checkable = [column in _checkColumns for column in columns]
+        self._flags = [self._itemFlags(column) for column in columns]
+        self._roles = [self._columnRoles(column) for column in columns]
+
+    def _itemFlags(self, column: str) -> Qt.ItemFlags:
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+        if column in _checkColumns:
+            return flags | Qt.ItemIsUserCheckable  # Allows clicking on the checkbox
+        return flags
+
+    @staticmethod
+    def _columnRoles(column: str) -> dict:
+        # Role: function returning the cell's data for that role, given the model and the index.
+        # They take the model instead of being bound to it, so the model isn't kept alive by itself.
+        roles = {Qt.DisplayRole: TableModel._value, Qt.EditRole: TableModel._value}
+
+        if column in _boldColumns:
+            font = QFont()
+            font.setBold(True)
+            roles[Qt.FontRole] = lambda model, index: font
+        if column in _centeredColumns:
+            roles[Qt.TextAlignmentRole] = lambda model, index: Qt.AlignCenter
+        if column == "Region":
+            roles[Qt.ForegroundRole] = lambda model, index: _regionColors.get(model._value(index))
+        elif column in _checkColumns:
+            roles[Qt.ForegroundRole] = lambda model, index: _checkColors.get(model._value(index))
+            roles[Qt.CheckStateRole] = lambda model, index: _checkStates.get(model._value(index))
+
+        return roles
+
+    def tableName(self) -> str:
+        return self._table
+
+    def database(self) -> QSqlDatabase:
+        return self._db
+
+    def setFilter(self, where: str, params=(), count: int = None, ids: list = None, idQuery: tuple = None):
+        """
+        Shows the rows matching an SQL condition
+        :param where: The condition, everything after WHERE, with '?' for values
+        :param params: Values for the '?'s in the condition, in order
+        :param count: Number of matching rows if already known, otherwise it's counted
+        :param ids: IDs of the matching rows in display order if already known, then
+                    pages are read by ID instead of being searched for
+        :param idQuery: The query the IDs came from and its values, to read them again
+                        in the same order when the table changes
+        """
+        self.beginResetModel()
+        self._filter = where
+        self._params = list(params)
+        self._ids = ids
+        self._idQuery = idQuery if ids is not None else None
+        if ids is not None:
+            self._rowCount = len(ids)
         else:
-            return super().flags(index)
+            self._rowCount = count if count is not None else self._countRows()
+        self._clearCache()
+        self.endResetModel()
 
-    def getAllCount(self):
-        # SQLite3 only loads in chunks of 256 rows at a time, making rowCount useless.
-        count = 0
-        query = QSqlQuery()
-        query.exec_(f"SELECT ID FROM {self.tableName()}")
+    def idQuery(self, where: str, rankedIn: str = None) -> str:
+        """
+        Builds a query for the IDs of the rows matching a condition, in display order
+        :param where: The condition, everything after WHERE
+        :param rankedIn: Full-text table to order the rows by how well they match in, best first.
+                         The query then takes the full-text query before the condition's values.
+        :return: (str) The query
+        """
+        if rankedIn is None:
+            return f"SELECT ID FROM {self._table} WHERE {where} ORDER BY {', '.join(self._sortColumns)}"
+
+        # Rows found with LIKE but not in the index have no rank, and come last
+        return (f"SELECT ID FROM {self._table} LEFT JOIN (SELECT rowid, rank FROM {rankedIn} WHERE {rankedIn} MATCH ?) "
+                f"AS ranked ON ranked.rowid = ID WHERE {where} "
+                f"ORDER BY ranked.rank IS NULL, ranked.rank, {', '.join(self._sortColumns)}")
+
+    def refresh(self):
+        # Reloads the rows after the table has been changed behind the model's back.
+        # Rows can have been added or deleted, so a list of IDs from a search is read again.
+        if self._idQuery is None:
+            self.setFilter(self._filter, self._params)
+            return
+
+        sql, params = self._idQuery
+        ids = [row[0] for row in fetchAll(sql, params, self._db)]
+        self.setFilter(self._filter, self._params, ids=ids, idQuery=self._idQuery)
+
+    def insertItems(self, items: list) -> int:
+        """
+        Inserts items into the table in batches, each batch in its own transaction.
+        The model itself isn't updated, that's left for when the caller is done.
+        :param items: List of item dictionaries, with the lowercase column names as keys
+        :return: (int) Number of items inserted
+        """
+        lastId = fetchValue(f"SELECT IFNULL(MAX(ID), 0) FROM {self._table}", db=self._db)
+        inserted = 0
+        for start in range(0, len(items), self.insertBatchSize):
+            batch = items[start:start + self.insertBatchSize]
+
+            error = self._insertBatch(batch) if beginWrite(self._db) else "Couldn't start a transaction"
+            if error is None and self._db.commit():
+                inserted += len(batch)
+                logger.info(f"Added {len(batch)} items to table '{self._table}' "
+                            f"({inserted}/{len(items)}).")
+            else:
+                logger.error(f"Couldn't add {len(batch)} items to table '{self._table}': "
+                             f"{error if error is not None else self._db.lastError().text()}")
+                self._db.rollback()
+            self.insertProgress.emit(start + len(batch), len(items))
+
+        if self._facets is not None and inserted > 0:
+            self._facets.update(after=self._facets.itemCounts(self._table, afterId=lastId))
+
+        return inserted
+
+    def _insertBatch(self, batch: list) -> str:
+        # Inserts the items in the current transaction. Returns an error message if something failed.
+        columns = self._columns[1:]  # ID is set by the database
+        typedColumns = priceColumns + ["currency"]  # Worked out from the price text
+        columnList = ", ".join(f'"{column}"' for column in columns + typedColumns)
+        query = QSqlQuery(self._db)
+
+        query.exec_(f"SELECT IFNULL(MAX(ID), 0) + 1 FROM {self._table}")
+        query.first()
+        firstId = query.value(0)
+
+        # Updating the search index and counts once for the whole batch is a lot faster than
+        # doing it row by row, so the insert triggers are dropped until the batch is in
+        triggerSql = []
+        if len(batch) >= self.bulkInsertSize:
+            triggers, statements = bulkInsertTriggers(self._table)
+            triggerSql = suspendTriggers(self._db, triggers)
+            if triggerSql is None:
+                return "Couldn't drop the insert triggers"
+
+        # Binding each value from Python takes longer than SQLite takes to insert the row, so the
+        # whole batch is bound as one JSON array and inserted by a single statement
+        prices = {}  # Price text: typed values. An import has the same few prices over and over.
+        rows = []
+        for item in batch:
+            price = item["price"]
+            if price not in prices:
+                prices[price] = priceValues(price)
+            rows.append([item[column.lower()] for column in columns] +
+                        [prices[price][column] for column in typedColumns])
+        values = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(columns) + len(typedColumns)))
+        query.prepare(f"INSERT INTO {self._table} ({columnList}) SELECT {values} FROM json_each(?) ORDER BY key")
+        query.addBindValue(json.dumps(rows, default=str))
+        if not query.exec_():
+            return query.lastError().text()
+        if self._table == "games" and not linkNewGames(firstId, [item["genre"] for item in batch], self._db):
+            return "Couldn't link the genres"
+
+        if len(triggerSql) > 0:
+            for statement in statements:
+                query.prepare(statement)
+                for _ in range(statement.count("?")):
+                    query.addBindValue(firstId)
+                if not query.exec_():
+                    return query.lastError().text()
+            for sql in triggerSql:
+                if not query.exec_(sql):
+                    return query.lastError().text()
+
+        return None
+
+    def updateItem(self, itemId: int, values: dict) -> bool:
+        """
+        Writes new values for an item to the database
+        :param itemId: ID of the item
+        :param values: Column: new value
+        :return: (bool) True if the item was updated
+        """
+        return self.updateItems({itemId: values})
+
+    def updateItems(self, items: dict, inTransaction=None) -> bool:
+        """
+        Writes new values for items to the database in one transaction
+        :param items: Item ID: dictionary of column: new value
+        :param inTransaction: Called with the database connection before committing, to write
+                              something else in the same transaction. Returns False to roll back.
+        :return: (bool) True if the items were updated
+        """
+        items = {itemId: values for itemId, values in items.items() if len(values) > 0}
+        if len(items) == 0 and inTransaction is None:
+            return True
+
+        counts = self._facets.itemCounts(self._table, items.keys()) if self._facets is not None else None
+        matched = self._matching(items.keys())
+        if not beginWrite(self._db) or not all(self._writeItem(itemId, values) for itemId, values in items.items()) \
+                or (inTransaction is not None and not inTransaction(self._db)) or not self._db.commit():
+            logger.error(f"Couldn't update items {', '.join(str(itemId) for itemId in items.keys())} "
+                         f"in table '{self._table}'.")
+            self._db.rollback()
+            return False
+        if counts is not None and len(items) > 0:
+            self._facets.update(counts, self._facets.itemCounts(self._table, items.keys()))
+
+        # Items that started or stopped matching the filter change the rows shown, not just their data
+        if self._matching(items.keys()) != matched:
+            self.refresh()
+            return True
+
+        # The items can have moved anywhere in the sort order
+        self._clearCache()
+        if self._rowCount > 0:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._rowCount - 1, len(self._columns) - 1))
+
+        return True
+
+    def _matching(self, ids) -> set:
+        # Which of the items the current filter shows
+        ids = list(ids)
+        if self._filter == "1=1" or len(ids) == 0:
+            return set(ids)
+        rows = fetchAll(f"SELECT ID FROM {self._table} WHERE ID IN ({', '.join(['?'] * len(ids))}) "
+                        f"AND ({self._filter})", ids + self._params, self._db)
+        return {row[0] for row in rows}
+
+    def _writeItem(self, itemId: int, values: dict) -> bool:
+        # Updates one item in the current transaction
+        if "Price" in values.keys():
+            values = dict(values, **priceValues(values["Price"]))
+        assignments = ", ".join(f'"{column}"=?' for column in values.keys())
+        relink = self._table == "games" and "Genre" in values.keys()
+
+        return execQuery(f"UPDATE {self._table} SET {assignments} WHERE ID=?",
+                         list(values.values()) + [itemId], self._db) is not None and \
+            (not relink or linkGenres(itemId, values["Genre"], self._db))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._rowCount
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._columns)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self._columns):
+            return self._columns[section]
+        return None
+
+    def _clearCache(self):
+        self._pages.clear()
+        self._firstKeys.clear()
+        self._lastKeys.clear()
+
+    def _countRows(self) -> int:
+        return fetchValue(f"SELECT COUNT(*) FROM {self._table} WHERE {self._filter}",
+                          self._params, self._db, default=0)
+
+    def _skipsNulls(self, key: list) -> bool:
+        # Going backwards from a key, row values skip the rows with a NULL Platform, and those
+        # with the key's Platform and a NULL Name, although they all come before the key
+        return fetchValue(f"SELECT EXISTS (SELECT 1 FROM {self._table} "
+                          f"WHERE Platform IS NULL OR (Platform = ? AND Name IS NULL))",
+                          (key[0],), self._db) == 1
+
+    def _selectRows(self, key: list, forward: bool, limit: int, offset: int) -> list:
+        # Rows after/before a sort key (or from the start/end without one), in the direction given
+        columnList = ", ".join(f'"{column}"' for column in self._columns)
+        order = ", ".join(f"{column} {'ASC' if forward else 'DESC'}" for column in self._sortColumns)
+
+        condition, params = "", []
+        if key is not None:
+            # Row values can use the (Platform, Name) index, and give the same result as the full
+            # condition as long as no NULLs are involved
+            if None not in key and (forward or not self._skipsNulls(key)):
+                condition = f"AND ({', '.join(self._sortColumns)}) {'>' if forward else '<'} (?, ?, ?) "
+                params = list(key)
+            else:
+                condition, params = _keyCondition(self._sortColumns, list(key), forward)
+                condition = f"AND {condition} "
+
+        rest = f"FROM {self._table} WHERE ({self._filter}) {condition}ORDER BY {order} LIMIT ? OFFSET ?"
+        if offset > 0:
+            # Skip rows on the IDs only, so the whole rows are only read for the page itself
+            sql = f"SELECT {columnList} FROM {self._table} WHERE ID IN (SELECT ID {rest}) ORDER BY {order}"
+        else:
+            sql = f"SELECT {columnList} {rest}"
+
+        query = execQuery(sql, self._params + params + [limit, offset], self._db)
+        if query is None:
+            logger.error(f"Couldn't read table '{self._table}'.")
+            return []
+
+        rows = []
         while query.next():
-            count += 1
+            row = [query.value(i) for i in range(len(self._columns))]
+            for i in self._keyColumns:
+                if query.isNull(i):  # NULL reads as an empty string, but it doesn't sort like one
+                    row[i] = None
+            rows.append(row)
+        query.finish()
+
+        return rows if forward else rows[::-1]
+
+    def _selectIds(self, ids: list) -> list:
+        # Rows with the given IDs in the same order, None for any that no longer exist
+        columnList = ", ".join(f'"{column}"' for column in self._columns)
+        rows = fetchAll(f"SELECT {columnList} FROM {self._table} WHERE ID IN ({', '.join(['?'] * len(ids))})",
+                        ids, self._db)
+        rowsById = {row[0]: list(row) for row in rows}
+
+        return [rowsById.get(itemId) for itemId in ids]
+
+    def _loadPage(self, page: int) -> list:
+        first = page * self.pageSize
+        size = min(self.pageSize, self._rowCount - first)
+
+        if self._ids is not None:
+            rows = self._selectIds(self._ids[first:first + size])
+        else:
+            # Start from whichever known position needs the smallest OFFSET: the start or end of the
+            # table, or the first/last key of an already loaded page
+            start = [(first, None, True), (self._rowCount - first - size, None, False)]
+            start += [((page - p - 1) * self.pageSize, key, True) for p, key in self._lastKeys.items() if p < page]
+            start += [(p * self.pageSize - first - size, key, False)
+                      for p, key in self._firstKeys.items() if p > page]
+            offset, key, forward = min(start, key=lambda s: s[0])
+
+            rows = self._selectRows(key, forward, size, offset)
+            if len(rows) > 0:
+                self._firstKeys[page] = [rows[0][i] for i in self._keyColumns]
+                self._lastKeys[page] = [rows[-1][i] for i in self._keyColumns]
+
+        self._pages[page] = rows
+        if len(self._pages) > self.maxPages:
+            self._pages.popitem(last=False)
+
+        return rows
+
+    def _row(self, row: int) -> list:
+        page = row // self.pageSize
+        if page in self._pages:
+            self._pages.move_to_end(page)
+            rows = self._pages[page]
+        else:
+            rows = self._loadPage(page)
+
+        row -= page * self.pageSize
+        return rows[row] if row < len(rows) else None
+
+    def flags(self, index):
+        return self._flags[index.column()] if index.isValid() else Qt.NoItemFlags
+
+    def _collectionStats(self, column: str) -> int:
+        # Table-wide counts are kept up to date by triggers in the 'collection_stats' table
+        return fetchValue(f"SELECT {column} FROM collection_stats WHERE TableName=? AND Platform IS NULL",
+                          (self._table,), self._db, default=0)
 
-        return count
+    def getAllCount(self):
+        # Returns number of items in table
+        return self._collectionStats("Total")
 
     def getOwnedCount(self):
         # Returns number of owned items in table
-        itemnames = {"games": "Game", "consoles": "Console", "accessories": "Accessory"}
-        count = 0
-        query = QSqlQuery()
-        query.exec_(f"SELECT ID FROM {self.tableName()} "
-                    f"WHERE {itemnames[self.tableName()]}='Yes' OR Box='Yes' OR Manual='Yes'")
-        while query.next():
-            count += 1
-
-        return count
+        return self._collectionStats("Owned")
 
     def data(self, index, role=Qt.DisplayRole):
-        # Handle setting our checkboxes
-        if (role == Qt.CheckStateRole or role == Qt.DisplayRole)\
-            and self.headerData(index.column(), Qt.Horizontal) in\
-                ("Game", "Console", "Accessory", "Box", "Manual"):
-
-            if role == Qt.CheckStateRole:
-                if index.data(Qt.EditRole) == "Yes":
-                    return Qt.Checked
-                elif index.data(Qt.EditRole) == "No":
-                    return Qt.Unchecked
-            elif role == Qt.DisplayRole:
-                # Display text next to checkboxes
-                return super().data(index, role)
-                # No text
-                # return ""
-        # Bold fonts
-        elif role == Qt.FontRole and self.headerData(index.column(), Qt.Horizontal) in \
-                ("Region", "Country", "Game", "Console", "Accessory", "Box", "Manual"):
-            font = QFont()
-            font.setBold(True)
-            return font
-        # Set foreground color
-        elif role == Qt.ForegroundRole:
-            if self.headerData(index.column(), Qt.Horizontal) == "Region":
-                if index.data() in ("PAL", "PAL A", "PAL B", "Europe"):
-                    return QColor(255, 255, 0)
-                elif index.data() in ("NTSC (JP)", "Japan"):
-                    return QColor(255, 0, 0)
-                elif index.data() in ("NTSC (NA)", "North America"):
-                    return QColor(0, 0, 255)
-            elif self.headerData(index.column(), Qt.Horizontal) in ("Game", "Console", "Accessory",
-                                                                    "Box", "Manual"):
-                if index.data(Qt.EditRole) == "Yes":
-                    return QColor(0, 255, 0)
-                elif index.data(Qt.EditRole) == "No":
-                    return QColor(255, 0, 0)
-        # Set text alignment
-        elif role == Qt.TextAlignmentRole \
-                and self.headerData(index.column(), Qt.Horizontal) in ("Region", "Country"):
-            return Qt.AlignCenter
-        # Display the cell data in tooltip
-        # elif role == Qt.ToolTipRole:
-        #    return super().data(index, Qt.DisplayRole)
-
-        return super().data(index, role)
+        if not index.isValid():
+            return None
+        cellData = self._roles[index.column()].get(role)
+        return cellData(self, index) if cellData is not None else None
+
+    def _value(self, index: QModelIndex):
+        if not index.isValid():
+            return None
+        row = self._row(index.row())
+        return row[index.column()] if row is not None else None
 
     def setData(self, index, value, role=Qt.EditRole):
-        if role == Qt.CheckStateRole\
-                and self.headerData(index.column(), Qt.Horizontal) in \
-                ("Game", "Console", "Accessory", "Box", "Manual"):
+        if role == Qt.CheckStateRole and self._checkable[index.column()]:
             data = "Yes" if value == Qt.Checked else "No"
-            return super().setData(index, data, Qt.EditRole)
+            return self.setData(index, data, Qt.EditRole)
+        elif role == Qt.EditRole and index.isValid():
+            row = self._row(index.row())
+            if row is None or not self.updateItem(row[0], {self._columns[index.column()]: value}):
+                return False
+            return True
         else:
-            return super().setData(index, value, role)
+            return False